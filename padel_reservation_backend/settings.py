@@ -53,8 +53,9 @@ INSTALLED_APPS = [
 ]
 
 AUTHENTICATION_BACKENDS = [
-    'reservations.backends.EmailBackend',  # Ruta al backend que acabas de crear
-    'django.contrib.auth.backends.ModelBackend',  # Opcional, por si quieres login por username
+    # Atiende también el login del admin (username); con un segundo backend
+    # cada login fallido calcularía el hash de la contraseña dos veces
+    'reservations.backends.EmailBackend',
 ]
 
 MIDDLEWARE = [
@@ -66,8 +67,43 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     'corsheaders.middleware.CorsMiddleware',
+    'reservations.middleware.ContadorConsultasMiddleware',
+    'reservations.middleware.ComunidadMiddleware',
+    'reservations.middleware.EscrituraRecienteMiddleware',
 ]
 
+# Días que una reserva pasada permanece en Reservation antes de archivarse
+RESERVAS_ARCHIVO_DIAS = env.int('RESERVAS_ARCHIVO_DIAS', default=180)
+
+# Dominio público de los enlaces cortos (/s/<codigo>/); vacío = el de la petición
+SHORTLINK_BASE_URL = env('SHORTLINK_BASE_URL', default='')
+# Dominios a los que se permite acortar enlaces desde /api/acortar-url/
+SHORTLINK_HOSTS_PERMITIDOS = env.list('SHORTLINK_HOSTS_PERMITIDOS', default=['www.pistareserva.com', 'pistareserva.com'])
+
+# Minutos antes del partido en que se envía el recordatorio (`programar_recordatorios`)
+RECORDATORIO_MINUTOS_ANTES = env.int('RECORDATORIO_MINUTOS_ANTES', default=120)
+
+# Resúmenes de notificaciones: si está activo, invitaciones, respuestas y
+# anuncios se acumulan y se envía un único correo por destinatario y ventana
+NOTIFICACIONES_RESUMEN = env.bool('NOTIFICACIONES_RESUMEN', default=False)
+NOTIFICACIONES_RESUMEN_MINUTOS = env.int('NOTIFICACIONES_RESUMEN_MINUTOS', default=60)
+
+# Política de retención (`purgar_retencion`), en días
+RETENCION_CANCELACIONES_DIAS = env.int('RETENCION_CANCELACIONES_DIAS', default=365)
+RETENCION_INVITACIONES_PENDIENTES_DIAS = env.int('RETENCION_INVITACIONES_PENDIENTES_DIAS', default=30)
+RETENCION_INVITADOS_EXTERNOS_DIAS = env.int('RETENCION_INVITADOS_EXTERNOS_DIAS', default=365)
+RETENCION_CORREOS_DIAS = env.int('RETENCION_CORREOS_DIAS', default=30)
+
+# Límites por minuto de reservar y de horarios ocupados; cada comunidad puede
+# fijar los suyos por usuario (Community.limite_*). 0 = sin límite
+THROTTLE_RESERVAS_USUARIO = env.int('THROTTLE_RESERVAS_USUARIO', default=10)
+THROTTLE_RESERVAS_IP = env.int('THROTTLE_RESERVAS_IP', default=120)
+THROTTLE_OCUPADOS_USUARIO = env.int('THROTTLE_OCUPADOS_USUARIO', default=60)
+THROTTLE_OCUPADOS_IP = env.int('THROTTLE_OCUPADOS_IP', default=600)
+
+# Cabecera X-DB-Queries en cada respuesta (solo para pruebas de carga)
+CONTAR_CONSULTAS = env.bool('CONTAR_CONSULTAS', default=False)
+
 ROOT_URLCONF = "padel_reservation_backend.urls"
 
 TEMPLATES = [
@@ -113,6 +149,28 @@ DATABASES = {
     }
 }
 
+# Réplica de lectura opcional para estadísticas y listados (`reservations/router.py`)
+REPLICA_DB_ALIAS = 'replica'
+if env('DB_REPLICA_HOST', default=''):
+    DATABASES[REPLICA_DB_ALIAS] = {
+        **DATABASES['default'],
+        'HOST': env('DB_REPLICA_HOST'),
+        'PORT': env('DB_REPLICA_PORT', default=env('DB_PORT')),
+        'USER': env('DB_REPLICA_USER', default=env('DB_USER')),
+        'PASSWORD': env('DB_REPLICA_PASSWORD', default=env('DB_PASSWORD')),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['reservations.router.ReplicaRouter']
+# Segundos que las lecturas de un usuario van al primario tras escribir
+REPLICA_STICKY_SEGUNDOS = env.int('REPLICA_STICKY_SEGUNDOS', default=10)
+
+# Caché compartida entre workers en producción (p. ej. CACHE_URL=redis://...)
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+    # Contadores de los throttles (`reservations/throttles.py`); necesita incr atómico
+    'throttle': env.cache('THROTTLE_CACHE_URL', default='locmemcache://throttle'),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -168,7 +226,7 @@ REST_FRAMEWORK = {
     'rest_framework.permissions.IsAuthenticated',
   ],
   'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'reservations.autenticacion.JWTSinEstadoAuthentication',
     ),
   'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
@@ -9,7 +9,8 @@ from reservations.views import (
     ReservationViewSet, UserViewSet,
     CustomLoginView, registro_usuario, obtener_viviendas, confirmar_invitacion, UsuarioComunidadViewSet,
     UsuarioViewSet, ReservationInvitationViewSet, confirmar_invitacion, ViviendaViewSet, InvitadosFrecuentesViewSet, eliminar_invitado_externo, ReservationAllViewSet, 
-    CommunityViewSet, user_dashboard, proximos_partidos_invitado, AceptarInvitacionView, RechazarInvitacionView, InvitadoExternoViewSet, get_ocupados, viviendas_por_codigo, AnuncioViewSet, RespuestaAnuncioViewSet)
+    CommunityViewSet, user_dashboard, proximos_partidos_invitado, AceptarInvitacionView, RechazarInvitacionView, InvitadoExternoViewSet, get_ocupados, viviendas_por_codigo, AnuncioViewSet, RespuestaAnuncioViewSet,
+    prevision_ocupacion, AcortarUrlView, redirigir_enlace, mi_calendario, calendario_ics)
 from rest_framework_simplejwt.views import TokenRefreshView
 from reservations.serializers import CustomTokenObtainPairSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView
@@ -61,6 +62,11 @@ urlpatterns = [
     path('api/invitaciones/<str:token>/rechazar/', RechazarInvitacionView.as_view(), name='rechazar-invitacion'),
     path('api/horarios-ocupados/', get_ocupados, name='horarios-ocupados'),
     path('api/viviendas_por_codigo/', viviendas_por_codigo, name='viviendas_por_codigo'),
+    path('api/prevision-ocupacion/', prevision_ocupacion, name='prevision-ocupacion'),
+    path('api/acortar-url/', AcortarUrlView.as_view(), name='acortar-url'),
+    path('s/<str:codigo>/', redirigir_enlace, name='enlace-corto'),
+    path('api/mi-calendario/', mi_calendario, name='mi-calendario'),
+    path('calendario/<str:token>.ics', calendario_ics, name='calendario-ics'),
     path('api/password_reset/', include('django_rest_passwordreset.urls', namespace='password_reset')),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
@@ -1,15 +1,16 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import Court, TimeSlot, Reservation, Vivienda, Usuario, ReservationInvitation, Community, ReservationCancelada, InvitadoExterno
+from .models import Court, TimeSlot, Reservation, Vivienda, Usuario, ReservationInvitation, Community, InvitadoExterno
 from django.urls import path
 from django.template.response import TemplateResponse
 from datetime import date, timedelta, datetime
+from django.utils import timezone
 from django.contrib.admin.views.decorators import staff_member_required
 from django.http import HttpResponseServerError
 from .models import Community
 from calendar import monthrange
 from django import forms
-from .models import Anuncio, RespuestaAnuncio
+from .models import Anuncio, RespuestaAnuncio, PrevisionOcupacion, ReservaArchivada, EmailOutbox, NotificacionPendiente
 
 # Configuración para el modelo Usuario
 @admin.register(Usuario)
@@ -61,8 +62,8 @@ class TimeSlotAdmin(admin.ModelAdmin):
 
 @admin.register(Reservation)
 class ReservationAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'court', 'date', 'get_slot', 'created_at', 'estado')
-    list_filter = ('date', 'court')
+    list_display = ('id', 'user', 'court', 'date', 'get_slot', 'created_at', 'estado', 'cancelada_at')
+    list_filter = ('estado', 'date', 'court')
     raw_id_fields = ('user',)
     
     def get_slot(self, obj):
@@ -122,19 +123,42 @@ class CommunityAdmin(admin.ModelAdmin):
     list_editable = ('reserva_hora_apertura_pasado', 'reserva_max_dias')
     
 
-@admin.register(ReservationCancelada)
-class ReservationCanceladaAdmin(admin.ModelAdmin):
-    list_display = (
-        'user', 
-        'court', 
-        'date', 
-        'timeslot', 
-        'created_at', 
-        'cancelada_at'
-    )
-    list_filter = ('user', 'court', 'date', 'cancelada_at')
-    search_fields = ('user__nombre', 'user__email', 'court__name')
-    
+@admin.register(PrevisionOcupacion)
+class PrevisionOcupacionAdmin(admin.ModelAdmin):
+    list_display = ('date', 'timeslot', 'court', 'apertura', 'probabilidad', 'horas_hasta_completo', 'muestras', 'calculado_at')
+    list_select_related = ('timeslot__court__community', 'court__community')
+    list_filter = ('court', 'date')
+
+@admin.register(ReservaArchivada)
+class ReservaArchivadaAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'court', 'timeslot', 'date', 'estado', 'archivada_at')
+    list_select_related = ('user', 'court', 'timeslot')
+    list_filter = ('estado', 'date')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('destinatario', 'asunto', 'estado', 'intentos', 'proximo_intento', 'creado_at', 'enviado_at')
+    list_filter = ('estado',)
+    search_fields = ('destinatario', 'asunto')
+    readonly_fields = ('creado_at', 'enviado_at', 'ultimo_error')
+    actions = ['reintentar']
+
+    @admin.action(description="Reintentar ahora")
+    def reintentar(self, request, queryset):
+        queryset.exclude(estado='enviado').update(estado='pendiente', proximo_intento=timezone.now(), bloqueado_hasta=None)
+
+@admin.register(NotificacionPendiente)
+class NotificacionPendienteAdmin(admin.ModelAdmin):
+    list_display = ('destinatario', 'tipo', 'creado_at')
+    list_filter = ('tipo',)
+    search_fields = ('destinatario',)
+
 @admin.register(InvitadoExterno)
 class InvitadoExternoAdmin(admin.ModelAdmin):
     list_display = ('email', 'nombre', 'usuario', 'creado_en')
@@ -143,14 +167,20 @@ class InvitadoExternoAdmin(admin.ModelAdmin):
 
 
 from .statistics import (
-    reservas_totales_periodo, reservas_por_pista, reservas_por_comunidad,
+    reservas_totales_periodo, reservas_por_comunidad,
     porcentaje_ocupacion_por_pista, partidos_mes, partidos_semana, ranking_usuarios_activos,
     proporcion_usuarios_vs_staff, invitaciones_kpis, tasa_cancelaciones,
     reservas_por_horario, participacion_media, usuarios_nuevos,
-    tiempo_medio_antelacion, cancelaciones_ultimo_minuto, participacion_por_vivienda
+    ultimo_minuto_de, participacion_por_vivienda
 )
+from .distribuciones import distribucion_antelacion, distribucion_cancelaciones
+from .router import lecturas_replica
+
+# Una cancelación es de último minuto si llega con esta antelación o menos
+HORAS_ULTIMO_MINUTO = 24
 
 @staff_member_required
+@lecturas_replica
 def estadisticas_dashboard_view(request):
     try:
         hoy = date.today()
@@ -191,6 +221,14 @@ def estadisticas_dashboard_view(request):
             ocupaciones = [row['ocupacion_pct'] for row in ocupacion_pista if 'ocupacion_pct' in row]
             ocupacion_media = round(sum(ocupaciones) / len(ocupaciones), 1) if ocupaciones else 0
 
+        # Distribuciones de antelación (reserva y cancelación) en una sola pasada cada una;
+        # el KPI de último minuto sale de la de cancelaciones
+        dist_antelacion = distribucion_antelacion(primer_dia_mes, ultimo_dia_mes, community_id=community_id)
+        dist_cancelaciones = distribucion_cancelaciones(
+            primer_dia_mes, ultimo_dia_mes, community_id=community_id, umbrales=(HORAS_ULTIMO_MINUTO,)
+        )
+        media_antelacion = dist_antelacion['global']['media']
+
         context = dict(
             comunidades_lista=comunidades_lista,
             community_id=community_id,
@@ -212,8 +250,14 @@ def estadisticas_dashboard_view(request):
             por_horario=reservas_por_horario(primer_dia_mes, ultimo_dia_mes, community_id=community_id) or [],
             participacion_media=participacion_media(primer_dia_mes, ultimo_dia_mes, community_id=community_id) or 0,
             usuarios_nuevos=usuarios_nuevos(primer_dia_mes, ultimo_dia_mes, community_id=community_id) or 0,
-            antelacion=tiempo_medio_antelacion(primer_dia_mes, ultimo_dia_mes, community_id=community_id) or 0,
-            ult_minuto=cancelaciones_ultimo_minuto(primer_dia_mes, ultimo_dia_mes, community_id=community_id, horas=24) or {},
+            antelacion=round(media_antelacion / 24, 2) if media_antelacion else 0,
+            dist_antelacion=dist_antelacion,
+            dist_cancelaciones=dist_cancelaciones,
+            distribuciones=[
+                ("Antelación de las reservas", dist_antelacion),
+                ("Antelación de las cancelaciones", dist_cancelaciones),
+            ],
+            ult_minuto=ultimo_minuto_de(dist_cancelaciones, HORAS_ULTIMO_MINUTO),
             por_vivienda=participacion_por_vivienda(primer_dia_mes, ultimo_dia_mes, community_id=community_id) or [],
         )
         return TemplateResponse(request, "admin/estadisticas_dashboard.html", context)
@@ -236,9 +280,14 @@ class AnuncioAdmin(admin.ModelAdmin):
     search_fields = ('titulo', 'contenido', 'autor__username', 'autor__first_name', 'autor__last_name')
     # date_hierarchy = 'creado'
     inlines = [RespuestaInline]
-    readonly_fields = ('creado',)
+    readonly_fields = ('creado', 'imagen_variantes', 'imagen_pendiente')
     ordering = ('-creado',)
 
+    def save_model(self, request, obj, form, change):
+        if 'imagen' in form.changed_data:
+            obj.imagen_pendiente = True
+        super().save_model(request, obj, form, change)
+
 @admin.register(RespuestaAnuncio)
 class RespuestaAnuncioAdmin(admin.ModelAdmin):
     list_display = ('id', 'anuncio', 'autor', 'creado')
@@ -0,0 +1,83 @@
+# reservations/archivo.py
+#
+# Archivado de reservas pasadas: mueve por lotes las reservas (y sus
+# invitaciones) anteriores al horizonte configurado a ReservaArchivada /
+# InvitacionArchivada, para que Reservation y sus índices solo contengan
+# los días que consultan las vistas en caliente.
+
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from .calendario import por_lotes
+from .models import Reservation, ReservationInvitation, ReservaArchivada, InvitacionArchivada
+
+CAMPOS_RESERVA = ('id', 'user_id', 'court_id', 'timeslot_id', 'date', 'created_at', 'estado', 'cancelada_at')
+CAMPOS_INVITACION = ('id', 'reserva_id', 'invitado_id', 'email', 'token', 'estado', 'fecha_invitacion', 'nombre_invitado')
+
+
+def fecha_corte(dias=None):
+    dias = settings.RESERVAS_ARCHIVO_DIAS if dias is None else dias
+    return timezone.localdate() - timedelta(days=dias)
+
+
+def pendientes(corte):
+    return Reservation.objects.filter(date__lt=corte)
+
+
+def archivar_lote(corte, lote):
+    """Mueve un lote (por orden de id) en una transacción. Devuelve (reservas, invitaciones)."""
+    with transaction.atomic():
+        ids = list(pendientes(corte).order_by('id').values_list('id', flat=True)[:lote])
+        if not ids:
+            return 0, 0
+        ahora = timezone.now()
+        reservas = [
+            ReservaArchivada(archivada_at=ahora, **fila)
+            for fila in Reservation.objects.filter(id__in=ids).values(*CAMPOS_RESERVA)
+        ]
+        ReservaArchivada.objects.bulk_create(reservas)
+        invitaciones = [
+            InvitacionArchivada(**fila)
+            for fila in ReservationInvitation.objects.filter(reserva_id__in=ids).values(*CAMPOS_INVITACION)
+        ]
+        InvitacionArchivada.objects.bulk_create(invitaciones)
+        usuarios = {r.user_id for r in reservas} | {i.invitado_id for i in invitaciones if i.invitado_id}
+        with por_lotes(usuarios):
+            ReservationInvitation.objects.filter(reserva_id__in=ids).delete()
+            Reservation.objects.filter(id__in=ids).delete()
+    return len(ids), len(invitaciones)
+
+
+def archivar(dias=None, lote=1000, pausa=0.0, on_lote=None):
+    corte = fecha_corte(dias)
+    total_reservas = total_invitaciones = 0
+    while True:
+        reservas, invitaciones = archivar_lote(corte, lote)
+        if not reservas:
+            break
+        total_reservas += reservas
+        total_invitaciones += invitaciones
+        if on_lote:
+            on_lote(total_reservas, total_invitaciones)
+        if pausa:
+            time.sleep(pausa)
+    return total_reservas, total_invitaciones
+
+
+# --- Lectura conjunta para estadísticas ---
+def fuentes(fecha_inicio):
+    """
+    Pares (modelo de reservas, modelo de invitaciones) que cubren un periodo
+    que empieza en `fecha_inicio`. El archivo solo se consulta si contiene
+    fechas del periodo (una lectura del máximo sobre el índice de `date`).
+    No se cachea: `archivar_reservas` corre en otro proceso y un valor
+    atrasado dejaría fuera del periodo lo recién archivado.
+    """
+    modelos = [(Reservation, ReservationInvitation)]
+    ultima_archivada = ReservaArchivada.objects.aggregate(ultima=Max('date'))['ultima']
+    if ultima_archivada is not None and ultima_archivada >= fecha_inicio:
+        modelos.append((ReservaArchivada, InvitacionArchivada))
+    return modelos
@@ -0,0 +1,67 @@
+# reservations/autenticacion.py
+#
+# Autenticación JWT sin consulta de usuario por petición. El token lleva
+# como claims firmados los datos que usan las vistas (comunidad, vivienda,
+# staff...) y la versión de token del usuario. Solo se comprueba contra una
+# instantánea cacheada del usuario, así que las lecturas no necesitan tocar
+# la tabla de usuarios.
+
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from .models import Usuario
+
+ESTADO_TTL = 300
+# Claims que se copian al usuario
+CAMPOS_CLAIMS = ('email', 'nombre', 'apellido', 'is_staff', 'community_id', 'vivienda_id', 'token_version')
+CLAIM_VERSION = 'token_version'
+
+
+def _clave(user_id):
+    return f"jwt:usuario:{user_id}"
+
+
+def claims_usuario(user):
+    return {campo: getattr(user, campo) for campo in CAMPOS_CLAIMS}
+
+
+def estado_usuario(user_id):
+    """Instantánea cacheada de los campos que lleva el token (más is_active)."""
+    clave = _clave(user_id)
+    estado = cache.get(clave)
+    if estado is None:
+        fila = Usuario.objects.filter(pk=user_id).values('is_active', *CAMPOS_CLAIMS).first()
+        estado = fila or {'is_active': False}
+        cache.set(clave, estado, ESTADO_TTL)
+    return estado
+
+
+def invalidar_estado_usuario(user_id):
+    cache.delete(_clave(user_id))
+
+
+class JWTSinEstadoAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if CLAIM_VERSION not in validated_token:
+            # Tokens emitidos antes de incluir los claims: camino clásico con consulta
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise AuthenticationFailed("El token no contiene un identificador de usuario reconocible")
+
+        estado = estado_usuario(user_id)
+        if not estado['is_active']:
+            raise AuthenticationFailed("Usuario no encontrado o inactivo", code='user_inactive')
+        if estado[CLAIM_VERSION] != validated_token[CLAIM_VERSION]:
+            raise AuthenticationFailed("El token ha sido revocado", code='token_revoked')
+        if any(estado[campo] != validated_token.get(campo) for campo in CAMPOS_CLAIMS):
+            # Los datos han cambiado desde que se emitió el token: se usa la fila actual
+            return super().get_user(validated_token)
+
+        # Usuario parcial: el resto de campos quedan diferidos y se cargan al acceder a ellos
+        # from_db espera los valores en el orden de los campos del modelo
+        conocidos = dict(estado, id=user_id, is_active=True)
+        campos = [f.attname for f in Usuario._meta.concrete_fields if f.attname in conocidos]
+        return Usuario.from_db('default', campos, [conocidos[campo] for campo in campos])
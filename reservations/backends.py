@@ -1,13 +1,30 @@
 # reservations/backends.py
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
+from .models import normalizar_email
 
 class EmailBackend(ModelBackend):
-    def authenticate(self, request, email=None, password=None, **kwargs):
+    """
+    Único backend de autenticación: acepta `email` (API) o `username` (admin
+    de Django) y calcula el hash de la contraseña exactamente una vez por
+    intento, también cuando el email no existe.
+    """
+    def authenticate(self, request, email=None, password=None, username=None, **kwargs):
         UserModel = get_user_model()
+        if email is None:
+            email = username if username is not None else kwargs.get(UserModel.USERNAME_FIELD)
+        if email is None or password is None:
+            return None
+        usuarios = UserModel._default_manager
         try:
-            user = UserModel.objects.get(email=email)
+            try:
+                user = usuarios.get(email_normalizado=normalizar_email(email))
+            except UserModel.MultipleObjectsReturned:
+                # Cuentas antiguas que solo difieren en mayúsculas: manda la coincidencia exacta
+                user = usuarios.get(email=email)
         except UserModel.DoesNotExist:
+            # Hash igualmente para que el tiempo de respuesta no revele si el email existe
+            UserModel().set_password(password)
             return None
         if user.check_password(password) and self.user_can_authenticate(user):
             return user
@@ -0,0 +1,89 @@
+# reservations/bench.py
+#
+# Utilidades comunes de los benchmarks (`bench_estadisticas`, ...):
+# base de datos temporal, medición de una llamada y formato de resultados.
+
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+
+@contextmanager
+def base_de_datos_temporal(keepdb=False):
+    """Crea la base de datos de test para no tocar los datos reales y la destruye al salir."""
+    nombre_original = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(nombre_original, verbosity=0, keepdb=keepdb)
+
+
+def medir(funcion, repeticiones=1):
+    """
+    Ejecuta `funcion` y devuelve la mejor marca de tiempo, las consultas SQL
+    y el pico de memoria Python (tracemalloc) de la última repetición.
+    """
+    tiempos = []
+    for _ in range(repeticiones):
+        tracemalloc.start()
+        with CaptureQueriesContext(connection) as consultas:
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append(time.perf_counter() - inicio)
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {
+        'wall_s': round(min(tiempos), 4),
+        'consultas': len(consultas),
+        'pico_memoria_kb': round(pico / 1024, 1),
+    }
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def cabecera_resultados(nombre):
+    return {
+        'benchmark': nombre,
+        'commit': _commit_actual(),
+        'fecha': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'base_de_datos': settings.DATABASES['default']['ENGINE'].rsplit('.', 1)[-1],
+    }
+
+
+def guardar(resultados, ruta):
+    with open(ruta, 'w') as f:
+        json.dump(resultados, f, indent=2, default=str)
+
+
+def comparar(actual, anterior, campo='wall_s'):
+    """
+    Devuelve filas (grupo, medida, antes, ahora, ratio) para las medidas
+    presentes en ambos resultados. `resultados` es {grupo: {medida: {...}}}.
+    """
+    filas = []
+    for grupo, medidas in actual['resultados'].items():
+        previas = anterior.get('resultados', {}).get(grupo, {})
+        for medida, valores in medidas.items():
+            if medida not in previas:
+                continue
+            antes, ahora = previas[medida][campo], valores[campo]
+            ratio = round(ahora / antes, 2) if antes else None
+            filas.append((grupo, medida, antes, ahora, ratio))
+    return filas
@@ -0,0 +1,141 @@
+# reservations/calendario.py
+#
+# Feed iCalendar por usuario (reservas propias e invitaciones aceptadas).
+# El .ics se guarda ya generado en CalendarioUsuario y solo se vuelve a
+# construir cuando algo lo marca como pendiente o cuando se generó otro día
+# (la ventana de DIAS_PASADOS ha avanzado), así que el sondeo de los
+# clientes de calendario cuesta una lectura (o un 304).
+
+import hashlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db.models import Q
+from django.utils import timezone
+from .models import CalendarioUsuario, Reservation, ReservationInvitation
+
+DIAS_PASADOS = 30
+DOMINIO_UID = 'pistareserva.com'
+
+_por_lotes = ContextVar('calendario_por_lotes', default=False)
+
+
+def _escapar(texto):
+    return (str(texto or '').replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\n', '\\n'))
+
+
+def _utc(instante):
+    return instante.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _plegar(linea):
+    # RFC 5545: líneas de como mucho 75 octetos, continuadas con un espacio
+    partes = []
+    datos = linea.encode('utf-8')
+    while len(datos) > 75:
+        corte = 75 if not partes else 74
+        while corte and (datos[corte] & 0xC0) == 0x80:
+            corte -= 1
+        partes.append(datos[:corte].decode('utf-8'))
+        datos = datos[corte:]
+    partes.append(datos.decode('utf-8'))
+    return '\r\n '.join(partes)
+
+
+def reservas_de(usuario, desde):
+    return Reservation.objects.filter(
+        Q(user=usuario) | Q(invitaciones__invitado=usuario, invitaciones__estado='aceptada'),
+        estado='activa',
+        date__gte=desde,
+    ).select_related('user', 'court__community', 'timeslot').distinct().order_by('date', 'timeslot__start_time')
+
+
+def generar_ics(usuario):
+    tz = timezone.get_current_timezone()
+    lineas = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//PistaReserva//Calendario//ES',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        'X-WR-CALNAME:PistaReserva',
+    ]
+    for reserva in reservas_de(usuario, timezone.localdate() - timedelta(days=DIAS_PASADOS)):
+        inicio = timezone.make_aware(datetime.combine(reserva.date, reserva.timeslot.start_time), tz)
+        fin = timezone.make_aware(datetime.combine(reserva.date, reserva.timeslot.end_time), tz)
+        propia = reserva.user_id == usuario.id
+        resumen = f"Pádel - {reserva.court.name}"
+        if not propia:
+            resumen += f" (con {reserva.user.get_full_name() or reserva.user.email})"
+        lineas += [
+            'BEGIN:VEVENT',
+            f'UID:reserva-{reserva.id}@{DOMINIO_UID}',
+            f'DTSTAMP:{_utc(reserva.created_at or inicio)}',
+            f'DTSTART:{_utc(inicio)}',
+            f'DTEND:{_utc(fin)}',
+            f'SUMMARY:{_escapar(resumen)}',
+            f'LOCATION:{_escapar(reserva.court.community.direccion if reserva.court.community else "")}',
+            'END:VEVENT',
+        ]
+    lineas.append('END:VCALENDAR')
+    return '\r\n'.join(_plegar(linea) for linea in lineas) + '\r\n'
+
+
+def calendario_de(usuario):
+    calendario, _ = CalendarioUsuario.objects.get_or_create(usuario=usuario)
+    return calendario
+
+
+def _caducado(calendario):
+    # La ventana empieza DIAS_PASADOS antes de hoy: avanza cada día aunque nada marque el feed
+    return calendario.generado_at is None or timezone.localdate(calendario.generado_at) < timezone.localdate()
+
+
+def regenerar_si_pendiente(calendario):
+    if not calendario.pendiente and not _caducado(calendario):
+        return calendario
+    # La marca se limpia antes de leer las reservas: un cambio que llegue
+    # mientras se genera la vuelve a poner y se regenera en la siguiente lectura
+    CalendarioUsuario.objects.filter(pk=calendario.pk).update(pendiente=False)
+    contenido = generar_ics(calendario.usuario)
+    calendario.contenido = contenido
+    calendario.etag = hashlib.sha256(contenido.encode('utf-8')).hexdigest()[:32]
+    calendario.generado_at = timezone.now()
+    calendario.pendiente = False
+    CalendarioUsuario.objects.filter(pk=calendario.pk).update(
+        contenido=contenido, etag=calendario.etag, generado_at=calendario.generado_at
+    )
+    return calendario
+
+
+# --- Invalidación en borrados por lotes ---
+def invalidar_por_fila():
+    """False dentro de `por_lotes`: los receptores de señales no marcan fila a fila."""
+    return not _por_lotes.get()
+
+
+def usuarios_de_reservas(ids):
+    """Dueños e invitados de las reservas `ids`: los calendarios en que pueden aparecer."""
+    usuarios = set(Reservation.objects.filter(id__in=ids).values_list('user_id', flat=True))
+    usuarios.update(
+        ReservationInvitation.objects.filter(reserva_id__in=ids, invitado__isnull=False)
+        .values_list('invitado_id', flat=True)
+    )
+    return usuarios
+
+
+@contextmanager
+def por_lotes(usuarios):
+    """
+    Para borrados de reservas e invitaciones por lotes (archivo, retención):
+    los receptores post_delete no lanzan un UPDATE por fila y al terminar se
+    marcan los calendarios de `usuarios` con uno solo.
+    """
+    token = _por_lotes.set(True)
+    try:
+        yield
+    finally:
+        _por_lotes.reset(token)
+    if usuarios:
+        CalendarioUsuario.marcar_pendiente(usuario_id__in=usuarios)
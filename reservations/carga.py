@@ -0,0 +1,239 @@
+# reservations/carga.py
+#
+# Prueba de carga que simula la apertura de la ventana de reservas:
+# K usuarios hacen login en /api/token/ y a la vez lanzan reservas,
+# consultas de horarios ocupados y del dashboard contra un servidor local.
+# Usa un cliente HTTP/1.1 mínimo sobre asyncio para no añadir dependencias.
+
+import asyncio
+import json
+import random
+import time
+from datetime import timedelta
+from urllib.parse import urlsplit, urlencode
+from django.utils import timezone
+from .distribuciones import percentil
+from .models import Usuario, TimeSlot
+
+# Peso relativo de cada operación dentro de la mezcla
+MEZCLA_POR_DEFECTO = {'reservar': 1, 'ocupados': 6, 'dashboard': 3}
+
+
+class ClienteHTTP:
+    """Conexión keep-alive por usuario virtual; reconecta si el servidor la cierra."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def _conectar(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def cerrar(self):
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+            self.writer = None
+
+    async def peticion(self, metodo, ruta, cuerpo=None, token=None):
+        for intento in (1, 2):
+            if self.writer is None:
+                await self._conectar()
+            try:
+                return await self._enviar(metodo, ruta, cuerpo, token)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.cerrar()
+                if intento == 2:
+                    raise
+
+    async def _enviar(self, metodo, ruta, cuerpo, token):
+        datos = json.dumps(cuerpo).encode() if cuerpo is not None else b''
+        cabeceras = [
+            f"{metodo} {ruta} HTTP/1.1",
+            f"Host: {self.host}:{self.port}",
+            "Connection: keep-alive",
+            "Accept: application/json",
+            f"Content-Length: {len(datos)}",
+        ]
+        if datos:
+            cabeceras.append("Content-Type: application/json")
+        if token:
+            cabeceras.append(f"Authorization: Bearer {token}")
+        self.writer.write(("\r\n".join(cabeceras) + "\r\n\r\n").encode() + datos)
+        await self.writer.drain()
+
+        linea_estado = await self.reader.readuntil(b"\r\n")
+        if not linea_estado:
+            raise ConnectionError("Conexión cerrada por el servidor")
+        estado = int(linea_estado.split()[1])
+        respuesta = {}
+        while True:
+            linea = await self.reader.readuntil(b"\r\n")
+            if linea == b"\r\n":
+                break
+            nombre, _, valor = linea.decode('latin-1').partition(':')
+            respuesta[nombre.strip().lower()] = valor.strip()
+
+        if respuesta.get('transfer-encoding', '').lower() == 'chunked':
+            partes = []
+            while True:
+                tamano = int((await self.reader.readuntil(b"\r\n")).split(b';')[0], 16)
+                if tamano == 0:
+                    await self.reader.readuntil(b"\r\n")
+                    break
+                partes.append(await self.reader.readexactly(tamano))
+                await self.reader.readexactly(2)
+            contenido = b''.join(partes)
+        elif 'content-length' in respuesta:
+            contenido = await self.reader.readexactly(int(respuesta['content-length']))
+        else:
+            contenido = await self.reader.read()
+            await self.cerrar()
+        if respuesta.get('connection', '').lower() == 'close':
+            await self.cerrar()
+        return estado, respuesta, contenido
+
+
+class Resultados:
+    def __init__(self):
+        self.latencias = {}
+        self.estados = {}
+        self.consultas = {}
+        self.errores = 0
+
+    def registrar(self, operacion, segundos, estado, cabeceras):
+        self.latencias.setdefault(operacion, []).append(segundos * 1000)
+        clave = (operacion, estado)
+        self.estados[clave] = self.estados.get(clave, 0) + 1
+        if 'x-db-queries' in cabeceras:
+            self.consultas.setdefault(operacion, []).append(int(cabeceras['x-db-queries']))
+
+    def resumen(self, duracion):
+        total = sum(len(v) for op, v in self.latencias.items() if op != 'login')
+        operaciones = {}
+        for operacion, latencias in sorted(self.latencias.items()):
+            ordenadas = sorted(latencias)
+            estados = {str(e): n for (op, e), n in sorted(self.estados.items()) if op == operacion}
+            consultas = self.consultas.get(operacion)
+            operaciones[operacion] = {
+                'peticiones': len(ordenadas),
+                # Los logins ocurren antes de abrir la ventana y no cuentan en el throughput
+                'rps': round(len(ordenadas) / duracion, 1) if duracion and operacion != 'login' else None,
+                'p50_ms': percentil(ordenadas, 50),
+                'p90_ms': percentil(ordenadas, 90),
+                'p99_ms': percentil(ordenadas, 99),
+                'max_ms': round(ordenadas[-1], 2),
+                'estados': estados,
+                'tasa_409_pct': round(estados.get('409', 0) / len(ordenadas) * 100, 1),
+                'consultas_media': round(sum(consultas) / len(consultas), 1) if consultas else None,
+            }
+        return {
+            'duracion_s': round(duracion, 2),
+            'peticiones': total,
+            'rps': round(total / duracion, 1) if duracion else 0,
+            'errores_conexion': self.errores,
+            'operaciones': operaciones,
+        }
+
+
+def preparar_escenario(usuarios, email_sufijo=None):
+    """
+    Elige los usuarios de prueba y, para cada uno, los turnos de las pistas
+    de su comunidad y la fecha que se abre en la ventana de reserva.
+    """
+    qs = Usuario.objects.filter(is_active=True, community__isnull=False).select_related('community')
+    if email_sufijo:
+        qs = qs.filter(email__endswith=email_sufijo)
+    elegidos = list(qs.order_by('id')[:usuarios])
+    comunidades = {u.community_id for u in elegidos}
+    turnos = {}
+    for timeslot_id, court_id, community_id in TimeSlot.objects.filter(
+        court__community_id__in=comunidades
+    ).values_list('id', 'court_id', 'court__community_id'):
+        turnos.setdefault(community_id, []).append((court_id, timeslot_id))
+    hoy = timezone.localdate()
+    escenario = []
+    for usuario in elegidos:
+        if not turnos.get(usuario.community_id):
+            continue
+        fecha = hoy + timedelta(days=usuario.community.reserva_max_dias)
+        escenario.append({
+            'email': usuario.email,
+            'turnos': turnos[usuario.community_id],
+            'fecha': fecha.isoformat(),
+        })
+    return escenario
+
+
+async def _login(cliente, perfil, password, resultados):
+    inicio = time.perf_counter()
+    try:
+        estado, cabeceras, cuerpo = await cliente.peticion(
+            'POST', '/api/token/', {'email': perfil['email'], 'password': password}
+        )
+    except (ConnectionError, OSError, asyncio.IncompleteReadError):
+        resultados.errores += 1
+        return None
+    resultados.registrar('login', time.perf_counter() - inicio, estado, cabeceras)
+    if estado != 200:
+        return None
+    return json.loads(cuerpo)['access']
+
+
+async def _sesion(cliente, perfil, token, mezcla, fin, resultados, rng):
+    operaciones = list(mezcla)
+    pesos = [mezcla[o] for o in operaciones]
+    # La primera acción de todos es reservar: es el pico de la apertura
+    operacion = 'reservar'
+    while time.perf_counter() < fin:
+        court_id, timeslot_id = rng.choice(perfil['turnos'])
+        if operacion == 'reservar':
+            metodo, ruta, datos = 'POST', '/api/mis-reservas/', {
+                'court': court_id, 'timeslot': timeslot_id, 'date': perfil['fecha']
+            }
+        elif operacion == 'ocupados':
+            metodo, ruta, datos = 'GET', '/api/horarios-ocupados/?' + urlencode(
+                {'court': court_id, 'date_after': perfil['fecha']}
+            ), None
+        else:
+            metodo, ruta, datos = 'GET', '/api/dashboard/', None
+        inicio = time.perf_counter()
+        try:
+            estado, cabeceras, _ = await cliente.peticion(metodo, ruta, datos, token)
+        except (ConnectionError, OSError, asyncio.IncompleteReadError):
+            resultados.errores += 1
+            await asyncio.sleep(0.05)
+            continue
+        resultados.registrar(operacion, time.perf_counter() - inicio, estado, cabeceras)
+        operacion = rng.choices(operaciones, weights=pesos)[0]
+
+
+async def ejecutar(url, escenario, password, duracion, mezcla=None, seed=1):
+    mezcla = mezcla or MEZCLA_POR_DEFECTO
+    partes = urlsplit(url)
+    resultados = Resultados()
+    rng = random.Random(seed)
+    clientes = [ClienteHTTP(partes.hostname, partes.port or 80) for _ in escenario]
+    try:
+        # Los logins se hacen antes de abrir la ventana; el reloj empieza después
+        tokens = await asyncio.gather(*(
+            _login(cliente, perfil, password, resultados)
+            for cliente, perfil in zip(clientes, escenario)
+        ))
+        inicio = time.perf_counter()
+        fin = inicio + duracion
+        await asyncio.gather(*(
+            _sesion(cliente, perfil, token, mezcla, fin, resultados, random.Random(rng.random()))
+            for cliente, perfil, token in zip(clientes, escenario, tokens) if token
+        ))
+        resumen = resultados.resumen(time.perf_counter() - inicio)
+    finally:
+        await asyncio.gather(*(cliente.cerrar() for cliente in clientes))
+    resumen['usuarios'] = len(escenario)
+    resumen['logins_ok'] = sum(1 for t in tokens if t)
+    return resumen
@@ -0,0 +1,87 @@
+# reservations/comunidad.py
+#
+# Comunidad efectiva de cada petición: staff con ?community=, staff sin
+# filtro (todas), vecino (la suya) o ninguna. `ComunidadMiddleware` deja un
+# `ContextoComunidad` en la petición que se resuelve al primer uso (después de
+# la autenticación de DRF) y las vistas filtran con `ComunidadQuerysetMixin`.
+# La comunidad y sus pistas salen de la caché de referencia, así que acotar
+# una consulta a la comunidad no añade consultas ni JOINs.
+
+from django.utils.functional import cached_property
+from . import referencia
+
+
+class ContextoComunidad:
+    def __init__(self, request):
+        self.request = request
+
+    @cached_property
+    def _resolucion(self):
+        user = self.request.user
+        if getattr(user, 'is_staff', False):
+            parametro = self.request.GET.get('community')
+            if not parametro:
+                return None, True
+            try:
+                return int(parametro), False
+            except ValueError:
+                return None, False
+        return getattr(user, 'community_id', None), False
+
+    @property
+    def community_id(self):
+        return self._resolucion[0]
+
+    @property
+    def todas(self):
+        """Staff sin comunidad seleccionada."""
+        return self._resolucion[1]
+
+    @cached_property
+    def comunidad(self):
+        return referencia.comunidad(self.community_id)
+
+    @cached_property
+    def pistas_ids(self):
+        if not self.community_id:
+            return []
+        return list(referencia.datos(self.community_id).pistas)
+
+    def filtrar(self, qs, campo_comunidad=None, campo_pista=None, staff_ve_todo=True):
+        """
+        Acota `qs` a la comunidad efectiva, por su FK a comunidad
+        (`campo_comunidad`) o por su FK a pista (`campo_pista`, contra los ids
+        cacheados de las pistas).
+        """
+        if self.todas:
+            return qs if staff_ve_todo else qs.none()
+        if not self.community_id:
+            return qs.none()
+        if campo_pista:
+            return qs.filter(**{f'{campo_pista}__in': self.pistas_ids})
+        return qs.filter(**{campo_comunidad: self.community_id})
+
+
+def contexto_comunidad(request):
+    # Sirve tanto con el HttpRequest como con el Request de DRF que lo envuelve
+    request = getattr(request, '_request', request)
+    contexto = getattr(request, 'contexto_comunidad', None)
+    if contexto is None:
+        contexto = request.contexto_comunidad = ContextoComunidad(request)
+    return contexto
+
+
+class ComunidadQuerysetMixin:
+    campo_comunidad = 'community_id'
+    campo_pista = None
+    staff_ve_todo = True
+
+    @property
+    def contexto_comunidad(self):
+        return contexto_comunidad(self.request)
+
+    def filtrar_comunidad(self, qs):
+        return self.contexto_comunidad.filtrar(
+            qs, campo_comunidad=self.campo_comunidad, campo_pista=self.campo_pista,
+            staff_ve_todo=self.staff_ve_todo
+        )
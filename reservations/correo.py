@@ -0,0 +1,124 @@
+# reservations/correo.py
+#
+# Bandeja de salida de correo. Las peticiones solo escriben filas en
+# EmailOutbox (dentro de su transacción); el worker `enviar_correos` las
+# reclama con SELECT ... FOR UPDATE SKIP LOCKED y las envía por lotes
+# reutilizando una única conexión SMTP, con reintentos y backoff.
+
+import logging
+from datetime import timedelta
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+from .models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+REMITENTE = "info@pistareserva.com"
+MAX_INTENTOS = 6
+BACKOFF_BASE_S = 60
+BACKOFF_MAX_S = 3600
+# Tiempo que un worker se reserva un correo; si muere, otro lo recoge después
+LEASE_S = 300
+
+
+# --- Encolado (lado de la petición) ---
+def preparar_email(asunto, destinatario, plantilla_txt=None, plantilla_html=None, contexto=None,
+                   texto=None, html='', remitente=REMITENTE):
+    contexto = contexto or {}
+    if plantilla_html:
+        html = render_to_string(plantilla_html, contexto)
+    if plantilla_txt:
+        texto = render_to_string(plantilla_txt, contexto)
+    return EmailOutbox(asunto=asunto, remitente=remitente, destinatario=destinatario, texto=texto or '', html=html)
+
+
+def encolar_emails(correos):
+    return EmailOutbox.objects.bulk_create(correos)
+
+
+def encolar_email(*args, **kwargs):
+    correo = preparar_email(*args, **kwargs)
+    correo.save()
+    return correo
+
+
+# --- Worker ---
+def reclamar(lote):
+    """Marca como 'enviando' hasta `lote` correos vencidos y los devuelve."""
+    ahora = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(estado='pendiente', proximo_intento__lte=ahora)
+                | Q(estado='enviando', bloqueado_hasta__lt=ahora)
+            )
+            .order_by('proximo_intento', 'id')
+            .values_list('id', flat=True)[:lote]
+        )
+        if not ids:
+            return []
+        EmailOutbox.objects.filter(id__in=ids).update(
+            estado='enviando',
+            bloqueado_hasta=ahora + timedelta(seconds=LEASE_S),
+            intentos=F('intentos') + 1,
+        )
+    return list(EmailOutbox.objects.filter(id__in=ids).order_by('id'))
+
+
+def _backoff(intentos):
+    return min(BACKOFF_BASE_S * 2 ** (intentos - 1), BACKOFF_MAX_S)
+
+
+def enviar_lote(correos):
+    """Envía los correos reclamados por una sola conexión. Devuelve (enviados, fallidos)."""
+    enviados = fallidos = 0
+    conexion = get_connection()
+    try:
+        conexion.open()
+    except Exception as e:
+        logger.exception("No se pudo abrir la conexión de correo")
+        for correo in correos:
+            _fallo(correo, e)
+        return 0, len(correos)
+    try:
+        for correo in correos:
+            mensaje = EmailMultiAlternatives(
+                subject=correo.asunto, body=correo.texto, from_email=correo.remitente,
+                to=[correo.destinatario], connection=conexion,
+            )
+            if correo.html:
+                mensaje.attach_alternative(correo.html, "text/html")
+            try:
+                mensaje.send()
+            except Exception as e:
+                logger.warning("Error enviando correo %s: %s", correo.id, e)
+                _fallo(correo, e)
+                fallidos += 1
+                # El servidor puede haber cortado la sesión: se abre una nueva para el resto
+                conexion.close()
+                try:
+                    conexion.open()
+                except Exception:
+                    pass
+                continue
+            EmailOutbox.objects.filter(id=correo.id).update(
+                estado='enviado', enviado_at=timezone.now(), bloqueado_hasta=None, ultimo_error=''
+            )
+            enviados += 1
+    finally:
+        conexion.close()
+    return enviados, fallidos
+
+
+def _fallo(correo, error):
+    agotado = correo.intentos >= MAX_INTENTOS
+    EmailOutbox.objects.filter(id=correo.id).update(
+        estado='fallido' if agotado else 'pendiente',
+        proximo_intento=timezone.now() + timedelta(seconds=_backoff(correo.intentos)),
+        bloqueado_hasta=None,
+        ultimo_error=str(error)[:2000],
+    )
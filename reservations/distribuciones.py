@@ -0,0 +1,152 @@
+# reservations/distribuciones.py
+
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from math import ceil
+from itertools import chain
+from django.utils import timezone
+from .archivo import fuentes
+
+# Límites (en horas) de los tramos del histograma: <1h, 1-3h, 3-6h, ... , >=7 días
+TRAMOS_HORAS = (1, 3, 6, 12, 24, 36, 48, 72, 168)
+PERCENTILES = (50, 90, 99)
+CHUNK_SIZE = 2000
+
+
+# --- Utilidades ---
+def _etiquetas_tramos(tramos):
+    etiquetas = [f"<{tramos[0]}h"]
+    for inicio, fin in zip(tramos, tramos[1:]):
+        etiquetas.append(f"{inicio}-{fin}h")
+    etiquetas.append(f">={tramos[-1]}h")
+    return etiquetas
+
+
+def percentil(ordenados, p):
+    # Percentil por rango más cercano sobre una lista ya ordenada
+    if not ordenados:
+        return None
+    rango = max(1, ceil(p / 100 * len(ordenados)))
+    return round(ordenados[rango - 1], 2)
+
+
+def resumir(valores, tramos=TRAMOS_HORAS, umbrales=()):
+    """
+    Histograma y percentiles de una serie de horas. Para cada valor de
+    `umbrales` añade en `hasta` cuántos valores son <= que él.
+    """
+    ordenados = sorted(valores)
+    n = len(ordenados)
+    # Con la serie ordenada cada tramo se cuenta con dos búsquedas binarias
+    cortes = [0] + [bisect_left(ordenados, limite) for limite in tramos] + [n]
+    conteos = [fin - inicio for inicio, fin in zip(cortes, cortes[1:])]
+    resumen = {
+        'n': n,
+        'media': round(sum(ordenados) / n, 2) if n else None,
+        'histograma': [
+            {'tramo': etiqueta, 'total': total}
+            for etiqueta, total in zip(_etiquetas_tramos(tramos), conteos)
+        ],
+    }
+    for p in PERCENTILES:
+        resumen[f'p{p}'] = percentil(ordenados, p)
+    if umbrales:
+        resumen['hasta'] = {umbral: bisect_right(ordenados, umbral) for umbral in umbrales}
+    return resumen
+
+
+class _Acumulador:
+    """Agrupa en una sola pasada los valores global, por comunidad y por pista."""
+
+    def __init__(self):
+        self.total = array('d')
+        self.comunidades = {}
+        self.pistas = {}
+
+    def agregar(self, valor, court_id, court_name, community_id, community_name):
+        self.total.append(valor)
+        if community_id is not None:
+            self.comunidades.setdefault(community_id, (community_name, array('d')))[1].append(valor)
+        if court_id is not None:
+            self.pistas.setdefault(court_id, (court_name, array('d')))[1].append(valor)
+
+    def resultado(self, tramos=TRAMOS_HORAS, umbrales=()):
+        def _grupos(grupos):
+            return [
+                dict(id=clave, nombre=nombre, **resumir(valores, tramos, umbrales))
+                for clave, (nombre, valores) in sorted(grupos.items(), key=lambda item: str(item[1][0]))
+            ]
+        return {
+            'global': resumir(self.total, tramos, umbrales),
+            'por_comunidad': _grupos(self.comunidades),
+            'por_pista': _grupos(self.pistas),
+        }
+
+
+def _horas_hasta_inicio(filas, tz):
+    """
+    Convierte filas (date, start_time, instante, ...) en horas entre el
+    instante dado y el inicio del partido en hora local. El inicio se
+    calcula una sola vez por combinación de fecha y turno.
+    """
+    inicios = {}
+    for fila in filas:
+        fecha, hora, instante = fila[0], fila[1], fila[2]
+        if hora is None or instante is None:
+            continue
+        clave = (fecha, hora)
+        inicio = inicios.get(clave)
+        if inicio is None:
+            inicio = timezone.make_aware(datetime.combine(fecha, hora), tz)
+            inicios[clave] = inicio
+        yield (inicio - instante).total_seconds() / 3600, fila[3:]
+
+
+def _campos_filtro(community_id):
+    if community_id:
+        return {'court__community_id': community_id}
+    return {}
+
+
+def _distribucion(querysets, campo_instante, tramos, umbrales=()):
+    # Reservas vivas y archivadas se recorren en streaming una detrás de otra
+    filas = chain.from_iterable(
+        queryset.values_list(
+            'date', 'timeslot__start_time', campo_instante,
+            'court_id', 'court__name', 'court__community_id', 'court__community__name'
+        ).iterator(chunk_size=CHUNK_SIZE)
+        for queryset in querysets
+    )
+    acumulador = _Acumulador()
+    for horas, grupo in _horas_hasta_inicio(filas, timezone.get_current_timezone()):
+        acumulador.agregar(horas, *grupo)
+    return acumulador.resultado(tramos, umbrales)
+
+
+# --- Antelación con la que se reserva ---
+def distribucion_antelacion(fecha_inicio, fecha_fin, community_id=None, tramos=TRAMOS_HORAS):
+    reservas = [
+        modelo.objects.filter(
+            date__range=[fecha_inicio, fecha_fin],
+            estado='activa',
+            created_at__isnull=False,
+            **_campos_filtro(community_id)
+        )
+        for modelo, _ in fuentes(fecha_inicio)
+    ]
+    return _distribucion(reservas, 'created_at', tramos)
+
+
+# --- Antelación con la que se cancela ---
+def distribucion_cancelaciones(fecha_inicio, fecha_fin, community_id=None, tramos=TRAMOS_HORAS, umbrales=()):
+    cancelaciones = [
+        modelo.objects.filter(
+            date__range=[fecha_inicio, fecha_fin],
+            estado='cancelada',
+            cancelada_at__isnull=False,
+            **_campos_filtro(community_id)
+        )
+        for modelo, _ in fuentes(fecha_inicio)
+    ]
+    return _distribucion(cancelaciones, 'cancelada_at', tramos, umbrales)
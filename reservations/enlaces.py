@@ -0,0 +1,107 @@
+# reservations/enlaces.py
+#
+# Acortador de enlaces propio. El código es el sha256 de la URL en base62,
+# así que acortar la misma URL siempre da el mismo código y generar un
+# enlace es un INSERT local. La resolución pasa por un LRU en memoria por
+# proceso: los enlaces no cambian nunca, así que no hay que invalidarlo.
+
+import hashlib
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.urls import reverse
+from django.utils.http import url_has_allowed_host_and_scheme
+from .models import ShortLink
+
+ALFABETO = '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+LONGITUD_CODIGO = 7
+LONGITUD_MAXIMA = 16
+TAMANO_LRU = 4096
+
+
+def _base62(numero):
+    digitos = []
+    while numero:
+        numero, resto = divmod(numero, 62)
+        digitos.append(ALFABETO[resto])
+    return ''.join(reversed(digitos)) or ALFABETO[0]
+
+
+def _hash(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def acortar(url):
+    """Devuelve el ShortLink de `url`, creándolo si no existe."""
+    url_hash = _hash(url)
+    enlace = ShortLink.objects.filter(url_hash=url_hash).first()
+    if enlace:
+        return enlace
+    completo = _base62(int(url_hash, 16))
+    # Ante una colisión del prefijo con otra URL se alarga el código
+    for longitud in range(LONGITUD_CODIGO, LONGITUD_MAXIMA + 1):
+        try:
+            with transaction.atomic():
+                return ShortLink.objects.create(codigo=completo[:longitud], url=url, url_hash=url_hash)
+        except IntegrityError:
+            enlace = ShortLink.objects.filter(url_hash=url_hash).first()
+            if enlace:
+                # Otra petición lo ha creado a la vez
+                return enlace
+    raise IntegrityError(f"No se pudo generar un código libre para {url}")
+
+
+def destino_permitido(url):
+    """
+    Solo se acortan URLs absolutas de nuestros dominios (SHORTLINK_HOSTS_PERMITIDOS):
+    /s/<codigo>/ redirige desde nuestro dominio y no debe servir para llevar a
+    cualquier web.
+    """
+    return url.startswith(('http://', 'https://')) and url_has_allowed_host_and_scheme(
+        url, allowed_hosts=set(settings.SHORTLINK_HOSTS_PERMITIDOS)
+    )
+
+
+def url_corta(enlace, request=None):
+    ruta = reverse('enlace-corto', args=[enlace.codigo])
+    if settings.SHORTLINK_BASE_URL:
+        return settings.SHORTLINK_BASE_URL.rstrip('/') + ruta
+    if request is not None:
+        return request.build_absolute_uri(ruta)
+    return ruta
+
+
+# --- Resolución con LRU en memoria ---
+class _LRU:
+    def __init__(self, tamano):
+        self.tamano = tamano
+        self.datos = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, clave):
+        with self.lock:
+            valor = self.datos.get(clave)
+            if valor is not None:
+                self.datos.move_to_end(clave)
+            return valor
+
+    def set(self, clave, valor):
+        with self.lock:
+            self.datos[clave] = valor
+            self.datos.move_to_end(clave)
+            if len(self.datos) > self.tamano:
+                self.datos.popitem(last=False)
+
+
+_resueltos = _LRU(TAMANO_LRU)
+
+
+def resolver(codigo):
+    """URL de destino de `codigo` o None. Los códigos desconocidos no se cachean."""
+    url = _resueltos.get(codigo)
+    if url is None:
+        url = ShortLink.objects.filter(codigo=codigo).values_list('url', flat=True).first()
+        if url is not None:
+            _resueltos.set(codigo, url)
+    return url
@@ -0,0 +1,150 @@
+# reservations/imagenes.py
+#
+# Variantes de las imágenes de los anuncios. La subida solo guarda el
+# original y marca el anuncio como `imagen_pendiente`; el worker
+# `procesar_imagenes` reclama los pendientes (como `correo.reclamar`), genera
+# fuera de la transacción una versión WebP y otra JPEG de cada tamaño (sin
+# EXIF ni otros metadatos) y el serializer sirve esas URLs. Mientras la
+# imagen está pendiente el feed sigue usando el original.
+
+import logging
+import os
+from datetime import timedelta
+from io import BytesIO
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+from .models import Anuncio
+
+logger = logging.getLogger(__name__)
+
+# Lado mayor en píxeles de cada variante, de mayor a menor
+VARIANTES = (
+    ('completa', 2048),
+    ('feed', 1080),
+    ('miniatura', 320),
+)
+FORMATOS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+CARPETA = 'anuncios/variantes'
+# Tiempo que un worker se reserva un anuncio; si muere, otro lo recoge después
+LEASE_S = 600
+
+
+# --- Generación ---
+def _abrir(fichero):
+    imagen = Image.open(fichero)
+    # Los JPEG se decodifican directamente a escala reducida cuando basta
+    imagen.draft('RGB', (VARIANTES[0][1], VARIANTES[0][1]))
+    imagen = ImageOps.exif_transpose(imagen)
+    if imagen.mode in ('RGBA', 'LA', 'P'):
+        imagen = imagen.convert('RGBA')
+        fondo = Image.new('RGB', imagen.size, (255, 255, 255))
+        fondo.paste(imagen, mask=imagen.getchannel('A'))
+        return fondo
+    return imagen.convert('RGB')
+
+
+def _codificar(imagen, formato, opciones):
+    salida = BytesIO()
+    # Se guarda sin `exif` ni `icc_profile`: la imagen resultante no lleva metadatos
+    imagen.save(salida, formato, **opciones)
+    return ContentFile(salida.getvalue())
+
+
+def generar_variantes(anuncio, publicadas=()):
+    """
+    Genera y guarda las variantes de la imagen del anuncio; devuelve el dict
+    para `imagen_variantes`. Un fichero que ya existe en la ruta de una variante
+    y no está publicado (`publicadas`) es un resto de un intento interrumpido y
+    se sobrescribe.
+    """
+    campo = anuncio.imagen
+    storage = campo.storage
+    base = os.path.splitext(os.path.basename(campo.name))[0]
+    with campo.open('rb') as fichero:
+        imagen = _abrir(fichero)
+    variantes = {}
+    for nombre, lado in VARIANTES:
+        # Cada tamaño se reduce a partir del anterior, que ya es más pequeño que el original
+        imagen.thumbnail((lado, lado), Image.Resampling.LANCZOS)
+        variante = {'ancho': imagen.width, 'alto': imagen.height}
+        for extension, formato, opciones in FORMATOS:
+            ruta = f"{CARPETA}/{anuncio.id}/{base}-{nombre}.{extension}"
+            if ruta not in publicadas and storage.exists(ruta):
+                storage.delete(ruta)
+            variante[extension] = storage.save(ruta, _codificar(imagen, formato, opciones))
+        variantes[nombre] = variante
+    return variantes
+
+
+def rutas(variantes):
+    return {v[extension] for v in variantes.values() for extension, _, _ in FORMATOS if v.get(extension)}
+
+
+def borrar_variantes(storage, variantes, conservar=()):
+    for ruta in rutas(variantes) - set(conservar):
+        storage.delete(ruta)
+
+
+# --- Worker ---
+def reclamar(lote):
+    """
+    Reserva hasta `lote` anuncios pendientes durante LEASE_S y los devuelve.
+    La transacción solo cubre la reserva: el trabajo con las imágenes se hace
+    fuera, sin bloqueos de fila.
+    """
+    ahora = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Anuncio.objects.select_for_update(skip_locked=True)
+            .filter(imagen_pendiente=True)
+            .filter(Q(imagen_bloqueada_hasta__isnull=True) | Q(imagen_bloqueada_hasta__lt=ahora))
+            .order_by('id')
+            .values_list('id', flat=True)[:lote]
+        )
+        if not ids:
+            return []
+        Anuncio.objects.filter(id__in=ids).update(imagen_bloqueada_hasta=ahora + timedelta(seconds=LEASE_S))
+    return list(Anuncio.objects.filter(id__in=ids).order_by('id'))
+
+
+def procesar(anuncios):
+    """Genera las variantes de los anuncios reclamados. Devuelve (procesados, fallidos)."""
+    procesados = fallidos = 0
+    for anuncio in anuncios:
+        storage = anuncio.imagen.storage
+        anteriores = anuncio.imagen_variantes or {}
+        variantes = {}
+        try:
+            # Si se ha quitado la imagen solo queda borrar las variantes anteriores
+            if anuncio.imagen:
+                variantes = generar_variantes(anuncio, publicadas=rutas(anteriores))
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+            # Sin variantes el feed sigue sirviendo el original; no se reintenta
+            logger.warning("No se pudo procesar la imagen del anuncio %s: %s", anuncio.id, e)
+            fallidos += 1
+        else:
+            procesados += 1
+        # Solo se publica si la imagen sigue siendo la que se ha procesado y la reserva es nuestra
+        actualizados = Anuncio.objects.filter(
+            id=anuncio.id, imagen=anuncio.imagen.name, imagen_bloqueada_hasta=anuncio.imagen_bloqueada_hasta
+        ).update(imagen_variantes=variantes, imagen_pendiente=False, imagen_bloqueada_hasta=None)
+        if actualizados:
+            borrar_variantes(storage, anteriores, conservar=rutas(variantes))
+        else:
+            # El anuncio se ha borrado o ha cambiado de imagen mientras tanto
+            borrar_variantes(storage, variantes, conservar=rutas(anteriores))
+            Anuncio.objects.filter(
+                id=anuncio.id, imagen_bloqueada_hasta=anuncio.imagen_bloqueada_hasta
+            ).update(imagen_bloqueada_hasta=None)
+    return procesados, fallidos
+
+
+def marcar_todas():
+    """Vuelve a encolar todos los anuncios con imagen (p. ej. tras cambiar VARIANTES)."""
+    return Anuncio.objects.exclude(imagen='').exclude(imagen__isnull=True).update(imagen_pendiente=True)
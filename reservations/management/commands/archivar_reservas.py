@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from reservations.archivo import archivar, fecha_corte, pendientes
+
+
+class Command(BaseCommand):
+    help = "Mueve las reservas anteriores al horizonte de archivo (y sus invitaciones) a las tablas históricas"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=settings.RESERVAS_ARCHIVO_DIAS, help="Antigüedad mínima en días de las reservas a archivar")
+        parser.add_argument('--lote', type=int, default=1000, help="Reservas movidas por transacción")
+        parser.add_argument('--pausa', type=float, default=0.0, help="Segundos de espera entre lotes")
+        parser.add_argument('--dry-run', action='store_true', help="Solo cuenta lo que se archivaría")
+
+    def handle(self, *args, **options):
+        corte = fecha_corte(options['dias'])
+        if options['dry_run']:
+            total = pendientes(corte).count()
+            self.stdout.write(f"Se archivarían {total} reservas anteriores a {corte}")
+            return
+
+        def progreso(reservas, invitaciones):
+            self.stdout.write(f"  {reservas} reservas y {invitaciones} invitaciones archivadas")
+
+        reservas, invitaciones = archivar(options['dias'], options['lote'], options['pausa'], on_lote=progreso)
+        self.stdout.write(self.style.SUCCESS(
+            f"Archivadas {reservas} reservas y {invitaciones} invitaciones anteriores a {corte}"
+        ))
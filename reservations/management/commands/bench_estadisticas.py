@@ -0,0 +1,126 @@
+import json
+from datetime import date, timedelta
+from math import ceil
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from reservations import statistics
+from reservations.admin import estadisticas_dashboard_view
+from reservations.bench import base_de_datos_temporal, medir, cabecera_resultados, guardar, comparar
+from reservations.models import Usuario
+from reservations.sintetico import generar, TURNOS
+
+# Fecha fija para que los datos (y por tanto los tiempos) sean comparables entre commits
+FECHA_BASE = date(2025, 6, 30)
+PISTAS = 4
+# Historial máximo por comunidad; por encima se añaden comunidades
+DIAS_HISTORIAL = 365
+# Reservas por pista, turno y día que produce el generador con la ocupación por defecto
+RESERVAS_POR_TURNO_DIA = 0.28
+
+
+def _kpis(fecha_inicio, fecha_fin):
+    return {
+        'reservas_totales_periodo': lambda: statistics.reservas_totales_periodo(fecha_inicio, fecha_fin),
+        'reservas_por_pista': lambda: statistics.reservas_por_pista(fecha_inicio, fecha_fin),
+        'reservas_por_comunidad': lambda: statistics.reservas_por_comunidad(fecha_inicio, fecha_fin),
+        'porcentaje_ocupacion_por_pista': lambda: statistics.porcentaje_ocupacion_por_pista(fecha_inicio, fecha_fin),
+        'partidos_mes': lambda: statistics.partidos_mes(),
+        'partidos_semana': lambda: statistics.partidos_semana(),
+        'ranking_usuarios_activos': lambda: statistics.ranking_usuarios_activos(fecha_inicio, fecha_fin),
+        'proporcion_usuarios_vs_staff': lambda: statistics.proporcion_usuarios_vs_staff(fecha_inicio, fecha_fin),
+        'invitaciones_kpis': lambda: statistics.invitaciones_kpis(fecha_inicio, fecha_fin),
+        'tasa_cancelaciones': lambda: statistics.tasa_cancelaciones(fecha_inicio, fecha_fin),
+        'reservas_por_horario': lambda: statistics.reservas_por_horario(fecha_inicio, fecha_fin),
+        'participacion_media': lambda: statistics.participacion_media(fecha_inicio, fecha_fin),
+        'usuarios_nuevos': lambda: statistics.usuarios_nuevos(fecha_inicio, fecha_fin),
+        'tiempo_medio_antelacion': lambda: statistics.tiempo_medio_antelacion(fecha_inicio, fecha_fin),
+        'cancelaciones_ultimo_minuto': lambda: statistics.cancelaciones_ultimo_minuto(fecha_inicio, fecha_fin),
+        'participacion_por_vivienda': lambda: statistics.participacion_por_vivienda(fecha_inicio, fecha_fin),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide cada KPI de reservations/statistics.py y la vista estadisticas_dashboard_view "
+        "sobre datos sintéticos de tamaño creciente (en una base de datos de test)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanos', default='10000,100000,1000000',
+                            help="Número de reservas de cada conjunto de datos, separados por comas")
+        parser.add_argument('--rango-dias', type=int, default=30,
+                            help="Días del periodo consultado (terminando en la fecha base)")
+        parser.add_argument('--repeticiones', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--salida', default=None, help="Fichero JSON de resultados")
+        parser.add_argument('--comparar', default=None, help="JSON de una ejecución anterior con el que comparar")
+        parser.add_argument('--keepdb', action='store_true', help="Reutilizar la base de datos de test")
+
+    def handle(self, *args, **options):
+        try:
+            tamanos = [int(t) for t in options['tamanos'].split(',')]
+        except ValueError:
+            raise CommandError("--tamanos debe ser una lista de enteros separados por comas")
+        anterior = None
+        if options['comparar']:
+            with open(options['comparar']) as f:
+                anterior = json.load(f)
+
+        fecha_fin = FECHA_BASE
+        fecha_inicio = FECHA_BASE - timedelta(days=options['rango_dias'] - 1)
+        resultados = cabecera_resultados('estadisticas')
+        resultados.update(fecha_base=FECHA_BASE, periodo=[fecha_inicio, fecha_fin], resultados={})
+
+        with base_de_datos_temporal(keepdb=options['keepdb']):
+            for tamano in tamanos:
+                call_command('flush', interactive=False, verbosity=0)
+                # Reparte el tamaño entre comunidades de forma que todas lleguen a la fecha base
+                por_dia = PISTAS * len(TURNOS) * RESERVAS_POR_TURNO_DIA
+                comunidades = ceil(tamano / (por_dia * DIAS_HISTORIAL))
+                dias = ceil(tamano / (por_dia * comunidades))
+                self.stdout.write(f"Generando {tamano} reservas ({comunidades} comunidades, {dias} días)...")
+                totales = generar(
+                    comunidades=comunidades, pistas=PISTAS, viviendas=150,
+                    dias_historial=dias, dias_futuro=0, seed=options['seed'],
+                    fecha_base=FECHA_BASE, max_reservas=tamano, batch_size=5000,
+                )
+
+                medidas = {}
+                for nombre, funcion in _kpis(fecha_inicio, fecha_fin).items():
+                    medidas[nombre] = medir(funcion, options['repeticiones'])
+                    self._linea(tamano, nombre, medidas[nombre])
+                medidas['estadisticas_dashboard_view'] = medir(
+                    self._vista(fecha_inicio, fecha_fin), options['repeticiones']
+                )
+                self._linea(tamano, 'estadisticas_dashboard_view', medidas['estadisticas_dashboard_view'])
+                resultados['resultados'][str(tamano)] = medidas
+                resultados.setdefault('datos', {})[str(tamano)] = totales
+
+        if options['salida']:
+            guardar(resultados, options['salida'])
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['salida']}"))
+        if anterior:
+            self.stdout.write(f"\nComparación con {anterior.get('commit') or options['comparar']} (wall_s):")
+            for grupo, medida, antes, ahora, ratio in comparar(resultados, anterior):
+                self.stdout.write(f"  {grupo:>8} {medida:<32} {antes:>9} -> {ahora:<9} x{ratio}")
+
+    def _vista(self, fecha_inicio, fecha_fin):
+        staff = Usuario(email='bench@bench.test', nombre='bench', is_staff=True, is_active=True)
+        peticion = RequestFactory().get('/django-admin/estadisticas/', {
+            'from_date': fecha_inicio.isoformat(), 'to_date': fecha_fin.isoformat()
+        })
+        peticion.user = staff
+
+        def llamar():
+            respuesta = estadisticas_dashboard_view(peticion)
+            respuesta.render()
+            if respuesta.status_code != 200:
+                raise CommandError(f"La vista del dashboard ha devuelto {respuesta.status_code}")
+        return llamar
+
+    def _linea(self, tamano, nombre, medida):
+        self.stdout.write(
+            f"  {tamano:>8} {nombre:<32} {medida['wall_s']:>9}s {medida['consultas']:>6} consultas "
+            f"{medida['pico_memoria_kb']:>10} KB"
+        )
@@ -0,0 +1,97 @@
+import json
+from contextlib import contextmanager
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIClient
+from reservations.bench import base_de_datos_temporal, medir, cabecera_resultados, guardar, comparar
+from reservations.models import Usuario
+
+PASSWORD = 'bench-login-1234'
+
+
+@contextmanager
+def _contar_hashes():
+    """Cuenta las llamadas al hasher por defecto (una por cada PBKDF2 calculado)."""
+    clase = type(get_hasher())
+    original = clase.encode
+    contador = {'hashes': 0}
+
+    def encode(self, *args, **kwargs):
+        contador['hashes'] += 1
+        return original(self, *args, **kwargs)
+
+    clase.encode = encode
+    try:
+        yield contador
+    finally:
+        clase.encode = original
+
+
+class Command(BaseCommand):
+    help = "Mide el coste de POST /api/token/ (login correcto, contraseña incorrecta y email inexistente)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=20, help="Logins por escenario y repetición")
+        parser.add_argument('--repeticiones', type=int, default=3)
+        parser.add_argument('--salida', default=None, help="Fichero JSON de resultados")
+        parser.add_argument('--comparar', default=None, help="JSON de una ejecución anterior con el que comparar")
+        parser.add_argument('--keepdb', action='store_true', help="Reutilizar la base de datos de test")
+
+    def handle(self, *args, **options):
+        n = options['logins']
+        if n < 1:
+            raise CommandError("--logins debe ser mayor que 0")
+        anterior = None
+        if options['comparar']:
+            with open(options['comparar']) as f:
+                anterior = json.load(f)
+
+        resultados = cabecera_resultados('login')
+        resultados.update(hasher=get_hasher().algorithm, resultados={})
+        with base_de_datos_temporal(keepdb=options['keepdb']):
+            Usuario.objects.filter(email__endswith='@bench-login.test').delete()
+            # Hash real (no el fijo del generador sintético): es justo lo que se mide
+            password_hash = make_password(PASSWORD)
+            Usuario.objects.bulk_create([
+                Usuario(email=f"u{i}@bench-login.test", nombre=f"u{i}", password=password_hash, is_active=True)
+                for i in range(n)
+            ])
+            escenarios = {
+                'login_ok': (PASSWORD, 200),
+                'password_incorrecta': ('no-es-la-clave', 401),
+                'email_inexistente': (PASSWORD, 401),
+            }
+            medidas = {}
+            for nombre, (password, esperado) in escenarios.items():
+                emails = [
+                    f"{'nadie' if nombre == 'email_inexistente' else 'u'}{i}@bench-login.test" for i in range(n)
+                ]
+                with _contar_hashes() as contador:
+                    medida = medir(self._logins(emails, password, esperado), options['repeticiones'])
+                medida['ms_por_login'] = round(medida['wall_s'] / n * 1000, 2)
+                medida['logins_s'] = round(n / medida['wall_s'], 1) if medida['wall_s'] else None
+                medida['hashes_por_login'] = round(contador['hashes'] / (n * options['repeticiones']), 2)
+                medidas[nombre] = medida
+                self.stdout.write(
+                    f"  {nombre:<22} {medida['ms_por_login']:>8} ms/login {medida['logins_s']:>8} logins/s "
+                    f"{medida['hashes_por_login']:>5} hashes/login {medida['consultas']:>4} consultas"
+                )
+            resultados['resultados']['token'] = medidas
+
+        if options['salida']:
+            guardar(resultados, options['salida'])
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['salida']}"))
+        if anterior:
+            self.stdout.write(f"\nComparación con {anterior.get('commit') or options['comparar']} (wall_s):")
+            for grupo, medida, antes, ahora, ratio in comparar(resultados, anterior):
+                self.stdout.write(f"  {grupo:>8} {medida:<22} {antes:>9} -> {ahora:<9} x{ratio}")
+
+    def _logins(self, emails, password, esperado):
+        cliente = APIClient()
+
+        def llamar():
+            for email in emails:
+                respuesta = cliente.post('/api/token/', {'email': email, 'password': password}, format='json')
+                if respuesta.status_code != esperado:
+                    raise CommandError(f"Login de {email}: {respuesta.status_code}, se esperaba {esperado}")
+        return llamar
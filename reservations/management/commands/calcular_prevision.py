@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from reservations.prevision import calcular_prevision, DIAS_PREVISION, SEMANAS_HISTORIAL
+
+
+class Command(BaseCommand):
+    help = "Calcula la previsión de ocupación por turno para los próximos días a partir del historial de reservas"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=DIAS_PREVISION, help="Días a prever desde hoy")
+        parser.add_argument('--semanas', type=int, default=SEMANAS_HISTORIAL, help="Semanas de historial usadas como base")
+        parser.add_argument('--community', type=int, default=None, help="Limitar a una comunidad")
+
+    def handle(self, *args, **options):
+        total = calcular_prevision(
+            dias=options['dias'],
+            semanas=options['semanas'],
+            community_id=options['community'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Previsiones calculadas: {total}"))
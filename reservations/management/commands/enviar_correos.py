@@ -0,0 +1,28 @@
+import time
+from django.core.management.base import BaseCommand
+from reservations.correo import reclamar, enviar_lote
+
+
+class Command(BaseCommand):
+    help = "Envía los correos pendientes de la bandeja de salida (EmailOutbox)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=50, help="Correos reclamados y enviados por conexión SMTP")
+        parser.add_argument('--continuo', action='store_true', help="No terminar al vaciar la bandeja; seguir sondeando")
+        parser.add_argument('--espera', type=float, default=2.0, help="Segundos entre sondeos en modo continuo")
+
+    def handle(self, *args, **options):
+        total_enviados = total_fallidos = 0
+        while True:
+            correos = reclamar(options['lote'])
+            if correos:
+                enviados, fallidos = enviar_lote(correos)
+                total_enviados += enviados
+                total_fallidos += fallidos
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"Lote: {enviados} enviados, {fallidos} con error")
+                continue
+            if not options['continuo']:
+                break
+            time.sleep(options['espera'])
+        self.stdout.write(self.style.SUCCESS(f"Correos enviados: {total_enviados}, con error: {total_fallidos}"))
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from reservations.notificaciones import enviar_resumenes, LOTE_DESTINATARIOS
+
+
+class Command(BaseCommand):
+    help = "Agrupa las notificaciones pendientes y encola un correo resumen por destinatario"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutos', type=int, default=settings.NOTIFICACIONES_RESUMEN_MINUTOS,
+                            help="Antigüedad mínima del primer evento pendiente para enviar el resumen")
+        parser.add_argument('--lote', type=int, default=LOTE_DESTINATARIOS, help="Destinatarios por transacción")
+
+    def handle(self, *args, **options):
+        correos, eventos = enviar_resumenes(options['minutos'], options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"Resúmenes encolados: {correos} ({eventos} eventos)"))
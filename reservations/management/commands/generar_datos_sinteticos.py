@@ -0,0 +1,52 @@
+import time as _time
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from reservations.sintetico import generar, PASSWORD_SINTETICO
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera comunidades, viviendas, usuarios, pistas, turnos, reservas, invitaciones, "
+        "cancelaciones y anuncios sintéticos. Misma semilla y fecha base => mismos datos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--comunidades', type=int, default=1)
+        parser.add_argument('--pistas', type=int, default=2, help="Pistas por comunidad")
+        parser.add_argument('--viviendas', type=int, default=60, help="Viviendas por comunidad")
+        parser.add_argument('--dias-historial', type=int, default=90)
+        parser.add_argument('--dias-futuro', type=int, default=2)
+        parser.add_argument('--ocupacion', type=float, default=0.55, help="Ocupación base antes de aplicar los factores de día y hora")
+        parser.add_argument('--max-reservas', type=int, default=None, help="Detener la generación al alcanzar este número de reservas")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--fecha-base', default=None, help="Fecha de referencia YYYY-MM-DD (por defecto hoy)")
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--password', default=PASSWORD_SINTETICO, help="Contraseña común de todos los usuarios generados")
+
+    def handle(self, *args, **options):
+        fecha_base = None
+        if options['fecha_base']:
+            try:
+                fecha_base = datetime.strptime(options['fecha_base'], "%Y-%m-%d").date()
+            except ValueError:
+                raise CommandError("--fecha-base debe tener formato YYYY-MM-DD")
+
+        inicio = _time.perf_counter()
+        totales = generar(
+            comunidades=options['comunidades'],
+            pistas=options['pistas'],
+            viviendas=options['viviendas'],
+            dias_historial=options['dias_historial'],
+            dias_futuro=options['dias_futuro'],
+            ocupacion=options['ocupacion'],
+            seed=options['seed'],
+            fecha_base=fecha_base,
+            batch_size=options['batch_size'],
+            max_reservas=options['max_reservas'],
+            password=options['password'],
+            stdout=self.stdout,
+        )
+        duracion = _time.perf_counter() - inicio
+        for modelo, total in sorted(totales.items()):
+            self.stdout.write(f"  {modelo}: {total}")
+        self.stdout.write(self.style.SUCCESS(f"Datos sintéticos generados en {duracion:.1f}s"))
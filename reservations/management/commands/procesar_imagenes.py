@@ -0,0 +1,31 @@
+import time
+from django.core.management.base import BaseCommand
+from reservations.imagenes import marcar_todas, reclamar, procesar
+
+
+class Command(BaseCommand):
+    help = "Genera las variantes (WebP/JPEG, sin metadatos) de las imágenes de anuncios pendientes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=10, help="Anuncios reclamados por vuelta")
+        parser.add_argument('--continuo', action='store_true', help="No terminar al vaciar la cola; seguir sondeando")
+        parser.add_argument('--espera', type=float, default=2.0, help="Segundos entre sondeos en modo continuo")
+        parser.add_argument('--todas', action='store_true', help="Volver a encolar antes todos los anuncios con imagen")
+
+    def handle(self, *args, **options):
+        if options['todas']:
+            self.stdout.write(f"Anuncios encolados: {marcar_todas()}")
+        total_procesados = total_fallidos = 0
+        while True:
+            anuncios = reclamar(options['lote'])
+            if anuncios:
+                procesados, fallidos = procesar(anuncios)
+                total_procesados += procesados
+                total_fallidos += fallidos
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"Lote: {procesados} procesadas, {fallidos} con error")
+                continue
+            if not options['continuo']:
+                break
+            time.sleep(options['espera'])
+        self.stdout.write(self.style.SUCCESS(f"Imágenes procesadas: {total_procesados}, con error: {total_fallidos}"))
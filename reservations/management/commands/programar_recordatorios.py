@@ -0,0 +1,31 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from reservations.recordatorios import Programador, REFRESCO_S
+
+
+class Command(BaseCommand):
+    help = "Encola los recordatorios de partido; duerme hasta el siguiente vencimiento en lugar de sondear la tabla"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutos-antes', type=int, default=settings.RECORDATORIO_MINUTOS_ANTES,
+                            help="Antelación del recordatorio respecto al inicio del partido")
+        parser.add_argument('--refresco', type=int, default=REFRESCO_S,
+                            help="Segundos entre lecturas de reservas nuevas")
+        parser.add_argument('--una-vez', action='store_true', help="Envía lo vencido y termina (uso desde cron)")
+
+    def handle(self, *args, **options):
+        programador = Programador(options['minutos_antes'], options['refresco'])
+        if options['una_vez']:
+            programador.cargar_vencidos()
+            self.stdout.write(f"Recordatorios vencidos: {len(programador.heap)}")
+            enviados = programador.enviar(programador.vencidos())
+            self.stdout.write(self.style.SUCCESS(f"Recordatorios encolados: {enviados}"))
+            return
+        programador.cargar()
+        self.stdout.write(f"Recordatorios programados: {len(programador.heap)}")
+        while True:
+            enviados = programador.ciclo()
+            if enviados:
+                self.stdout.write(f"Recordatorios encolados: {enviados}")
+            time.sleep(programador.segundos_hasta_siguiente())
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from reservations.carga import ejecutar, preparar_escenario, MEZCLA_POR_DEFECTO
+from reservations.sintetico import PASSWORD_SINTETICO, DOMINIO_EMAIL
+
+
+class Command(BaseCommand):
+    help = (
+        "Simula la apertura de la ventana de reservas: K usuarios hacen login y lanzan "
+        "reservas, consultas de horarios ocupados y del dashboard contra un servidor local."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8765', help="Servidor a probar")
+        parser.add_argument('--usuarios', type=int, default=50, help="Usuarios virtuales concurrentes")
+        parser.add_argument('--duracion', type=float, default=20, help="Segundos de carga tras los logins")
+        parser.add_argument('--password', default=PASSWORD_SINTETICO)
+        parser.add_argument('--todos-los-usuarios', action='store_true',
+                            help=f"No limitar a los usuarios sintéticos (@{DOMINIO_EMAIL})")
+        parser.add_argument('--mezcla', default=None,
+                            help="Pesos de la mezcla, p.ej. reservar:1,ocupados:6,dashboard:3")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--servidor', action='store_true',
+                            help="Arrancar un runserver local en la URL indicada durante la prueba")
+        parser.add_argument('--salida', default=None, help="Guardar el resumen en este fichero JSON")
+
+    def handle(self, *args, **options):
+        mezcla = MEZCLA_POR_DEFECTO
+        if options['mezcla']:
+            try:
+                mezcla = {k: float(v) for k, v in (p.split(':') for p in options['mezcla'].split(','))}
+            except ValueError:
+                raise CommandError("--mezcla debe tener formato operacion:peso,operacion:peso")
+            desconocidas = set(mezcla) - set(MEZCLA_POR_DEFECTO)
+            if desconocidas:
+                raise CommandError(f"Operaciones desconocidas: {', '.join(sorted(desconocidas))}")
+
+        sufijo = None if options['todos_los_usuarios'] else f"@{DOMINIO_EMAIL}"
+        escenario = preparar_escenario(options['usuarios'], email_sufijo=sufijo)
+        if not escenario:
+            raise CommandError("No hay usuarios con comunidad y pistas; ejecuta antes generar_datos_sinteticos")
+
+        servidor = self._arrancar_servidor(options['url']) if options['servidor'] else None
+        try:
+            resumen = asyncio.run(ejecutar(
+                options['url'], escenario, options['password'], options['duracion'],
+                mezcla=mezcla, seed=options['seed']
+            ))
+        finally:
+            if servidor:
+                servidor.terminate()
+                servidor.wait(timeout=10)
+
+        resumen['base_de_datos'] = settings.DATABASES['default']['ENGINE'].rsplit('.', 1)[-1]
+        self._imprimir(resumen)
+        if options['salida']:
+            with open(options['salida'], 'w') as f:
+                json.dump(resumen, f, indent=2)
+
+    def _arrancar_servidor(self, url):
+        partes = urlsplit(url)
+        entorno = dict(os.environ, CONTAR_CONSULTAS='True')
+        servidor = subprocess.Popen(
+            [sys.executable, 'manage.py', 'runserver', '--noreload', f"{partes.hostname}:{partes.port}"],
+            cwd=settings.BASE_DIR, env=entorno,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        limite = time.monotonic() + 30
+        while time.monotonic() < limite:
+            if servidor.poll() is not None:
+                raise CommandError("El servidor local no ha arrancado")
+            try:
+                socket.create_connection((partes.hostname, partes.port), timeout=0.5).close()
+                return servidor
+            except OSError:
+                time.sleep(0.2)
+        servidor.terminate()
+        raise CommandError("El servidor local no responde")
+
+    def _imprimir(self, resumen):
+        self.stdout.write(
+            f"Usuarios: {resumen['usuarios']} (login ok: {resumen['logins_ok']})  "
+            f"Duración: {resumen['duracion_s']}s  Peticiones: {resumen['peticiones']}  "
+            f"Throughput: {resumen['rps']} req/s  Errores de conexión: {resumen['errores_conexion']}"
+        )
+        self.stdout.write(f"{'operación':<10} {'n':>7} {'req/s':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'409 %':>6} {'SQL':>5}  estados")
+        for operacion, datos in resumen['operaciones'].items():
+            consultas = datos['consultas_media'] if datos['consultas_media'] is not None else '-'
+            rps = datos['rps'] if datos['rps'] is not None else '-'
+            self.stdout.write(
+                f"{operacion:<10} {datos['peticiones']:>7} {rps:>8} {datos['p50_ms']:>8} "
+                f"{datos['p90_ms']:>8} {datos['p99_ms']:>8} {datos['tasa_409_pct']:>6} {consultas:>5}  {datos['estados']}"
+            )
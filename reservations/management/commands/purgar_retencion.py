@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from reservations.retencion import politicas, procesar
+
+
+class Command(BaseCommand):
+    help = "Borra o anonimiza las filas que han superado su periodo de retención, en lotes pequeños"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500, help="Filas por transacción")
+        parser.add_argument('--pausa', type=float, default=0.2, help="Segundos de espera entre lotes")
+        parser.add_argument('--dry-run', action='store_true', help="Solo estima cuántas filas se procesarían")
+
+    def handle(self, *args, **options):
+        for politica in politicas():
+            if options['dry_run']:
+                total = politica.queryset.count()
+                lotes = -(-total // options['lote'])
+                self.stdout.write(
+                    f"{politica.nombre}: {total} filas en {lotes} lotes "
+                    f"(≥ {max(lotes - 1, 0) * options['pausa']:.1f}s de pausas)"
+                )
+                continue
+            total, segundos = procesar(politica, options['lote'], options['pausa'])
+            ritmo = total / segundos if segundos else 0
+            self.stdout.write(f"{politica.nombre}: {total} filas en {segundos:.2f}s ({ritmo:.0f} filas/s)")
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS("Purga completada"))
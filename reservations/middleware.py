@@ -0,0 +1,66 @@
+# reservations/middleware.py
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from .comunidad import ContextoComunidad
+from .router import METODOS_SEGUROS, marcar_escritura
+
+
+class ContadorConsultasMiddleware:
+    """
+    Añade la cabecera X-DB-Queries con el número de consultas SQL de cada
+    petición. Solo se activa con CONTAR_CONSULTAS=True (pruebas de carga).
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'CONTAR_CONSULTAS', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        contador = [0]
+
+        def contar(execute, sql, params, many, context):
+            contador[0] += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(contar):
+            response = self.get_response(request)
+        response['X-DB-Queries'] = str(contador[0])
+        return response
+
+
+class ComunidadMiddleware:
+    """
+    Deja en `request.contexto_comunidad` la comunidad efectiva de la petición.
+    Se resuelve al primer uso: con JWT el usuario lo pone DRF ya dentro de la vista.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.contexto_comunidad = ContextoComunidad(request)
+        return self.get_response(request)
+
+
+class EscrituraRecienteMiddleware:
+    """
+    Tras una petición de escritura con éxito, las lecturas del usuario van al
+    primario durante REPLICA_STICKY_SEGUNDOS (ver `reservations/router.py`).
+    """
+
+    def __init__(self, get_response):
+        if getattr(settings, 'REPLICA_DB_ALIAS', None) not in settings.DATABASES:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in METODOS_SEGUROS and response.status_code < 400:
+            # Con JWT el usuario lo ha puesto DRF durante la vista
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                marcar_escritura(user.pk)
+        return response
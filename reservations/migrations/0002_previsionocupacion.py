@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-19 14:09
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrevisionOcupacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('apertura', models.DateTimeField(help_text='Momento en que se abre la reserva de ese turno')),
+                ('probabilidad', models.FloatField(help_text='Probabilidad estimada de que el turno se reserve (0-1)')),
+                ('horas_hasta_completo', models.FloatField(blank=True, help_text='Horas estimadas desde la apertura hasta que se reserva', null=True)),
+                ('muestras', models.PositiveIntegerField(default=0)),
+                ('calculado_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('court', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='previsiones', to='reservations.court')),
+                ('timeslot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='previsiones', to='reservations.timeslot')),
+            ],
+            options={
+                'verbose_name_plural': 'Previsiones de ocupación',
+                'ordering': ['date', 'apertura'],
+                'constraints': [models.UniqueConstraint(fields=('timeslot', 'date'), name='unique_prevision_per_timeslot_date')],
+            },
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2 on 2026-10-19 14:14
+
+from django.db import migrations, models
+
+
+def copiar_cancelaciones(apps, schema_editor):
+    Reservation = apps.get_model("reservations", "Reservation")
+    ReservationCancelada = apps.get_model("reservations", "ReservationCancelada")
+
+    Reservation.objects.filter(estado="cancelada").update(slot_activo=None)
+
+    # `created_at` es auto_now_add: sin esto bulk_create pondría la fecha de la
+    # migración en lugar de la de la reserva original
+    created_at = Reservation._meta.get_field("created_at")
+    created_at.auto_now_add = False
+    try:
+        # Las cancelaciones sin usuario, pista o turno no caben en Reservation y se descartan
+        canceladas = ReservationCancelada.objects.filter(
+            user__isnull=False, court__isnull=False, timeslot__isnull=False
+        ).order_by("id")
+        lote = []
+        for cancelada in canceladas.iterator(chunk_size=1000):
+            lote.append(
+                Reservation(
+                    user_id=cancelada.user_id,
+                    court_id=cancelada.court_id,
+                    timeslot_id=cancelada.timeslot_id,
+                    date=cancelada.date,
+                    created_at=cancelada.created_at,
+                    estado="cancelada",
+                    cancelada_at=cancelada.cancelada_at,
+                    slot_activo=None,
+                )
+            )
+            if len(lote) >= 1000:
+                Reservation.objects.bulk_create(lote)
+                lote = []
+        if lote:
+            Reservation.objects.bulk_create(lote)
+    finally:
+        created_at.auto_now_add = True
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reservations", "0002_previsionocupacion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reservation",
+            name="cancelada_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="reservation",
+            name="slot_activo",
+            field=models.BooleanField(default=True, editable=False, null=True),
+        ),
+        migrations.RemoveConstraint(
+            model_name="reservation",
+            name="unique_reservation_per_court_timeslot_date",
+        ),
+        migrations.RunPython(copiar_cancelaciones, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="reservation",
+            constraint=models.UniqueConstraint(
+                fields=("court", "date", "timeslot", "slot_activo"),
+                name="unique_active_reservation_per_court_timeslot_date",
+            ),
+        ),
+        migrations.DeleteModel(
+            name="ReservationCancelada",
+        ),
+    ]
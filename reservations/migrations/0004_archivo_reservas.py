@@ -0,0 +1,116 @@
+# Generated by Django 5.2 on 2026-10-19 14:17
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reservations", "0003_reserva_cancelacion_logica"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReservaArchivada",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("date", models.DateField(db_index=True)),
+                ("created_at", models.DateTimeField()),
+                (
+                    "estado",
+                    models.CharField(
+                        choices=[("activa", "Activa"), ("cancelada", "Cancelada")],
+                        default="activa",
+                        max_length=20,
+                    ),
+                ),
+                ("cancelada_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "archivada_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "court",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="reservations.court",
+                    ),
+                ),
+                (
+                    "timeslot",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="reservations.timeslot",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="reservas_archivadas",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Reservas archivadas",
+            },
+        ),
+        migrations.CreateModel(
+            name="InvitacionArchivada",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("email", models.EmailField(blank=True, max_length=254, null=True)),
+                ("token", models.CharField(max_length=100)),
+                (
+                    "estado",
+                    models.CharField(
+                        choices=[
+                            ("pendiente", "Pendiente"),
+                            ("aceptada", "Aceptada"),
+                            ("rechazada", "Rechazada"),
+                        ],
+                        default="pendiente",
+                        max_length=20,
+                    ),
+                ),
+                ("fecha_invitacion", models.DateTimeField()),
+                (
+                    "nombre_invitado",
+                    models.CharField(
+                        blank=True,
+                        max_length=255,
+                        null=True,
+                        verbose_name="Nombre del invitado",
+                    ),
+                ),
+                (
+                    "invitado",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "reserva",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="invitaciones",
+                        to="reservations.reservaarchivada",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Invitaciones archivadas",
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2 on 2026-10-19 14:21
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reservations", "0004_archivo_reservas"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmailOutbox",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("asunto", models.CharField(max_length=255)),
+                ("remitente", models.CharField(max_length=254)),
+                ("destinatario", models.EmailField(max_length=254)),
+                ("texto", models.TextField()),
+                ("html", models.TextField(blank=True)),
+                (
+                    "estado",
+                    models.CharField(
+                        choices=[
+                            ("pendiente", "Pendiente"),
+                            ("enviando", "Enviando"),
+                            ("enviado", "Enviado"),
+                            ("fallido", "Fallido"),
+                        ],
+                        default="pendiente",
+                        max_length=20,
+                    ),
+                ),
+                ("intentos", models.PositiveIntegerField(default=0)),
+                (
+                    "proximo_intento",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "bloqueado_hasta",
+                    models.DateTimeField(
+                        blank=True,
+                        help_text="Fin de la reserva del worker que lo está enviando",
+                        null=True,
+                    ),
+                ),
+                ("ultimo_error", models.TextField(blank=True)),
+                ("creado_at", models.DateTimeField(auto_now_add=True)),
+                ("enviado_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name_plural": "Correos salientes",
+                "indexes": [
+                    models.Index(
+                        fields=["estado", "proximo_intento"],
+                        name="outbox_estado_proximo_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2 on 2026-10-19 14:22
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reservations", "0005_email_outbox"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NotificacionPendiente",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("destinatario", models.EmailField(max_length=254)),
+                ("nombre_destinatario", models.CharField(blank=True, max_length=255)),
+                (
+                    "tipo",
+                    models.CharField(
+                        choices=[
+                            ("invitacion", "Invitación"),
+                            ("aceptada", "Invitación aceptada"),
+                            ("rechazada", "Invitación rechazada"),
+                            ("anuncio", "Anuncio"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("datos", models.JSONField(default=dict)),
+                ("creado_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                "verbose_name_plural": "Notificaciones pendientes",
+                "ordering": ["creado_at", "id"],
+                "indexes": [
+                    models.Index(
+                        fields=["destinatario", "creado_at"],
+                        name="notif_destinatario_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2 on 2026-10-19 14:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reservations", "0006_notificaciones_pendientes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ShortLink",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("codigo", models.CharField(max_length=16, unique=True)),
+                ("url", models.TextField()),
+                (
+                    "url_hash",
+                    models.CharField(
+                        help_text="sha256 de la URL de destino",
+                        max_length=64,
+                        unique=True,
+                    ),
+                ),
+                ("creado_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name_plural": "Enlaces cortos",
+            },
+        ),
+    ]
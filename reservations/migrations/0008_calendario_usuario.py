@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-19 14:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reservations", "0007_enlaces_cortos"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CalendarioUsuario",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("token", models.CharField(max_length=64, unique=True)),
+                ("contenido", models.TextField(blank=True)),
+                ("etag", models.CharField(blank=True, max_length=64)),
+                ("pendiente", models.BooleanField(default=True)),
+                ("generado_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "usuario",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="calendario",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Calendarios de usuario",
+            },
+        ),
+    ]
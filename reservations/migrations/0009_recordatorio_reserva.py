@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-19 14:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reservations", "0008_calendario_usuario"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reservation",
+            name="recordatorio_enviado",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="reservation",
+            index=models.Index(
+                fields=["date", "recordatorio_enviado"],
+                name="reserva_date_recordatorio_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 14:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reservations", "0009_recordatorio_reserva"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="usuario",
+            name="token_version",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
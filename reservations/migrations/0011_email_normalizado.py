@@ -0,0 +1,44 @@
+# Generated by Django 5.2 on 2026-10-19 14:31
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reservations", "0010_token_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="invitadoexterno",
+            name="email_normalizado",
+            field=models.GeneratedField(
+                db_index=True,
+                db_persist=True,
+                expression=django.db.models.functions.text.Lower("email"),
+                output_field=models.CharField(max_length=254, null=True),
+            ),
+        ),
+        migrations.AddField(
+            model_name="reservationinvitation",
+            name="email_normalizado",
+            field=models.GeneratedField(
+                db_index=True,
+                db_persist=True,
+                expression=django.db.models.functions.text.Lower("email"),
+                output_field=models.CharField(max_length=254, null=True),
+            ),
+        ),
+        migrations.AddField(
+            model_name="usuario",
+            name="email_normalizado",
+            field=models.GeneratedField(
+                db_index=True,
+                db_persist=True,
+                expression=django.db.models.functions.text.Lower("email"),
+                output_field=models.CharField(max_length=254, null=True),
+            ),
+        ),
+    ]
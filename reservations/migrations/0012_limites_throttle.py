@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-19 14:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reservations", "0011_email_normalizado"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="community",
+            name="limite_ocupados_minuto",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="Consultas de horarios ocupados por minuto y usuario (vacío = valor global)",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="community",
+            name="limite_reservas_minuto",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="Reservas por minuto y usuario (vacío = valor global)",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-19 14:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reservations", "0012_limites_throttle"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="anuncio",
+            name="imagen_pendiente",
+            field=models.BooleanField(
+                db_index=True,
+                default=False,
+                help_text="La imagen está a la espera de generar sus variantes",
+            ),
+        ),
+        migrations.AddField(
+            model_name="anuncio",
+            name="imagen_variantes",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                help_text="Versiones redimensionadas de la imagen (procesar_imagenes)",
+            ),
+        ),
+    ]
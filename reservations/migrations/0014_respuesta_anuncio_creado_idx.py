@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-19 14:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reservations", "0013_imagen_variantes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="respuestaanuncio",
+            index=models.Index(
+                fields=["anuncio", "creado"], name="respuesta_anuncio_creado_idx"
+            ),
+        ),
+    ]
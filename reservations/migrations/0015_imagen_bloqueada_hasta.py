@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-19 14:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reservations", "0014_respuesta_anuncio_creado_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="anuncio",
+            name="imagen_bloqueada_hasta",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Fin de la reserva del worker que la está procesando",
+                null=True,
+            ),
+        ),
+    ]
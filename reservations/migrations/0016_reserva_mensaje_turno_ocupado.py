@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-19 15:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reservations", "0015_imagen_bloqueada_hasta"),
+    ]
+
+    operations = [
+        migrations.AlterConstraint(
+            model_name="reservation",
+            name="unique_active_reservation_per_court_timeslot_date",
+            constraint=models.UniqueConstraint(
+                fields=("court", "date", "timeslot", "slot_activo"),
+                name="unique_active_reservation_per_court_timeslot_date",
+                violation_error_message="Este horario ya está reservado",
+            ),
+        ),
+    ]
@@ -1,9 +1,25 @@
 from django.db import models
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 import secrets
 
+
+def normalizar_email(email):
+    # Misma normalización que la columna generada `email_normalizado`
+    return email.lower() if email else email
+
+
+def _campo_email_normalizado():
+    # Columna calculada por la base de datos: se mantiene sola también en bulk_create/update()
+    return models.GeneratedField(
+        expression=Lower('email'),
+        output_field=models.CharField(max_length=254, null=True),
+        db_persist=True,
+        db_index=True,
+    )
+
 class Community(models.Model):
     id = models.BigAutoField(primary_key=True)  # <--- Asegura que es bigint(20)
     name = models.CharField("Nombre de la comunidad", max_length=100)
@@ -11,6 +27,8 @@ class Community(models.Model):
     code = models.CharField(max_length=20, unique=True, null=False, blank=False, help_text="Código de registro de la comunidad")
     reserva_hora_apertura_pasado = models.TimeField(default="08:00", help_text="Hora apertura reservas para pasado mañana")
     reserva_max_dias = models.PositiveIntegerField(default=2, help_text="Máximo días vista (0=hoy, 1=mañana, 2=pasado mañana)")
+    limite_reservas_minuto = models.PositiveIntegerField(null=True, blank=True, help_text="Reservas por minuto y usuario (vacío = valor global)")
+    limite_ocupados_minuto = models.PositiveIntegerField(null=True, blank=True, help_text="Consultas de horarios ocupados por minuto y usuario (vacío = valor global)")
     # Puedes añadir más campos si en el futuro necesitas reglas distintas
     # # Otros campos comunes a todas las comunidades (ej: contacto, logo, etc.)
 
@@ -63,6 +81,7 @@ class Usuario(AbstractBaseUser, PermissionsMixin):
     nombre = models.CharField(_('nombre'), max_length=150)
     apellido = models.CharField(_('apellido'), max_length=150, blank=True)
     email = models.EmailField(_('email'), unique=True)
+    email_normalizado = _campo_email_normalizado()
     vivienda = models.ForeignKey(Vivienda, on_delete=models.SET_NULL, null=True, blank=True)
     community = models.ForeignKey(Community, on_delete=models.SET_NULL, null=True, blank=True)  # Añadido
     is_staff = models.BooleanField(_('staff'), default=False)
@@ -71,6 +90,8 @@ class Usuario(AbstractBaseUser, PermissionsMixin):
     date_joined = models.DateTimeField(auto_now_add=True)
     accepted_terms = models.BooleanField(default=False)
     terms_accepted_at = models.DateTimeField(null=True, blank=True)
+    # Se incrementa al cambiar la contraseña: invalida los JWT emitidos antes
+    token_version = models.PositiveIntegerField(default=0, editable=False)
 
     USERNAME_FIELD = 'email'  # Ahora el nombre es el campo principal
     REQUIRED_FIELDS = ['nombre']  # Campos requeridos para createsuperuser
@@ -91,6 +112,16 @@ class Usuario(AbstractBaseUser, PermissionsMixin):
         else:
             return self.email  # o self.email según prefieras
 
+    def save(self, *args, **kwargs):
+        # `_password` solo está puesto tras un set_password() explícito (no en la
+        # actualización automática del hash que hace check_password)
+        if self._password is not None and self.pk:
+            self.token_version += 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'password' in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'token_version'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.nombre} {self.apellido}".strip()
 
@@ -106,7 +137,8 @@ class Court(models.Model):
     # ... otros campos (ej: tipo de superficie, capacidad)
 
     def __str__(self):
-        return f"{self.name} - {self.community}"
+        from .referencia import comunidad
+        return f"{self.name} - {comunidad(self.community_id)}"
     class Meta:
         verbose_name_plural = "Pistas"
 
@@ -121,7 +153,10 @@ class TimeSlot(models.Model):
         ordering = ['start_time']
 
     def __str__(self):
-        return f"{self.court.name} - {self.start_time.strftime('%H:%M')}–{self.end_time.strftime('%H:%M')}"
+        from .referencia import pista
+        court = pista(self.court_id)
+        nombre = court.name if court is not None else f"Pista {self.court_id}"
+        return f"{nombre} - {self.start_time.strftime('%H:%M')}–{self.end_time.strftime('%H:%M')}"
 
 class Reservation(models.Model):  
     ESTADOS = (
@@ -135,26 +170,69 @@ class Reservation(models.Model):
     date = models.DateField()
     created_at = models.DateTimeField(auto_now_add=True)
     estado = models.CharField(max_length=20, choices=ESTADOS, default='activa')  # ← NUEVO CAMPO
+    cancelada_at = models.DateTimeField(null=True, blank=True)
+    # True mientras la reserva ocupa el turno y NULL al cancelarla. MySQL no admite
+    # índices únicos condicionales, pero sí varios NULL en un índice único: así la
+    # restricción de turno solo afecta a las reservas activas.
+    slot_activo = models.BooleanField(null=True, default=True, editable=False)
+    recordatorio_enviado = models.BooleanField(default=False, editable=False)
 
     class Meta:
         verbose_name_plural = "Reservas"
         constraints = [
             models.UniqueConstraint(
-                fields=['court', 'date', 'timeslot'],
-                name='unique_reservation_per_court_timeslot_date'
+                fields=['court', 'date', 'timeslot', 'slot_activo'],
+                name='unique_active_reservation_per_court_timeslot_date',
+                violation_error_message="Este horario ya está reservado",
             )
         ]
+        indexes = [
+            # Índice de vencimientos del programador de recordatorios (y de consultas por fecha)
+            models.Index(fields=['date', 'recordatorio_enviado'], name='reserva_date_recordatorio_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.nombre} - {self.court.name} - {self.date} {self.timeslot}"
 
     def can_be_cancelled_by(self, user):
         return self.user == user or user.is_staff
-    
-    def unique_error_message(self, model_class, unique_check):
-        if model_class == type(self) and unique_check == ('court', 'timeslot', 'date'):
-            return "Este horario ya está reservado"
-        return super().unique_error_message(model_class, unique_check)
+
+    def cancelar(self):
+        """Cancela la reserva con un único UPDATE; devuelve False si ya no estaba activa."""
+        ahora = timezone.now()
+        actualizadas = Reservation.objects.filter(pk=self.pk, estado='activa').update(
+            estado='cancelada', cancelada_at=ahora, slot_activo=None
+        )
+        if actualizadas:
+            self.estado, self.cancelada_at, self.slot_activo = 'cancelada', ahora, None
+            # El UPDATE no dispara señales: se invalidan a mano los calendarios afectados
+            CalendarioUsuario.marcar_pendiente(
+                models.Q(usuario_id=self.user_id)
+                | models.Q(usuario__reservationinvitation__reserva_id=self.pk, usuario__reservationinvitation__estado='aceptada')
+            )
+        return bool(actualizadas)
+
+    # --- slot_activo se deriva siempre de estado (también al editar en el admin) ---
+    def _sincronizar_slot(self):
+        self.slot_activo = True if self.estado == 'activa' else None
+
+    def clean(self):
+        super().clean()
+        self._sincronizar_slot()
+
+    def validate_constraints(self, exclude=None):
+        # slot_activo no es editable y los formularios lo excluyen, pero depende de
+        # estado: si estado se valida, la restricción de turno también
+        if exclude and 'estado' not in exclude:
+            exclude = set(exclude) - {'slot_activo'}
+        super().validate_constraints(exclude=exclude)
+
+    def save(self, *args, **kwargs):
+        self._sincronizar_slot()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'estado' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'slot_activo'}
+        super().save(*args, **kwargs)
 
 class ReservationInvitation(models.Model):
     ESTADOS = (
@@ -166,6 +244,7 @@ class ReservationInvitation(models.Model):
     reserva = models.ForeignKey(Reservation, on_delete=models.CASCADE, related_name='invitaciones')
     invitado = models.ForeignKey(Usuario, null=True, blank=True, on_delete=models.SET_NULL)
     email = models.EmailField(blank=True, null=True)
+    email_normalizado = _campo_email_normalizado()
     token = models.CharField(max_length=100, unique=True)
     estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
     fecha_invitacion = models.DateTimeField(auto_now_add=True)
@@ -190,6 +269,7 @@ class ReservationInvitation(models.Model):
 class InvitadoExterno(models.Model):
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='invitados_externos')
     email = models.EmailField(blank=True, null=True)
+    email_normalizado = _campo_email_normalizado()
     nombre = models.CharField(max_length=255)
     creado_en = models.DateTimeField(auto_now_add=True)
 
@@ -199,25 +279,45 @@ class InvitadoExterno(models.Model):
 
 
 
-class ReservationCancelada(models.Model):
-    user = models.ForeignKey('Usuario', on_delete=models.SET_NULL, null=True, related_name='reservas_canceladas')
-    court = models.ForeignKey('Court', on_delete=models.SET_NULL, null=True)
-    timeslot = models.ForeignKey('TimeSlot', on_delete=models.SET_NULL, null=True)
-    date = models.DateField()
-    created_at = models.DateTimeField()  # Fecha de creación de la reserva original
-    cancelada_at = models.DateTimeField(default=timezone.now)  # Fecha y hora de cancelación
+class ReservaArchivada(models.Model):
+    """Reserva pasada movida fuera de Reservation por `archivar_reservas`; conserva el id original."""
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey('Usuario', on_delete=models.SET_NULL, null=True, related_name='reservas_archivadas')
+    court = models.ForeignKey(Court, on_delete=models.SET_NULL, null=True)
+    timeslot = models.ForeignKey(TimeSlot, on_delete=models.SET_NULL, null=True)
+    date = models.DateField(db_index=True)
+    created_at = models.DateTimeField()
+    estado = models.CharField(max_length=20, choices=Reservation.ESTADOS, default='activa')
+    cancelada_at = models.DateTimeField(null=True, blank=True)
+    archivada_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name_plural = "Reservas archivadas"
 
     def __str__(self):
-        return f"Reserva cancelada de {self.user} el {self.date} ({self.court})"
-    
+        return f"Reserva archivada {self.id} - {self.date}"
+
+class InvitacionArchivada(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    reserva = models.ForeignKey(ReservaArchivada, on_delete=models.CASCADE, related_name='invitaciones')
+    invitado = models.ForeignKey(Usuario, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    email = models.EmailField(blank=True, null=True)
+    token = models.CharField(max_length=100)
+    estado = models.CharField(max_length=20, choices=ReservationInvitation.ESTADOS, default='pendiente')
+    fecha_invitacion = models.DateTimeField()
+    nombre_invitado = models.CharField("Nombre del invitado", max_length=255, blank=True, null=True)
+
     class Meta:
-        verbose_name_plural = "Reservas Canceladas"
+        verbose_name_plural = "Invitaciones archivadas"
 
 class Anuncio(models.Model):
     autor = models.ForeignKey('Usuario', on_delete=models.CASCADE, related_name='anuncios')
     titulo = models.CharField(max_length=120)
     contenido = models.TextField()
     imagen = models.ImageField(upload_to='anuncios/', null=True, blank=True)
+    imagen_variantes = models.JSONField(default=dict, blank=True, help_text="Versiones redimensionadas de la imagen (procesar_imagenes)")
+    imagen_pendiente = models.BooleanField(default=False, db_index=True, help_text="La imagen está a la espera de generar sus variantes")
+    imagen_bloqueada_hasta = models.DateTimeField(null=True, blank=True, help_text="Fin de la reserva del worker que la está procesando")
     creado = models.DateTimeField(auto_now_add=True)
     editado = models.DateTimeField(auto_now=True)
     class Meta:
@@ -230,4 +330,121 @@ class RespuestaAnuncio(models.Model):
     creado = models.DateTimeField(auto_now_add=True)
     editado = models.DateTimeField(auto_now=True)
     class Meta:
-        ordering = ['creado']
\ No newline at end of file
+        ordering = ['creado']
+        indexes = [
+            models.Index(fields=['anuncio', 'creado'], name='respuesta_anuncio_creado_idx'),
+        ]
+
+class PrevisionOcupacion(models.Model):
+    court = models.ForeignKey(Court, on_delete=models.CASCADE, related_name='previsiones')
+    timeslot = models.ForeignKey(TimeSlot, on_delete=models.CASCADE, related_name='previsiones')
+    date = models.DateField()
+    apertura = models.DateTimeField(help_text="Momento en que se abre la reserva de ese turno")
+    probabilidad = models.FloatField(help_text="Probabilidad estimada de que el turno se reserve (0-1)")
+    horas_hasta_completo = models.FloatField(null=True, blank=True, help_text="Horas estimadas desde la apertura hasta que se reserva")
+    muestras = models.PositiveIntegerField(default=0)
+    calculado_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name_plural = "Previsiones de ocupación"
+        ordering = ['date', 'apertura']
+        constraints = [
+            models.UniqueConstraint(fields=['timeslot', 'date'], name='unique_prevision_per_timeslot_date')
+        ]
+
+    def __str__(self):
+        return f"{self.timeslot_id} {self.date}: {self.probabilidad:.0%}"
+
+class EmailOutbox(models.Model):
+    """Correo pendiente de envío; lo escribe la petición y lo envía `enviar_correos`."""
+    ESTADOS = (
+        ('pendiente', 'Pendiente'),
+        ('enviando', 'Enviando'),
+        ('enviado', 'Enviado'),
+        ('fallido', 'Fallido'),
+    )
+
+    asunto = models.CharField(max_length=255)
+    remitente = models.CharField(max_length=254)
+    destinatario = models.EmailField()
+    texto = models.TextField()
+    html = models.TextField(blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
+    intentos = models.PositiveIntegerField(default=0)
+    proximo_intento = models.DateTimeField(default=timezone.now)
+    bloqueado_hasta = models.DateTimeField(null=True, blank=True, help_text="Fin de la reserva del worker que lo está enviando")
+    ultimo_error = models.TextField(blank=True)
+    creado_at = models.DateTimeField(auto_now_add=True)
+    enviado_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = "Correos salientes"
+        indexes = [
+            models.Index(fields=['estado', 'proximo_intento'], name='outbox_estado_proximo_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.destinatario}: {self.asunto} ({self.estado})"
+
+class NotificacionPendiente(models.Model):
+    """Evento acumulado para el resumen periódico de un destinatario (`enviar_resumenes`)."""
+    TIPOS = (
+        ('invitacion', 'Invitación'),
+        ('aceptada', 'Invitación aceptada'),
+        ('rechazada', 'Invitación rechazada'),
+        ('anuncio', 'Anuncio'),
+    )
+
+    destinatario = models.EmailField()
+    nombre_destinatario = models.CharField(max_length=255, blank=True)
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    datos = models.JSONField(default=dict)
+    creado_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name_plural = "Notificaciones pendientes"
+        ordering = ['creado_at', 'id']
+        indexes = [
+            models.Index(fields=['destinatario', 'creado_at'], name='notif_destinatario_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.destinatario}: {self.tipo}"
+
+class ShortLink(models.Model):
+    """Enlace corto propio (/s/<codigo>/); el mismo destino siempre reutiliza el mismo código."""
+    codigo = models.CharField(max_length=16, unique=True)
+    url = models.TextField()
+    url_hash = models.CharField(max_length=64, unique=True, help_text="sha256 de la URL de destino")
+    creado_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = "Enlaces cortos"
+
+    def __str__(self):
+        return f"{self.codigo} -> {self.url}"
+
+class CalendarioUsuario(models.Model):
+    """Feed iCalendar precalculado de un usuario; se regenera solo cuando está marcado como pendiente."""
+    usuario = models.OneToOneField(Usuario, on_delete=models.CASCADE, related_name='calendario')
+    token = models.CharField(max_length=64, unique=True)
+    contenido = models.TextField(blank=True)
+    etag = models.CharField(max_length=64, blank=True)
+    pendiente = models.BooleanField(default=True)
+    generado_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = "Calendarios de usuario"
+
+    def save(self, *args, **kwargs):
+        if not self.token:
+            self.token = secrets.token_urlsafe(32)
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def marcar_pendiente(*filtros, **campos):
+        """Marca para regenerar los calendarios que cumplen el filtro (un único UPDATE)."""
+        return CalendarioUsuario.objects.filter(*filtros, **campos).update(pendiente=True)
+
+    def __str__(self):
+        return f"Calendario de {self.usuario}"
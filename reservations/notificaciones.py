@@ -0,0 +1,134 @@
+# reservations/notificaciones.py
+#
+# Modo resumen: en lugar de un correo por evento, los eventos se guardan en
+# NotificacionPendiente y `enviar_resumenes` manda un único correo por
+# destinatario cuando su evento más antiguo supera la ventana configurada.
+
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+from .correo import preparar_email, encolar_emails
+from .models import NotificacionPendiente, Usuario
+
+LOTE_DESTINATARIOS = 200
+
+
+def resumen_activo():
+    return settings.NOTIFICACIONES_RESUMEN
+
+
+def _datos_reserva(reserva):
+    return {
+        'pista': reserva.court.name,
+        'fecha': reserva.date.strftime("%d/%m/%Y"),
+        'hora_inicio': reserva.timeslot.start_time.strftime("%H:%M"),
+        'hora_fin': reserva.timeslot.end_time.strftime("%H:%M"),
+    }
+
+
+# --- Eventos ---
+def evento_invitacion(invitacion, contexto):
+    """`contexto` es el mismo que usa la plantilla del correo individual de invitación."""
+    datos = _datos_reserva(invitacion.reserva)
+    datos.update({
+        'convocante': contexto['convocante'],
+        'direccion_pista': contexto['direccion_pista'],
+        'enlace_aceptar': contexto['enlace_aceptar'],
+        'enlace_rechazar': contexto['enlace_rechazar'],
+    })
+    return NotificacionPendiente(
+        destinatario=invitacion.email, nombre_destinatario=contexto['nombre_invitado'] or '',
+        tipo='invitacion', datos=datos,
+    )
+
+
+def evento_respuesta(invitacion):
+    """Aviso al convocante de que un invitado ha aceptado o rechazado."""
+    convocante = invitacion.reserva.user
+    datos = _datos_reserva(invitacion.reserva)
+    datos['invitado'] = invitacion.nombre_invitado or invitacion.email or ''
+    return NotificacionPendiente(
+        destinatario=convocante.email, nombre_destinatario=convocante.nombre,
+        tipo=invitacion.estado, datos=datos,
+    )
+
+
+def eventos_anuncio(anuncio):
+    """Un evento por vecino de la comunidad del autor, salvo el propio autor."""
+    if not anuncio.autor.community_id:
+        return []
+    vecinos = Usuario.objects.filter(
+        community_id=anuncio.autor.community_id, is_active=True
+    ).exclude(id=anuncio.autor_id).values_list('email', 'nombre')
+    datos = {
+        'titulo': anuncio.titulo,
+        'autor': anuncio.autor.get_full_name() or anuncio.autor.email,
+    }
+    return [
+        NotificacionPendiente(destinatario=email, nombre_destinatario=nombre, tipo='anuncio', datos=datos)
+        for email, nombre in vecinos
+    ]
+
+
+def acumular(eventos):
+    return NotificacionPendiente.objects.bulk_create(eventos, batch_size=500)
+
+
+# --- Envío de resúmenes ---
+def _agrupar(notificaciones):
+    grupos = {tipo: [] for tipo, _ in NotificacionPendiente.TIPOS}
+    for notificacion in notificaciones:
+        grupos[notificacion.tipo].append(notificacion.datos)
+    return grupos
+
+
+def destinatarios_vencidos(minutos=None, ahora=None):
+    minutos = settings.NOTIFICACIONES_RESUMEN_MINUTOS if minutos is None else minutos
+    corte = (ahora or timezone.now()) - timedelta(minutes=minutos)
+    return (
+        NotificacionPendiente.objects.values('destinatario')
+        .annotate(primera=Min('creado_at'))
+        .filter(primera__lte=corte)
+        .order_by('primera')
+        .values_list('destinatario', flat=True)
+    )
+
+
+def enviar_resumenes(minutos=None, lote=LOTE_DESTINATARIOS):
+    """Encola un correo resumen por destinatario vencido. Devuelve (correos, eventos)."""
+    destinatarios = list(destinatarios_vencidos(minutos))
+    total_correos = total_eventos = 0
+    for inicio in range(0, len(destinatarios), lote):
+        bloque = destinatarios[inicio:inicio + lote]
+        with transaction.atomic():
+            # Las filas quedan reclamadas hasta borrarlas al final de la transacción:
+            # otra ejecución solapada se las salta y no repite el resumen
+            por_destinatario = {}
+            for notificacion in (
+                NotificacionPendiente.objects.select_for_update(skip_locked=True)
+                .filter(destinatario__in=bloque)
+                .order_by('id')
+            ):
+                por_destinatario.setdefault(notificacion.destinatario, []).append(notificacion)
+            correos = []
+            for destinatario, notificaciones in por_destinatario.items():
+                contexto = {
+                    'nombre': next((n.nombre_destinatario for n in notificaciones if n.nombre_destinatario), ''),
+                    'total': len(notificaciones),
+                    **_agrupar(notificaciones),
+                }
+                correos.append(preparar_email(
+                    f"Tienes {len(notificaciones)} novedades en PistaReserva",
+                    destinatario,
+                    plantilla_txt='emails/resumen_notificaciones.txt',
+                    plantilla_html='emails/resumen_notificaciones.html',
+                    contexto=contexto,
+                ))
+            encolar_emails(correos)
+            ids = [n.id for notificaciones in por_destinatario.values() for n in notificaciones]
+            NotificacionPendiente.objects.filter(id__in=ids).delete()
+        total_correos += len(correos)
+        total_eventos += len(ids)
+    return total_correos, total_eventos
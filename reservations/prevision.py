@@ -0,0 +1,124 @@
+# reservations/prevision.py
+
+from datetime import datetime, timedelta
+from django.db import transaction
+from django.utils import timezone
+from .models import Community, Reservation, TimeSlot, PrevisionOcupacion
+
+SEMANAS_HISTORIAL = 8
+DIAS_PREVISION = 7
+# Peso relativo de cada semana respecto a la siguiente más reciente
+DECAIMIENTO = 0.8
+CHUNK_SIZE = 2000
+
+
+# --- Política de reserva efectiva (pista, comunidad o valores por defecto) ---
+def _por_defecto(campo):
+    # Pista sin ajuste propio ni comunidad: se usa el valor por defecto de Community
+    campo = Community._meta.get_field(campo)
+    return campo.to_python(campo.get_default())
+
+
+def _politica(fila):
+    hora_apertura = fila['court__reserva_hora_apertura_pasado'] or fila['court__community__reserva_hora_apertura_pasado']
+    if hora_apertura is None:
+        hora_apertura = _por_defecto('reserva_hora_apertura_pasado')
+    max_dias = fila['court__reserva_max_dias']
+    if max_dias is None:
+        max_dias = fila['court__community__reserva_max_dias']
+    if max_dias is None:
+        max_dias = _por_defecto('reserva_max_dias')
+    return hora_apertura, max_dias
+
+
+def _apertura(fecha, hora_apertura, max_dias, tz):
+    # La reserva de un día se abre `max_dias` antes, a la hora de apertura
+    return timezone.make_aware(datetime.combine(fecha - timedelta(days=max_dias), hora_apertura), tz)
+
+
+def _turnos(community_id=None):
+    qs = TimeSlot.objects.all()
+    if community_id:
+        qs = qs.filter(court__community_id=community_id)
+    return {
+        fila['id']: fila for fila in qs.values(
+            'id', 'court_id', 'court__reserva_hora_apertura_pasado', 'court__reserva_max_dias',
+            'court__community__reserva_hora_apertura_pasado', 'court__community__reserva_max_dias'
+        )
+    }
+
+
+# --- Líneas base estacionales por turno y día de la semana ---
+def lineas_base(hoy, semanas=SEMANAS_HISTORIAL, community_id=None, turnos=None):
+    """
+    Devuelve {(timeslot_id, weekday): (probabilidad, horas_hasta_completo, muestras)}
+    a partir de las `semanas` anteriores a `hoy`, ponderando más las recientes.
+    """
+    tz = timezone.get_current_timezone()
+    turnos = turnos if turnos is not None else _turnos(community_id)
+    inicio = hoy - timedelta(weeks=semanas)
+    pesos = [DECAIMIENTO ** k for k in range(semanas)]
+
+    # Matriz de ocupación por turno: una fila por semana hacia atrás
+    ocupado = {}
+    horas = {}
+    filas = Reservation.objects.filter(
+        date__gte=inicio, date__lt=hoy, estado='activa', timeslot_id__in=list(turnos)
+    ).values_list('timeslot_id', 'date', 'created_at').iterator(chunk_size=CHUNK_SIZE)
+    for timeslot_id, fecha, creada in filas:
+        semana = ((hoy - fecha).days - 1) // 7
+        clave = (timeslot_id, fecha.weekday())
+        ocupado.setdefault(clave, [0] * semanas)[semana] = 1
+        if creada is not None:
+            hora_apertura, max_dias = _politica(turnos[timeslot_id])
+            espera = (creada - _apertura(fecha, hora_apertura, max_dias, tz)).total_seconds() / 3600
+            horas.setdefault(clave, []).append((max(espera, 0), pesos[semana]))
+
+    total_pesos = sum(pesos)
+    resultado = {}
+    for timeslot_id in turnos:
+        for weekday in range(7):
+            clave = (timeslot_id, weekday)
+            serie = ocupado.get(clave)
+            if serie is None:
+                resultado[clave] = (0.0, None, 0)
+                continue
+            probabilidad = sum(p * o for p, o in zip(pesos, serie)) / total_pesos
+            esperas = horas.get(clave)
+            media_horas = None
+            if esperas:
+                media_horas = sum(h * p for h, p in esperas) / sum(p for _, p in esperas)
+            resultado[clave] = (round(probabilidad, 3), round(media_horas, 2) if media_horas is not None else None, sum(serie))
+    return resultado
+
+
+# --- Cálculo y almacenamiento de la previsión ---
+def calcular_prevision(hoy=None, dias=DIAS_PREVISION, semanas=SEMANAS_HISTORIAL, community_id=None):
+    tz = timezone.get_current_timezone()
+    hoy = hoy or timezone.localdate()
+    turnos = _turnos(community_id)
+    base = lineas_base(hoy, semanas=semanas, turnos=turnos)
+    ahora = timezone.now()
+    fechas = [hoy + timedelta(days=i) for i in range(dias)]
+
+    previsiones = []
+    for timeslot_id, fila in turnos.items():
+        hora_apertura, max_dias = _politica(fila)
+        for fecha in fechas:
+            probabilidad, horas_hasta_completo, muestras = base[(timeslot_id, fecha.weekday())]
+            previsiones.append(PrevisionOcupacion(
+                court_id=fila['court_id'],
+                timeslot_id=timeslot_id,
+                date=fecha,
+                apertura=_apertura(fecha, hora_apertura, max_dias, tz),
+                probabilidad=probabilidad,
+                horas_hasta_completo=horas_hasta_completo,
+                muestras=muestras,
+                calculado_at=ahora,
+            ))
+
+    with transaction.atomic():
+        PrevisionOcupacion.objects.filter(date__lt=hoy).delete()
+        PrevisionOcupacion.objects.filter(date__in=fechas, timeslot_id__in=list(turnos)).delete()
+        PrevisionOcupacion.objects.bulk_create(previsiones, batch_size=1000)
+    return len(previsiones)
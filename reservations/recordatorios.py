@@ -0,0 +1,157 @@
+# reservations/recordatorios.py
+#
+# Programador de recordatorios de partido. Mantiene en memoria un heap con
+# el instante de aviso de cada reserva futura (fecha + hora de inicio en la
+# zona local, menos la antelación) y duerme hasta el siguiente vencimiento.
+# La base de datos solo se consulta al arrancar (reservas desde hoy, por el
+# índice de fecha), para incorporar reservas nuevas (id mayor que el último
+# visto) y al enviar cada lote. Lanzado desde cron solo lee las que ya vencen.
+
+import heapq
+import time
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Prefetch, Q
+from django.utils import timezone
+from .correo import preparar_email, encolar_emails
+from .models import Reservation, ReservationInvitation
+
+REFRESCO_S = 60
+ESPERA_MAXIMA_S = 300
+
+
+def _inicio(fecha, hora, tz):
+    return timezone.make_aware(datetime.combine(fecha, hora), tz)
+
+
+class Programador:
+    def __init__(self, minutos_antes=None, refresco=REFRESCO_S):
+        self.antelacion = timedelta(minutes=settings.RECORDATORIO_MINUTOS_ANTES if minutos_antes is None else minutos_antes)
+        self.refresco = refresco
+        self.tz = timezone.get_current_timezone()
+        self.heap = []
+        self.en_heap = set()
+        self.ultimo_id = 0
+        self.proximo_refresco = 0
+
+    # --- Índice de vencimientos ---
+    def _agregar(self, filas):
+        ahora = timezone.now()
+        for reserva_id, fecha, hora in filas:
+            self.ultimo_id = max(self.ultimo_id, reserva_id)
+            if reserva_id in self.en_heap:
+                continue
+            inicio = _inicio(fecha, hora, self.tz)
+            if inicio <= ahora:
+                continue
+            heapq.heappush(self.heap, (inicio - self.antelacion, reserva_id))
+            self.en_heap.add(reserva_id)
+
+    def _pendientes(self):
+        return Reservation.objects.filter(
+            date__gte=timezone.localdate(), recordatorio_enviado=False, estado='activa'
+        ).values_list('id', 'date', 'timeslot__start_time')
+
+    def cargar(self):
+        self.heap, self.en_heap = [], set()
+        self.ultimo_id = Reservation.objects.aggregate(m=Max('id'))['m'] or 0
+        self._agregar(self._pendientes())
+        self.proximo_refresco = time.monotonic() + self.refresco
+
+    def cargar_vencidos(self, ahora=None):
+        """
+        Modo cron (--una-vez): solo las reservas cuyo aviso ya ha vencido, es
+        decir, que empiezan antes de ahora + antelación. No se recorre el resto
+        de reservas futuras.
+        """
+        self.heap, self.en_heap = [], set()
+        limite = timezone.localtime((ahora or timezone.now()) + self.antelacion, self.tz)
+        self._agregar(self._pendientes().filter(
+            Q(date__lt=limite.date())
+            | Q(date=limite.date(), timeslot__start_time__lte=limite.time())
+        ))
+
+    def refrescar(self):
+        """Incorpora las reservas creadas desde la última lectura (rango sobre la clave primaria)."""
+        self._agregar(self._pendientes().filter(id__gt=self.ultimo_id))
+        self.proximo_refresco = time.monotonic() + self.refresco
+
+    def segundos_hasta_siguiente(self):
+        espera = self.proximo_refresco - time.monotonic()
+        if self.heap:
+            espera = min(espera, (self.heap[0][0] - timezone.now()).total_seconds())
+        return max(0.0, min(espera, ESPERA_MAXIMA_S))
+
+    # --- Envío ---
+    def vencidos(self):
+        ahora = timezone.now()
+        ids = []
+        while self.heap and self.heap[0][0] <= ahora:
+            _, reserva_id = heapq.heappop(self.heap)
+            self.en_heap.discard(reserva_id)
+            ids.append(reserva_id)
+        return ids
+
+    def enviar(self, ids):
+        """Reclama las reservas vencidas y encola sus recordatorios. Devuelve el nº de correos."""
+        if not ids:
+            return 0
+        ahora = timezone.now()
+        with transaction.atomic():
+            reservas = list(
+                Reservation.objects.select_for_update(skip_locked=True, of=('self',))
+                .filter(id__in=ids, estado='activa', recordatorio_enviado=False)
+                .select_related('user', 'court__community', 'timeslot')
+                .prefetch_related(Prefetch(
+                    'invitaciones',
+                    queryset=ReservationInvitation.objects.filter(estado='aceptada').select_related('invitado'),
+                    to_attr='aceptadas'
+                ))
+            )
+            listas, correos = [], []
+            for reserva in reservas:
+                inicio = _inicio(reserva.date, reserva.timeslot.start_time, self.tz)
+                if inicio <= ahora:
+                    continue
+                if inicio - self.antelacion > ahora:
+                    # La reserva se ha movido a más tarde: vuelve al índice con su nueva hora
+                    heapq.heappush(self.heap, (inicio - self.antelacion, reserva.id))
+                    self.en_heap.add(reserva.id)
+                    continue
+                listas.append(reserva.id)
+                correos.extend(self._correos(reserva))
+            encolar_emails(correos)
+            Reservation.objects.filter(id__in=listas).update(recordatorio_enviado=True)
+        return len(correos)
+
+    def _correos(self, reserva):
+        destinatarios = {reserva.user.email: reserva.user.nombre}
+        for invitacion in reserva.aceptadas:
+            email = invitacion.invitado.email if invitacion.invitado else invitacion.email
+            if email:
+                destinatarios.setdefault(email, invitacion.invitado.nombre if invitacion.invitado else invitacion.nombre_invitado)
+        contexto = {
+            'convocante': reserva.user.get_full_name() or reserva.user.email,
+            'pista': reserva.court.name,
+            'fecha': reserva.date.strftime("%d/%m/%Y"),
+            'hora_inicio': reserva.timeslot.start_time.strftime("%H:%M"),
+            'hora_fin': reserva.timeslot.end_time.strftime("%H:%M"),
+            'direccion_pista': reserva.court.community.direccion if reserva.court.community else None,
+        }
+        return [
+            preparar_email(
+                f"Recordatorio: partido de pádel a las {contexto['hora_inicio']}",
+                email,
+                plantilla_txt='emails/recordatorio_partido.txt',
+                plantilla_html='emails/recordatorio_partido.html',
+                contexto={**contexto, 'nombre': nombre or email.split('@')[0]},
+            )
+            for email, nombre in destinatarios.items()
+        ]
+
+    def ciclo(self):
+        """Un paso del bucle: refresca si toca y envía lo vencido. Devuelve el nº de correos."""
+        if time.monotonic() >= self.proximo_refresco:
+            self.refrescar()
+        return self.enviar(self.vencidos())
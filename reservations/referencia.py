@@ -0,0 +1,159 @@
+# reservations/referencia.py
+#
+# Caché en proceso de los datos de referencia (comunidades, pistas, turnos
+# y viviendas), que cambian pocas veces al año y se consultan en casi todas
+# las peticiones. Cada comunidad se carga entera la primera vez que se pide
+# (cuatro consultas) con las relaciones ya enlazadas: `turno.court.community`
+# no vuelve a la base de datos.
+#
+# La invalidación entre workers usa un contador de versión en la caché
+# compartida: cualquier cambio en esas tablas lo incrementa (signals.py) y
+# cada proceso lo comprueba como mucho una vez cada COMPROBAR_SEGUNDOS.
+
+import threading
+import time
+from django.core.cache import cache
+from .models import Community, Court, TimeSlot, Vivienda
+
+CLAVE_VERSION = 'referencia:version'
+COMPROBAR_SEGUNDOS = 2
+# Marca en los índices de un id que no existe
+_AUSENTE = object()
+_SIN_CARGAR = object()
+
+
+class DatosComunidad:
+    __slots__ = ('comunidad', 'pistas', 'turnos', 'viviendas')
+
+    def __init__(self, community_id):
+        self.comunidad = Community.objects.filter(pk=community_id).first() if community_id else None
+        self.pistas = {}
+        for pista in Court.objects.filter(community_id=community_id).order_by('name'):
+            pista.community = self.comunidad
+            self.pistas[pista.id] = pista
+        self.turnos = {}
+        for turno in TimeSlot.objects.filter(court_id__in=list(self.pistas)).order_by('start_time', 'id'):
+            turno.court = self.pistas[turno.court_id]
+            self.turnos[turno.id] = turno
+        self.viviendas = {}
+        for vivienda in Vivienda.objects.filter(community_id=community_id).order_by('nombre'):
+            vivienda.community = self.comunidad
+            self.viviendas[vivienda.id] = vivienda
+
+
+_lock = threading.Lock()
+_comunidades = {}
+_pista_comunidad = {}
+_turno_comunidad = {}
+_vivienda_comunidad = {}
+_version = None
+_comprobado = 0.0
+
+
+# --- Versión compartida ---
+def version():
+    v = cache.get(CLAVE_VERSION)
+    if v is None:
+        # Si la clave se pierde se reinicia en un valor que ningún proceso puede tener ya
+        cache.add(CLAVE_VERSION, int(time.time() * 1000), None)
+        v = cache.get(CLAVE_VERSION)
+    return v
+
+
+def invalidar():
+    try:
+        cache.incr(CLAVE_VERSION)
+    except ValueError:
+        version()
+    _vaciar()
+
+
+def _vaciar():
+    global _version, _comprobado
+    with _lock:
+        _comunidades.clear()
+        _pista_comunidad.clear()
+        _turno_comunidad.clear()
+        _vivienda_comunidad.clear()
+        _version = None
+        _comprobado = 0.0
+
+
+def _comprobar_version():
+    global _version, _comprobado
+    ahora = time.monotonic()
+    if ahora - _comprobado < COMPROBAR_SEGUNDOS:
+        return
+    actual = version()
+    if actual != _version:
+        _vaciar()
+    _version, _comprobado = actual, ahora
+
+
+# --- Carga por comunidad ---
+def datos(community_id):
+    _comprobar_version()
+    cargados = _comunidades.get(community_id)
+    if cargados is None:
+        with _lock:
+            cargados = _comunidades.get(community_id)
+            if cargados is None:
+                cargados = DatosComunidad(community_id)
+                _pista_comunidad.update(dict.fromkeys(cargados.pistas, community_id))
+                _turno_comunidad.update(dict.fromkeys(cargados.turnos, community_id))
+                _vivienda_comunidad.update(dict.fromkeys(cargados.viviendas, community_id))
+                _comunidades[community_id] = cargados
+    return cargados
+
+
+def _buscar(indice, pk, consulta, seccion):
+    """
+    Objeto `pk` de la `seccion` ('pistas', 'turnos', 'viviendas') de su
+    comunidad. Si no está cargado, una consulta por id; los que no existen
+    también se recuerdan hasta el próximo cambio de versión.
+    """
+    _comprobar_version()
+    community_id = indice.get(pk, _SIN_CARGAR)
+    if community_id is _SIN_CARGAR:
+        fila = consulta.filter(pk=pk).first()
+        community_id = fila[0] if fila else _AUSENTE
+        indice[pk] = community_id
+    if community_id is _AUSENTE:
+        return None
+    obj = getattr(datos(community_id), seccion).get(pk)
+    if obj is None:
+        # Existe pero no está en los datos ya cargados de su comunidad (creado
+        # después): la versión nueva ya está en camino y limpiará la marca
+        indice[pk] = _AUSENTE
+    return obj
+
+
+# --- Consultas ---
+def comunidad(community_id):
+    return datos(community_id).comunidad if community_id else None
+
+
+def pista(court_id):
+    return _buscar(_pista_comunidad, court_id, Court.objects.values_list('community_id'), 'pistas')
+
+
+def turno(timeslot_id):
+    return _buscar(_turno_comunidad, timeslot_id, TimeSlot.objects.values_list('court__community_id'), 'turnos')
+
+
+def vivienda(vivienda_id):
+    if not vivienda_id:
+        return None
+    return _buscar(_vivienda_comunidad, vivienda_id, Vivienda.objects.values_list('community_id'), 'viviendas')
+
+
+def pistas(community_id):
+    return list(datos(community_id).pistas.values())
+
+
+def turnos(community_id):
+    return list(datos(community_id).turnos.values())
+
+
+def viviendas(community_id):
+    return list(datos(community_id).viviendas.values())
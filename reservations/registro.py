@@ -0,0 +1,57 @@
+# reservations/registro.py
+#
+# Respuestas cacheadas de los endpoints públicos del alta: viviendas por
+# código de comunidad y listado de viviendas. Las claves incluyen la versión
+# de los datos de referencia (`referencia.version()`), que cambia con
+# cualquier alta, baja o edición de comunidades y viviendas, así que no hace
+# falta borrar nada. Los códigos desconocidos se resuelven contra el mapa
+# cacheado de códigos (caché negativa sin una entrada por intento) y los
+# imposibles se rechazan sin tocar ni la caché ni la base de datos.
+
+from django.core.cache import cache
+from . import referencia
+from .models import Community, Vivienda
+
+TTL = 60 * 60
+LONGITUD_CODIGO = Community._meta.get_field('code').max_length
+
+
+def _clave(*partes):
+    return ':'.join(('registro', str(referencia.version())) + tuple(str(p) for p in partes))
+
+
+def _codigos():
+    # El código se compara sin distinguir mayúsculas, como hace la colación de MySQL
+    clave = _clave('codigos')
+    codigos = cache.get(clave)
+    if codigos is None:
+        codigos = {code.lower(): pk for pk, code in Community.objects.values_list('id', 'code')}
+        cache.set(clave, codigos, TTL)
+    return codigos
+
+
+def viviendas_por_codigo(codigo):
+    """{'viviendas': [...], 'comunidad_nombre': ...} o None si el código no existe."""
+    if not isinstance(codigo, str) or not 0 < len(codigo) <= LONGITUD_CODIGO:
+        return None
+    community_id = _codigos().get(codigo.lower())
+    if community_id is None:
+        return None
+    clave = _clave('comunidad', community_id)
+    data = cache.get(clave)
+    if data is None:
+        data = {
+            'viviendas': list(Vivienda.objects.filter(community_id=community_id).order_by('id').values('id', 'nombre')),
+            'comunidad_nombre': Community.objects.values_list('name', flat=True).get(pk=community_id),
+        }
+        cache.set(clave, data, TTL)
+    return data
+
+
+def todas_las_viviendas():
+    clave = _clave('viviendas')
+    data = cache.get(clave)
+    if data is None:
+        data = list(Vivienda.objects.order_by('id').values('id', 'nombre'))
+        cache.set(clave, data, TTL)
+    return data
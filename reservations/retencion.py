@@ -0,0 +1,100 @@
+# reservations/retencion.py
+#
+# Política de retención: borra o anonimiza las filas caducadas en lotes
+# pequeños recorridos por clave primaria, con pausas entre lotes, para no
+# mantener bloqueos largos ni generar retraso de réplica en MySQL.
+
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django_rest_passwordreset.models import ResetPasswordToken, get_password_reset_token_expiry_time
+from .calendario import por_lotes, usuarios_de_reservas
+from .models import (
+    Reservation, ReservationInvitation, ReservaArchivada, InvitacionArchivada, InvitadoExterno,
+    EmailOutbox
+)
+
+
+class Politica:
+    def __init__(self, nombre, queryset, accion=None):
+        self.nombre = nombre
+        self.queryset = queryset
+        # Si se indica, se aplica al lote en lugar de borrarlo (anonimización)
+        self.accion = accion
+
+
+def _anonimizar_invitaciones(qs):
+    qs.update(email=None, nombre_invitado=None)
+
+
+def politicas(ahora=None):
+    ahora = ahora or timezone.now()
+    hoy = timezone.localdate(ahora)
+    corte_cancelaciones = hoy - timedelta(days=settings.RETENCION_CANCELACIONES_DIAS)
+    corte_pendientes = hoy - timedelta(days=settings.RETENCION_INVITACIONES_PENDIENTES_DIAS)
+    corte_externos = ahora - timedelta(days=settings.RETENCION_INVITADOS_EXTERNOS_DIAS)
+    corte_correos = ahora - timedelta(days=settings.RETENCION_CORREOS_DIAS)
+    corte_tokens = ahora - timedelta(hours=get_password_reset_token_expiry_time())
+
+    # Un invitado externo se conserva mientras su convocante le siga invitando
+    invitado_reciente = ReservationInvitation.objects.filter(
+        reserva__user_id=OuterRef('usuario_id'),
+        email_normalizado=OuterRef('email_normalizado'),
+        fecha_invitacion__gte=corte_externos,
+    )
+    return [
+        Politica('reservas canceladas', Reservation.objects.filter(
+            estado='cancelada', date__lt=corte_cancelaciones
+        )),
+        Politica('reservas canceladas archivadas', ReservaArchivada.objects.filter(
+            estado='cancelada', date__lt=corte_cancelaciones
+        )),
+        # Las invitaciones pendientes de partidos ya jugados se anonimizan en lugar
+        # de borrarse para no alterar los KPIs de invitaciones enviadas
+        Politica('invitaciones pendientes caducadas', ReservationInvitation.objects.filter(
+            estado='pendiente', reserva__date__lt=corte_pendientes, email__isnull=False
+        ), _anonimizar_invitaciones),
+        Politica('invitaciones pendientes archivadas', InvitacionArchivada.objects.filter(
+            estado='pendiente', reserva__date__lt=corte_pendientes, email__isnull=False
+        ), _anonimizar_invitaciones),
+        Politica('invitados externos sin uso', InvitadoExterno.objects.filter(
+            creado_en__lt=corte_externos
+        ).exclude(Exists(invitado_reciente))),
+        Politica('correos enviados', EmailOutbox.objects.filter(
+            estado='enviado', enviado_at__lt=corte_correos
+        )),
+        Politica('tokens de recuperación caducados', ResetPasswordToken.objects.filter(
+            created_at__lte=corte_tokens
+        )),
+    ]
+
+
+def procesar(politica, lote=500, pausa=0.0):
+    """Recorre la política por pk ascendente. Devuelve (filas, segundos)."""
+    modelo = politica.queryset.model
+    ultimo = None
+    total = 0
+    inicio = time.perf_counter()
+    while True:
+        qs = politica.queryset if ultimo is None else politica.queryset.filter(pk__gt=ultimo)
+        ids = list(qs.order_by('pk').values_list('pk', flat=True)[:lote])
+        if not ids:
+            break
+        with transaction.atomic():
+            objetivo = modelo.objects.filter(pk__in=ids)
+            if politica.accion:
+                politica.accion(objetivo)
+            elif modelo is Reservation:
+                # Sin un UPDATE de calendarios por cada reserva e invitación borrada
+                with por_lotes(usuarios_de_reservas(ids)):
+                    objetivo.delete()
+            else:
+                objetivo.delete()
+        total += len(ids)
+        ultimo = ids[-1]
+        if pausa and len(ids) == lote:
+            time.sleep(pausa)
+    return total, time.perf_counter() - inicio
@@ -0,0 +1,112 @@
+# reservations/router.py
+#
+# Envía a la réplica de lectura (settings.REPLICA_DB_ALIAS) las consultas
+# de estadísticas, exportaciones y listados GET. Solo se usa dentro de
+# `en_replica()`: fuera de ese contexto todo va a `default`. Se vuelve al
+# primario si la petición ya ha escrito o si el usuario escribió hace menos
+# de REPLICA_STICKY_SEGUNDOS (leer lo que uno acaba de guardar).
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS')
+
+_contexto = ContextVar('contexto_replica', default=None)
+
+
+def _alias_replica():
+    alias = getattr(settings, 'REPLICA_DB_ALIAS', None)
+    return alias if alias in settings.DATABASES else None
+
+
+def _clave_escritura(user_id):
+    return f"replica:escritura:{user_id}"
+
+
+def marcar_escritura(user_id):
+    cache.set(_clave_escritura(user_id), 1, settings.REPLICA_STICKY_SEGUNDOS)
+
+
+class _Contexto:
+    def __init__(self, request):
+        self.request = request
+        self.escrito = False
+        self._escritura_reciente = None
+
+    @property
+    def escritura_reciente(self):
+        # Se consulta al leer, cuando DRF ya ha autenticado al usuario. Un usuario
+        # anónimo no se recuerda: el contexto no debe fijar la respuesta antes de autenticar.
+        if self._escritura_reciente is None:
+            user = getattr(self.request, 'user', None)
+            if user is None or not user.is_authenticated:
+                return False
+            self._escritura_reciente = bool(cache.get(_clave_escritura(user.pk)))
+        return self._escritura_reciente
+
+
+@contextmanager
+def en_replica(request):
+    token = _contexto.set(_Contexto(request))
+    try:
+        yield
+    finally:
+        _contexto.reset(token)
+
+
+def lecturas_replica(vista):
+    """
+    Decorador para vistas de función de Django (no de DRF): las peticiones
+    seguras leen de la réplica. En vistas @api_view envolvería también la
+    autenticación de DRF; ahí se usa `with en_replica(request)` en el cuerpo.
+    """
+    @wraps(vista)
+    def envoltorio(request, *args, **kwargs):
+        if request.method not in METODOS_SEGUROS:
+            return vista(request, *args, **kwargs)
+        with en_replica(request):
+            respuesta = vista(request, *args, **kwargs)
+            # Las TemplateResponse evalúan sus querysets al renderizar
+            if hasattr(respuesta, 'render') and not getattr(respuesta, 'is_rendered', True):
+                respuesta.render()
+        return respuesta
+    return envoltorio
+
+
+class ListadoReplicaMixin:
+    """Para viewsets: `list` lee de la réplica."""
+
+    def list(self, request, *args, **kwargs):
+        with en_replica(request):
+            return super().list(request, *args, **kwargs)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        contexto = _contexto.get()
+        alias = _alias_replica()
+        if contexto is None or alias is None or contexto.escrito or contexto.escritura_reciente:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        contexto = _contexto.get()
+        if contexto is not None:
+            contexto.escrito = True
+        # Explícito: un objeto leído de la réplica se guarda igualmente en el primario
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        bases = {DEFAULT_DB_ALIAS, _alias_replica()}
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == _alias_replica():
+            return False
+        return None
@@ -1,9 +1,14 @@
 from rest_framework import serializers
 from .models import Court, TimeSlot, Reservation, ReservationInvitation
-from .models import Usuario, Vivienda, Community, InvitadoExterno, Anuncio, RespuestaAnuncio
+from .models import Usuario, Vivienda, Community, InvitadoExterno, Anuncio, RespuestaAnuncio, normalizar_email
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from django.contrib.auth.models import update_last_login
 from django.contrib.auth import authenticate
+from .autenticacion import claims_usuario
+from . import referencia
 from rest_framework import exceptions
+from django.db.models import Count, Prefetch
 from django.utils import timezone
 from reservations.models import TimeSlot
 from rest_framework.validators import UniqueTogetherValidator
@@ -13,6 +18,14 @@ from datetime import datetime
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     username_field = 'email'  # Indica que usas 'nombre' como USERNAME_FIELD
 
+    @classmethod
+    def get_token(cls, user):
+        # Los claims permiten resolver el usuario sin consultarlo en cada petición
+        token = super().get_token(user)
+        for claim, valor in claims_usuario(user).items():
+            token[claim] = valor
+        return token
+
     def validate(self, attrs):
         email = attrs.get('email')
         password = attrs.get('password')
@@ -33,7 +46,12 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
                 {'error': 'Cuenta desactivada'}
             )
 
-        data = super().validate(attrs)
+        # No se llama a super().validate(): volvería a autenticar y a calcular el hash
+        self.user = user
+        refresh = self.get_token(user)
+        data = {'refresh': str(refresh), 'access': str(refresh.access_token)}
+        if jwt_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, user)
         data.update({
             'user_id': self.user.id,
             'email': self.user.email,
@@ -49,6 +67,11 @@ class CommunitySerializer(serializers.ModelSerializer):
         model = Community
         fields = ['id', 'name', 'direccion', 'code', 'reserva_hora_apertura_pasado', 'reserva_max_dias']
 
+
+class ComunidadReferenciaSerializer(CommunitySerializer):
+    def get_attribute(self, instance):
+        return referencia.comunidad(instance.community_id)
+
 class CourtSerializer(serializers.ModelSerializer):
     comunidad_nombre = serializers.CharField(source='community.name', read_only=True)
     comunidad_direccion = serializers.CharField(source='community.direccion', read_only=True)
@@ -104,13 +127,42 @@ class CourtSerializer(serializers.ModelSerializer):
 #             'community_id', 'reserva_hora_apertura_pasado', 'reserva_max_dias'
 #         ]
 
+class ReferenciaRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField que resuelve el objeto desde la caché de referencia."""
+
+    def __init__(self, buscar, **kwargs):
+        self.buscar = buscar
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        try:
+            obj = self.buscar(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if obj is None:
+            self.fail('does_not_exist', pk_value=data)
+        return obj
+
+
+# Pista y turno anidados tomados de la caché de referencia por `<campo>_id`,
+# sin cargar la relación (ni necesitar select_related en la vista)
+class PistaReferenciaSerializer(CourtSerializer):
+    def get_attribute(self, instance):
+        return referencia.pista(instance.court_id)
+
+
 class TimeSlotSerializer(serializers.ModelSerializer):
-    court = CourtSerializer(read_only=True)
+    court = PistaReferenciaSerializer(read_only=True)
     courtid = serializers.PrimaryKeyRelatedField(queryset=Court.objects.all(), source='court', write_only=True)
     class Meta:
         model = TimeSlot
         fields = ['id', 'slot', 'start_time', 'end_time', 'court', 'courtid']
 
+
+class TurnoReferenciaSerializer(TimeSlotSerializer):
+    def get_attribute(self, instance):
+        return referencia.turno(instance.timeslot_id)
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = Usuario
@@ -118,8 +170,8 @@ class UserSerializer(serializers.ModelSerializer):
 
 class SimpleReservationSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
-    court = CourtSerializer(read_only=True)
-    timeslot = TimeSlotSerializer(read_only=True)
+    court = PistaReferenciaSerializer(read_only=True)
+    timeslot = TurnoReferenciaSerializer(read_only=True)
 
     class Meta:
         model = Reservation
@@ -151,22 +203,32 @@ class ReservationInvitationSerializer(serializers.ModelSerializer):
     def get_convocante(self, obj):
         return obj.reserva.user.get_full_name() if obj.reserva and obj.reserva.user else None
 
+    def _pista(self, obj):
+        return referencia.pista(obj.reserva.court_id) if obj.reserva else None
+
+    def _turno(self, obj):
+        return referencia.turno(obj.reserva.timeslot_id) if obj.reserva else None
+
     def get_pista(self, obj):
-        return obj.reserva.court.name if obj.reserva and obj.reserva.court else None
+        pista = self._pista(obj)
+        return pista.name if pista else None
 
     def get_direccion_pista(self, obj):
-        if obj.reserva and obj.reserva.court and obj.reserva.court.community:
-            return obj.reserva.court.community.direccion or "Consultar en recepción"
+        pista = self._pista(obj)
+        if pista and pista.community:
+            return pista.community.direccion or "Consultar en recepción"
         return "Consultar en recepción"
 
     def get_fecha(self, obj):
         return obj.reserva.date.strftime("%d/%m/%Y") if obj.reserva and obj.reserva.date else None
 
     def get_hora_inicio(self, obj):
-        return obj.reserva.timeslot.start_time.strftime("%H:%M") if obj.reserva and obj.reserva.timeslot else None
+        turno = self._turno(obj)
+        return turno.start_time.strftime("%H:%M") if turno else None
 
     def get_hora_fin(self, obj):
-        return obj.reserva.timeslot.end_time.strftime("%H:%M") if obj.reserva and obj.reserva.timeslot else None
+        turno = self._turno(obj)
+        return turno.end_time.strftime("%H:%M") if turno else None
 
     def get_enlace_aceptar(self, obj):
         return f"https://www.pistareserva.com/invitaciones/{obj.token}/aceptar/" if obj.token else None
@@ -181,7 +243,7 @@ class ReservationInvitationSerializer(serializers.ModelSerializer):
         return obj.nombre_invitado or obj.email
         
 class ViviendaSerializer(serializers.ModelSerializer):
-    community = CommunitySerializer(read_only=True)
+    community = ComunidadReferenciaSerializer(read_only=True)
     community_id = serializers.PrimaryKeyRelatedField(
         queryset=Community.objects.all(),
         source='community',
@@ -193,9 +255,15 @@ class ViviendaSerializer(serializers.ModelSerializer):
         model = Vivienda
         fields = ['id', 'nombre', 'community', 'community_id']
 
+
+class ViviendaReferenciaSerializer(ViviendaSerializer):
+    def get_attribute(self, instance):
+        return referencia.vivienda(instance.vivienda_id)
+
+
 class UsuarioSerializer(serializers.ModelSerializer):
-    vivienda = ViviendaSerializer(read_only=True)
-    community = CommunitySerializer(read_only=True)
+    vivienda = ViviendaReferenciaSerializer(read_only=True)
+    community = ComunidadReferenciaSerializer(read_only=True)
     vivienda_id = serializers.PrimaryKeyRelatedField(
         queryset=Vivienda.objects.all(), 
         source='vivienda', 
@@ -222,7 +290,15 @@ class UsuarioSerializer(serializers.ModelSerializer):
             'vivienda_id', 'community_id', 'codigo_comunidad', 'accepted_terms', 'terms_accepted_at'
         )
 
-    
+    def validate_email(self, value):
+        # La unicidad del modelo distingue mayúsculas; el registro no debe
+        qs = Usuario.objects.filter(email_normalizado=normalizar_email(value))
+        if self.instance:
+            qs = qs.exclude(pk=self.instance.pk)
+        if qs.exists():
+            raise serializers.ValidationError('Email ya registrado')
+        return value
+
     def validate(self, data):
     # Obtiene la comunidad por ID o por código
         comunidad = data.get('community') or data.get('community_id')
@@ -255,8 +331,8 @@ class UsuarioSerializer(serializers.ModelSerializer):
         
 class ReservationSerializer(serializers.ModelSerializer):
     user = UsuarioSerializer(read_only=True)
-    court = CourtSerializer(read_only=True)
-    timeslot = TimeSlotSerializer(read_only=True)
+    court = PistaReferenciaSerializer(read_only=True)
+    timeslot = TurnoReferenciaSerializer(read_only=True)
     invitaciones = ReservationInvitationSerializer(many=True, read_only=True)
     estado = serializers.CharField()  # ← Añade este campo
 
@@ -269,9 +345,8 @@ class ReservationSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'user']       
         
     def get_vivienda(self, obj):
-        if obj.user and obj.user.vivienda:
-            return obj.user.vivienda.nombre
-        return None
+        vivienda = referencia.vivienda(obj.user.vivienda_id) if obj.user else None
+        return vivienda.nombre if vivienda else None
     
         
     def validate_date(self, value):
@@ -280,8 +355,8 @@ class ReservationSerializer(serializers.ModelSerializer):
         return value
     
 class WriteReservationSerializer(serializers.ModelSerializer):
-    court = serializers.PrimaryKeyRelatedField(queryset=Court.objects.all())
-    timeslot = serializers.PrimaryKeyRelatedField(queryset=TimeSlot.objects.all())
+    court = ReferenciaRelatedField(referencia.pista, queryset=Court.objects.all())
+    timeslot = ReferenciaRelatedField(referencia.turno, queryset=TimeSlot.objects.all())
     user = serializers.PrimaryKeyRelatedField(queryset=Usuario.objects.all(), required=False)
     
 
@@ -290,7 +365,7 @@ class WriteReservationSerializer(serializers.ModelSerializer):
         fields = ('user', 'court', 'timeslot', 'date')
         validators = [
             UniqueTogetherValidator(
-                queryset=Reservation.objects.all(),
+                queryset=Reservation.objects.filter(estado='activa'),
                 fields=['court', 'timeslot', 'date'],
                 message="Este horario ya está reservado"
             )
@@ -331,7 +406,7 @@ class WriteReservationSerializer(serializers.ModelSerializer):
 
         vivienda = getattr(user, 'vivienda', None)
         if vivienda:
-            qs = Reservation.objects.filter(user__vivienda=vivienda, date=date)
+            qs = Reservation.objects.filter(user__vivienda=vivienda, date=date, estado='activa')
             # Excluir la propia reserva si es edición
             if self.instance:
                 qs = qs.exclude(pk=self.instance.pk)
@@ -368,10 +443,27 @@ class RespuestaAnuncioSerializer(serializers.ModelSerializer):
         fields = ['id', 'anuncio', 'contenido', 'autor', 'autor_nombre', 'creado']
         read_only_fields = ['autor', 'autor_nombre']
 
+# Respuestas que el feed incluye de cada anuncio; el hilo completo está en anuncios/{id}/respuestas/
+ULTIMAS_RESPUESTAS = 3
+
+
+def respuestas_recientes():
+    return RespuestaAnuncio.objects.select_related('autor').order_by('-creado', '-id')
+
+
+def con_resumen_respuestas(queryset):
+    """Añade el total de respuestas y precarga las ULTIMAS_RESPUESTAS de cada anuncio (una consulta más)."""
+    return queryset.annotate(num_respuestas=Count('respuestas')).prefetch_related(
+        Prefetch('respuestas', queryset=respuestas_recientes()[:ULTIMAS_RESPUESTAS], to_attr='ultimas_respuestas')
+    )
+
+
 class AnuncioSerializer(serializers.ModelSerializer):
     autor_nombre = serializers.CharField(source='autor.nombre', read_only=True)
-    respuestas = RespuestaAnuncioSerializer(many=True, read_only=True)
+    respuestas = serializers.SerializerMethodField()
+    num_respuestas = serializers.SerializerMethodField()
     imagen = serializers.ImageField(required=False)
+    imagen_variantes = serializers.SerializerMethodField()
 
     titulo = serializers.CharField(required=True, allow_blank=False)
     contenido = serializers.CharField(required=True, allow_blank=False)
@@ -379,10 +471,49 @@ class AnuncioSerializer(serializers.ModelSerializer):
     class Meta:
         model = Anuncio
         fields = [
-            'id', 'titulo', 'contenido', 'imagen', 'autor_nombre',
-            'autor', 'respuestas', 'creado', 'editado'
+            'id', 'titulo', 'contenido', 'imagen', 'imagen_variantes', 'autor_nombre',
+            'autor', 'respuestas', 'num_respuestas', 'creado', 'editado'
         ]
-        read_only_fields = ['autor', 'autor_nombre', 'respuestas', 'creado', 'editado']
+        read_only_fields = ['autor', 'autor_nombre', 'respuestas', 'num_respuestas', 'creado', 'editado']
+
+    # Sin con_resumen_respuestas (p. ej. la respuesta a un POST) se consultan aparte
+    def get_respuestas(self, obj):
+        ultimas = getattr(obj, 'ultimas_respuestas', None)
+        if ultimas is None:
+            ultimas = respuestas_recientes().filter(anuncio=obj)[:ULTIMAS_RESPUESTAS]
+        # Se muestran en orden cronológico, como en el hilo
+        return RespuestaAnuncioSerializer(reversed(list(ultimas)), many=True, context=self.context).data
+
+    def get_num_respuestas(self, obj):
+        num = getattr(obj, 'num_respuestas', None)
+        return obj.respuestas.count() if num is None else num
+
+    def get_imagen_variantes(self, obj):
+        # Hasta que el worker las genera (o si falló) no hay variantes: se usa `imagen`
+        if obj.imagen_pendiente or not obj.imagen_variantes:
+            return None
+        request = self.context.get('request')
+        storage = obj.imagen.storage
+        resultado = {}
+        for nombre, variante in obj.imagen_variantes.items():
+            resultado[nombre] = dict(variante)
+            for formato in ('webp', 'jpeg'):
+                url = storage.url(variante[formato])
+                resultado[nombre][formato] = request.build_absolute_uri(url) if request else url
+        return resultado
+
+    def _marcar_imagen(self, validated_data):
+        # Una imagen nueva (o quitarla) deja el anuncio pendiente para procesar_imagenes
+        if 'imagen' in validated_data:
+            validated_data['imagen_pendiente'] = True
+
+    def create(self, validated_data):
+        self._marcar_imagen(validated_data)
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        self._marcar_imagen(validated_data)
+        return super().update(instance, validated_data)
 
     def validate_titulo(self, value):
         if not value or value.strip() in ("", "undefined"):
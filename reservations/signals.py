@@ -1,8 +1,16 @@
 from django.dispatch import receiver
 from django_rest_passwordreset.signals import reset_password_token_created
-from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from .autenticacion import invalidar_estado_usuario
+from .calendario import invalidar_por_fila
+from .correo import encolar_email
+from .imagenes import borrar_variantes
+from .models import Reservation, ReservationInvitation, CalendarioUsuario, Usuario, Community, Court, TimeSlot, Vivienda, Anuncio
+from .referencia import invalidar as invalidar_referencia
 
 @receiver(reset_password_token_created)
 def password_reset_token_created(sender, instance, reset_password_token, *args, **kwargs):
@@ -13,10 +21,56 @@ def password_reset_token_created(sender, instance, reset_password_token, *args,
     html_content = render_to_string('emails/user_reset_password.html', context)
     text_content = strip_tags(html_content)
 
-    subject = "Recupera tu contraseña"
-    from_email = "info@pistareserva.com"
-    to_email = [reset_password_token.user.email]
+    # Se encola: el envío lo hace `enviar_correos` fuera de la petición
+    encolar_email(
+        "Recupera tu contraseña",
+        reset_password_token.user.email,
+        texto=text_content,
+        html=html_content,
+    )
 
-    msg = EmailMultiAlternatives(subject, text_content, from_email, to_email)
-    msg.attach_alternative(html_content, "text/html")
-    msg.send()
+
+# --- Invalidación de los calendarios .ics ---
+# Las escrituras con update()/bulk_create no pasan por aquí y se invalidan
+# explícitamente donde se hacen (Reservation.cancelar, transiciones de invitación).
+# Los borrados por lotes marcan una vez por lote (`calendario.por_lotes`).
+@receiver([post_save, post_delete], sender=Reservation)
+def invalidar_calendario_reserva(sender, instance, created=False, **kwargs):
+    if not invalidar_por_fila():
+        return
+    if created:
+        CalendarioUsuario.marcar_pendiente(usuario_id=instance.user_id)
+        return
+    CalendarioUsuario.marcar_pendiente(
+        Q(usuario_id=instance.user_id)
+        | Q(usuario__reservationinvitation__reserva_id=instance.pk, usuario__reservationinvitation__estado='aceptada')
+    )
+
+
+@receiver([post_save, post_delete], sender=ReservationInvitation)
+def invalidar_calendario_invitacion(sender, instance, **kwargs):
+    if instance.invitado_id and invalidar_por_fila():
+        CalendarioUsuario.marcar_pendiente(usuario_id=instance.invitado_id)
+
+
+# --- Estado del usuario cacheado para la autenticación JWT ---
+@receiver([post_save, post_delete], sender=Usuario)
+def invalidar_estado_jwt(sender, instance, **kwargs):
+    invalidar_estado_usuario(instance.pk)
+
+
+# --- Datos de referencia cacheados en cada proceso (`reservations/referencia.py`) ---
+@receiver([post_save, post_delete], sender=Community)
+@receiver([post_save, post_delete], sender=Court)
+@receiver([post_save, post_delete], sender=TimeSlot)
+@receiver([post_save, post_delete], sender=Vivienda)
+def invalidar_datos_referencia(sender, instance, **kwargs):
+    invalidar_referencia()
+
+
+# --- Variantes de las imágenes de anuncios (`reservations/imagenes.py`) ---
+@receiver(post_delete, sender=Anuncio)
+def borrar_variantes_anuncio(sender, instance, **kwargs):
+    if instance.imagen_variantes:
+        storage, variantes = instance.imagen.storage, instance.imagen_variantes
+        transaction.on_commit(lambda: borrar_variantes(storage, variantes))
@@ -0,0 +1,273 @@
+# reservations/sintetico.py
+#
+# Generador de datos sintéticos para reproducir en local volúmenes y
+# distribuciones parecidos a producción. Todo sale de un único
+# `random.Random(seed)`, de modo que misma semilla + misma fecha base
+# producen exactamente los mismos datos.
+
+import random
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from .models import (
+    Community, Vivienda, Usuario, Court, TimeSlot, Reservation, ReservationInvitation,
+    InvitadoExterno, Anuncio
+)
+
+PREFIJO_CODIGO = 'SYN'
+PASSWORD_SINTETICO = 'sintetico-1234'
+DOMINIO_EMAIL = 'sintetico.test'
+
+# Turnos de 90 minutos de 08:00 a 23:00
+TURNOS = [(time(8 + (i * 90) // 60, (i * 90) % 60), time(8 + ((i + 1) * 90) // 60, ((i + 1) * 90) % 60)) for i in range(10)]
+
+# Factor de demanda por día de la semana (lunes=0) y por hora de inicio
+FACTOR_DIA = (0.75, 0.8, 0.85, 0.9, 1.0, 1.15, 1.1)
+FACTOR_HORA = {8: 0.35, 9: 0.45, 11: 0.4, 12: 0.45, 14: 0.3, 15: 0.45, 17: 0.85, 18: 1.0, 20: 1.0, 21: 0.7}
+
+PROB_CANCELACION = 0.08
+PROB_RESERVA_EN_APERTURA = 0.45
+INVITACIONES_POR_RESERVA = (0.15, 0.25, 0.35, 0.25)  # 0, 1, 2 o 3 invitados
+ESTADOS_INVITACION = (('aceptada', 0.68), ('rechazada', 0.12), ('pendiente', 0.20))
+PROB_INVITADO_EXTERNO = 0.3
+
+
+@contextmanager
+def _fechas_manuales():
+    """Desactiva temporalmente auto_now/auto_now_add para fijar las fechas generadas."""
+    campos = [
+        Reservation._meta.get_field('created_at'),
+        ReservationInvitation._meta.get_field('fecha_invitacion'),
+        InvitadoExterno._meta.get_field('creado_en'),
+        Usuario._meta.get_field('date_joined'),
+        Anuncio._meta.get_field('creado'),
+        Anuncio._meta.get_field('editado'),
+    ]
+    originales = [(campo, campo.auto_now, campo.auto_now_add) for campo in campos]
+    try:
+        for campo in campos:
+            campo.auto_now = campo.auto_now_add = False
+        yield
+    finally:
+        for campo, auto_now, auto_now_add in originales:
+            campo.auto_now, campo.auto_now_add = auto_now, auto_now_add
+
+
+class _Ids:
+    """Asigna ids explícitos para poder enlazar FKs sin depender de que el backend devuelva PKs en bulk_create."""
+
+    def __init__(self, modelo):
+        self.siguiente = (modelo.objects.aggregate(m=Max('id'))['m'] or 0) + 1
+
+    def __call__(self):
+        valor = self.siguiente
+        self.siguiente += 1
+        return valor
+
+
+class _Lotes:
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.pendientes = {}
+        self.totales = {}
+
+    def agregar(self, obj):
+        modelo = type(obj)
+        lista = self.pendientes.setdefault(modelo, [])
+        lista.append(obj)
+        if len(lista) >= self.batch_size:
+            self.volcar(modelo)
+
+    def volcar(self, modelo=None):
+        # Respeta el orden de dependencias entre tablas al volcar todo
+        orden = [Reservation, ReservationInvitation, InvitadoExterno, Anuncio]
+        for m in ([modelo] if modelo else orden):
+            if m is ReservationInvitation and modelo is not None:
+                self.volcar(Reservation)
+            lista = self.pendientes.pop(m, [])
+            if lista:
+                m.objects.bulk_create(lista, batch_size=self.batch_size)
+                self.totales[m.__name__] = self.totales.get(m.__name__, 0) + len(lista)
+
+
+def _elegir(rng, opciones):
+    r = rng.random()
+    acumulado = 0
+    for valor, peso in opciones:
+        acumulado += peso
+        if r < acumulado:
+            return valor
+    return opciones[-1][0]
+
+
+def _num_invitados(rng):
+    return _elegir(rng, list(enumerate(INVITACIONES_POR_RESERVA)))
+
+
+def generar(comunidades=1, pistas=2, viviendas=60, dias_historial=90, dias_futuro=2,
+            ocupacion=0.55, seed=1, fecha_base=None, batch_size=2000, max_reservas=None,
+            password=PASSWORD_SINTETICO, stdout=None):
+    rng = random.Random(seed)
+    tz = timezone.get_current_timezone()
+    fecha_base = fecha_base or timezone.localdate()
+    # Un único hash para todos los usuarios: generar miles de PBKDF2 tardaría minutos
+    password_hash = make_password(password, salt='sintetico')
+    lotes = _Lotes(batch_size)
+
+    ids = {modelo: _Ids(modelo) for modelo in (
+        Community, Vivienda, Usuario, Court, TimeSlot, Reservation, ReservationInvitation,
+        InvitadoExterno, Anuncio
+    )}
+    primera_comunidad = ids[Community].siguiente
+    n_reservas = 0
+
+    with _fechas_manuales(), transaction.atomic():
+        for n in range(comunidades):
+            comunidad = Community(
+                id=ids[Community](),
+                name=f"Comunidad sintética {primera_comunidad + n}",
+                direccion=f"Calle Falsa {rng.randint(1, 200)}",
+                code=f"{PREFIJO_CODIGO}{primera_comunidad + n:05d}",
+                reserva_hora_apertura_pasado=time(8, 0),
+                reserva_max_dias=2,
+            )
+            Community.objects.bulk_create([comunidad])
+
+            # Viviendas y vecinos (1-3 por vivienda)
+            lista_viviendas = [
+                Vivienda(id=ids[Vivienda](), nombre=f"{comunidad.code}-{v + 1:04d}", community=comunidad)
+                for v in range(viviendas)
+            ]
+            Vivienda.objects.bulk_create(lista_viviendas, batch_size=batch_size)
+            usuarios = []
+            por_vivienda = {}
+            for vivienda in lista_viviendas:
+                for k in range(rng.choice((1, 1, 2, 2, 3))):
+                    usuario = Usuario(
+                        id=ids[Usuario](),
+                        email=f"{vivienda.nombre.lower()}.{k}@{DOMINIO_EMAIL}",
+                        nombre=f"Vecino{k}",
+                        apellido=vivienda.nombre,
+                        vivienda=vivienda,
+                        community=comunidad,
+                        password=password_hash,
+                        accepted_terms=True,
+                        terms_accepted_at=timezone.make_aware(datetime.combine(fecha_base - timedelta(days=dias_historial + 30), time(12)), tz),
+                        date_joined=timezone.make_aware(datetime.combine(fecha_base - timedelta(days=rng.randint(dias_historial, dias_historial + 365)), time(12)), tz),
+                    )
+                    usuarios.append(usuario)
+                    por_vivienda.setdefault(vivienda.id, []).append(usuario)
+            Usuario.objects.bulk_create(usuarios, batch_size=batch_size)
+
+            # Pistas y turnos
+            lista_pistas = [
+                Court(id=ids[Court](), name=f"{comunidad.code} Pista {p + 1}", community=comunidad)
+                for p in range(pistas)
+            ]
+            Court.objects.bulk_create(lista_pistas)
+            turnos = []
+            for pista in lista_pistas:
+                for inicio, fin in TURNOS:
+                    turnos.append(TimeSlot(
+                        id=ids[TimeSlot](), court=pista, slot=f"{inicio:%H:%M}-{fin:%H:%M}",
+                        start_time=inicio, end_time=fin
+                    ))
+            TimeSlot.objects.bulk_create(turnos)
+
+            # Reservas día a día, como mucho una por vivienda y día
+            externos_vistos = set()
+            for d in range(-dias_historial, dias_futuro + 1):
+                fecha = fecha_base + timedelta(days=d)
+                apertura = timezone.make_aware(datetime.combine(fecha - timedelta(days=comunidad.reserva_max_dias), comunidad.reserva_hora_apertura_pasado), tz)
+                libres = list(por_vivienda)
+                rng.shuffle(libres)
+                for turno in turnos:
+                    if not libres:
+                        break
+                    if max_reservas is not None and n_reservas >= max_reservas:
+                        break
+                    prob = ocupacion * FACTOR_DIA[fecha.weekday()] * FACTOR_HORA.get(turno.start_time.hour, 0.5)
+                    if rng.random() >= min(prob, 0.98):
+                        continue
+                    inicio_partido = timezone.make_aware(datetime.combine(fecha, turno.start_time), tz)
+                    ventana = max((inicio_partido - apertura).total_seconds(), 60)
+                    if rng.random() < PROB_RESERVA_EN_APERTURA:
+                        creada = apertura + timedelta(seconds=rng.expovariate(1 / 300))
+                    else:
+                        creada = apertura + timedelta(seconds=rng.uniform(0, ventana))
+                    creada = min(creada, inicio_partido - timedelta(minutes=1))
+                    vivienda_id = libres.pop()
+                    usuario = rng.choice(por_vivienda[vivienda_id])
+
+                    if rng.random() < PROB_CANCELACION:
+                        cancelada = creada + timedelta(seconds=rng.uniform(0, max((inicio_partido - creada).total_seconds(), 60)))
+                        lotes.agregar(Reservation(
+                            id=ids[Reservation](), user=usuario, court_id=turno.court_id, timeslot=turno,
+                            date=fecha, created_at=creada, estado='cancelada', cancelada_at=cancelada,
+                            slot_activo=None
+                        ))
+                        libres.append(vivienda_id)
+                        continue
+
+                    reserva = Reservation(
+                        id=ids[Reservation](), user=usuario, court_id=turno.court_id, timeslot=turno,
+                        date=fecha, created_at=creada, estado='activa'
+                    )
+                    lotes.agregar(reserva)
+                    n_reservas += 1
+                    _invitaciones(rng, lotes, ids, reserva, usuario, usuarios, creada, inicio_partido, fecha_base, externos_vistos)
+
+                if max_reservas is not None and n_reservas >= max_reservas:
+                    break
+
+            # Algunos anuncios por semana
+            for semana in range(dias_historial // 7 + 1):
+                for _ in range(rng.randint(0, 3)):
+                    autor = rng.choice(usuarios)
+                    creado = timezone.make_aware(datetime.combine(fecha_base - timedelta(days=semana * 7 + rng.randint(0, 6)), time(rng.randint(8, 22))), tz)
+                    lotes.agregar(Anuncio(
+                        id=ids[Anuncio](), autor=autor, titulo=f"Anuncio {semana}",
+                        contenido="Texto de prueba generado automáticamente.", creado=creado, editado=creado
+                    ))
+            lotes.volcar()
+            if stdout:
+                stdout.write(f"Comunidad {comunidad.code}: {len(usuarios)} usuarios, {n_reservas} reservas acumuladas")
+            if max_reservas is not None and n_reservas >= max_reservas:
+                break
+
+    return lotes.totales
+
+
+def _invitaciones(rng, lotes, ids, reserva, convocante, usuarios, creada, inicio_partido, fecha_base, externos_vistos):
+    elegidos = set()
+    for _ in range(_num_invitados(rng)):
+        estado = _elegir(rng, ESTADOS_INVITACION)
+        enviada = creada + timedelta(seconds=rng.uniform(0, 3600))
+        if rng.random() < PROB_INVITADO_EXTERNO:
+            numero = rng.randint(1, 500)
+            email = f"externo{numero}@{DOMINIO_EMAIL}"
+            if email in elegidos:
+                continue
+            nombre = f"Externo {numero}"
+            invitado = None
+            if (convocante.id, email) not in externos_vistos:
+                externos_vistos.add((convocante.id, email))
+                lotes.agregar(InvitadoExterno(
+                    id=ids[InvitadoExterno](), usuario=convocante, email=email, nombre=nombre, creado_en=enviada
+                ))
+        else:
+            invitado = rng.choice(usuarios)
+            if invitado.id == convocante.id or invitado.email in elegidos:
+                continue
+            email, nombre = invitado.email, invitado.nombre
+        elegidos.add(email)
+        if estado == 'pendiente' and inicio_partido.date() < fecha_base:
+            estado = 'aceptada'
+        lotes.agregar(ReservationInvitation(
+            id=ids[ReservationInvitation](), reserva=reserva, invitado=invitado, email=email,
+            nombre_invitado=nombre, estado=estado, fecha_invitacion=enviada,
+            token=f"syn{rng.getrandbits(192):048x}",
+        ))
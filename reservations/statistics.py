@@ -1,9 +1,10 @@
 # reservations/statistics.py
 
 from datetime import date, timedelta
-from django.db.models import Count, Avg, F, ExpressionWrapper, DurationField
-from django.db.models.functions import TruncWeek
-from .models import Reservation, ReservationCancelada, ReservationInvitation, Court, Usuario, TimeSlot
+from django.db.models import Count
+from .models import Court, Usuario, TimeSlot
+from .archivo import fuentes
+from .distribuciones import distribucion_antelacion, distribucion_cancelaciones
 
 # --- Utilidad filtro comunidad ---
 def get_community_filter(community_id):
@@ -11,53 +12,64 @@ def get_community_filter(community_id):
         return {'court__community_id': community_id}
     return {}
 
+# --- Lectura conjunta de reservas vivas y archivadas ---
+def _reservas(fecha_inicio, fecha_fin, **filtros):
+    """Un queryset por fuente (Reservation y, si hace falta, ReservaArchivada)."""
+    return [
+        modelo.objects.filter(date__range=[fecha_inicio, fecha_fin], **filtros)
+        for modelo, _ in fuentes(fecha_inicio)
+    ]
+
+def _invitaciones(fecha_inicio, fecha_fin, **filtros):
+    return [
+        modelo_invitacion.objects.filter(reserva__date__range=[fecha_inicio, fecha_fin], **filtros)
+        for _, modelo_invitacion in fuentes(fecha_inicio)
+    ]
+
+def _contar(querysets):
+    return sum(qs.count() for qs in querysets)
+
+def _agrupar(querysets, *campos, top=None):
+    # Suma los totales por grupo de todas las fuentes y ordena de mayor a menor
+    totales = {}
+    for qs in querysets:
+        for fila in qs.values(*campos).annotate(total=Count('id')).order_by():
+            clave = tuple(fila[campo] for campo in campos)
+            totales[clave] = totales.get(clave, 0) + fila['total']
+    filas = [dict(zip(campos, clave), total=total) for clave, total in totales.items()]
+    filas.sort(key=lambda fila: -fila['total'])
+    return filas[:top] if top else filas
+
 # --- Reservas totales por periodo ---
 def reservas_totales_periodo(fecha_inicio, fecha_fin, community_id=None):
     filt = get_community_filter(community_id)
-    return Reservation.objects.filter(
-        date__range=[fecha_inicio, fecha_fin],
-        estado='activa',
-        **filt
-    ).count()
+    return _contar(_reservas(fecha_inicio, fecha_fin, estado='activa', **filt))
 
 # --- Reservas por pista ---
 def reservas_por_pista(fecha_inicio, fecha_fin, community_id=None):
     filt = get_community_filter(community_id)
-    return list(
-        Reservation.objects.filter(
-            date__range=[fecha_inicio, fecha_fin],
-            estado='activa',
-            **filt
-        ).values('court__name')
-         .annotate(total=Count('id'))
-         .order_by('-total')
-    )
+    return _agrupar(_reservas(fecha_inicio, fecha_fin, estado='activa', **filt), 'court__name')
 
 # --- Reservas por comunidad (acumulado) ---
 def reservas_por_comunidad(fecha_inicio, fecha_fin):
-    return list(
-        Reservation.objects.filter(
-            date__range=[fecha_inicio, fecha_fin],
-            estado='activa'
-        ).values('court__community__name')
-         .annotate(total=Count('id'))
-         .order_by('-total')
-    )
+    return _agrupar(_reservas(fecha_inicio, fecha_fin, estado='activa'), 'court__community__name')
 
 # --- Ocupación por pista ---
 def porcentaje_ocupacion_por_pista(fecha_inicio, fecha_fin, community_id=None):
     dias = (fecha_fin - fecha_inicio).days + 1
     courts = Court.objects.filter(community_id=community_id) if community_id else Court.objects.all()
+    filt = get_community_filter(community_id)
+    n_slots = dict(
+        TimeSlot.objects.filter(court__in=courts).values_list('court_id').annotate(n=Count('id')).order_by()
+    )
+    reservas = {
+        (fila['court_id'],): fila['total']
+        for fila in _agrupar(_reservas(fecha_inicio, fecha_fin, estado='activa', **filt), 'court_id')
+    }
     resultados = []
     for court in courts:
-        n_slots = TimeSlot.objects.filter(court=court).count()
-        slots_totales = n_slots * dias
-        reservas = Reservation.objects.filter(
-            court=court,
-            date__range=[fecha_inicio, fecha_fin],
-            estado='activa'
-        ).count()
-        ocupacion = (reservas / slots_totales * 100) if slots_totales else 0
+        slots_totales = n_slots.get(court.id, 0) * dias
+        ocupacion = (reservas.get((court.id,), 0) / slots_totales * 100) if slots_totales else 0
         resultados.append({'pista': court.name, 'ocupacion_pct': round(ocupacion, 1)})
     return resultados
 
@@ -65,43 +77,29 @@ def porcentaje_ocupacion_por_pista(fecha_inicio, fecha_fin, community_id=None):
 def partidos_mes(community_id=None):
     hoy = date.today()
     filt = get_community_filter(community_id)
-    return Reservation.objects.filter(
-        date__year=hoy.year,
-        date__month=hoy.month,
-        estado='activa',
-        **filt
-    ).count()
+    inicio = hoy.replace(day=1)
+    fin = (inicio + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return _contar(_reservas(inicio, fin, estado='activa', **filt))
 
 def partidos_semana(community_id=None):
     hoy = date.today()
     filt = get_community_filter(community_id)
-    qs = Reservation.objects.annotate(sem=TruncWeek('date')).filter(
-        sem=TruncWeek(hoy),
-        estado='activa',
-        **filt
-    )
-    return qs.count()
+    inicio = hoy - timedelta(days=hoy.weekday())
+    return _contar(_reservas(inicio, inicio + timedelta(days=6), estado='activa', **filt))
 
 # --- Ranking usuarios más activos ---
 def ranking_usuarios_activos(fecha_inicio, fecha_fin, community_id=None, top=10):
     filt = get_community_filter(community_id)
-    return list(
-        Reservation.objects.filter(
-            date__range=[fecha_inicio, fecha_fin],
-            estado='activa',
-            user__isnull=False,
-            **filt
-        )
-        .values('user__email', 'user__nombre')
-        .annotate(total=Count('id'))
-        .order_by('-total')[:top]
+    return _agrupar(
+        _reservas(fecha_inicio, fecha_fin, estado='activa', user__isnull=False, **filt),
+        'user__email', 'user__nombre', top=top
     )
 
 # --- Proporción usuarios vs staff ---
 def proporcion_usuarios_vs_staff(fecha_inicio, fecha_fin, community_id=None):
     filt = get_community_filter(community_id)
-    total = Reservation.objects.filter(date__range=[fecha_inicio, fecha_fin], estado='activa', **filt).count()
-    staff = Reservation.objects.filter(date__range=[fecha_inicio, fecha_fin], estado='activa', user__is_staff=True, **filt).count()
+    total = _contar(_reservas(fecha_inicio, fecha_fin, estado='activa', **filt))
+    staff = _contar(_reservas(fecha_inicio, fecha_fin, estado='activa', user__is_staff=True, **filt))
     usuarios = total - staff if total >= staff else 0
     return {
         "total": total,
@@ -113,26 +111,17 @@ def proporcion_usuarios_vs_staff(fecha_inicio, fecha_fin, community_id=None):
 
 # --- Invitaciones enviadas / aceptadas ---
 def invitaciones_kpis(fecha_inicio, fecha_fin, community_id=None):
-    filt = get_community_filter(community_id)
-    reservas_ids = Reservation.objects.filter(
-        date__range=[fecha_inicio, fecha_fin],
-        estado='activa',
-        **filt
-    ).values_list('id', flat=True)
-    total_enviadas = ReservationInvitation.objects.filter(
-        reserva_id__in=reservas_ids
-    ).count()
-    aceptadas = ReservationInvitation.objects.filter(
-        reserva_id__in=reservas_ids, estado='aceptada'
-    ).count()
+    filt = {f'reserva__{campo}': valor for campo, valor in get_community_filter(community_id).items()}
+    total_enviadas = _contar(_invitaciones(fecha_inicio, fecha_fin, reserva__estado='activa', **filt))
+    aceptadas = _contar(_invitaciones(fecha_inicio, fecha_fin, reserva__estado='activa', estado='aceptada', **filt))
     tasa = round((aceptadas / total_enviadas) * 100, 1) if total_enviadas else 0
     return {"enviadas": total_enviadas, "aceptadas": aceptadas, "tasa_aceptacion": tasa}
 
 # --- Tasa de cancelaciones ---
 def tasa_cancelaciones(fecha_inicio, fecha_fin, community_id=None):
     filt = get_community_filter(community_id)
-    totales = Reservation.objects.filter(date__range=[fecha_inicio, fecha_fin], estado='activa', **filt).count()
-    canceladas = ReservationCancelada.objects.filter(date__range=[fecha_inicio, fecha_fin], **filt).count()
+    totales = _contar(_reservas(fecha_inicio, fecha_fin, estado='activa', **filt))
+    canceladas = _contar(_reservas(fecha_inicio, fecha_fin, estado='cancelada', **filt))
     suma = totales + canceladas
     tasa = round((canceladas / suma) * 100, 1) if suma else 0
     return {'total': totales, 'canceladas': canceladas, 'tasa': tasa}
@@ -140,30 +129,19 @@ def tasa_cancelaciones(fecha_inicio, fecha_fin, community_id=None):
 # --- Reservas por franja horaria ---
 def reservas_por_horario(fecha_inicio, fecha_fin, community_id=None):
     filt = get_community_filter(community_id)
-    return list(
-        Reservation.objects.filter(
-            date__range=[fecha_inicio, fecha_fin],
-            estado='activa',
-            timeslot__isnull=False,
-            **filt
-        ).values('timeslot__start_time', 'timeslot__end_time')
-        .annotate(total=Count('id'))
-        .order_by('-total')
+    return _agrupar(
+        _reservas(fecha_inicio, fecha_fin, estado='activa', timeslot__isnull=False, **filt),
+        'timeslot__start_time', 'timeslot__end_time'
     )
 
 # --- Participación media por partido ---
 def participacion_media(fecha_inicio, fecha_fin, community_id=None):
     filt = get_community_filter(community_id)
-    reservas = Reservation.objects.filter(
-        date__range=[fecha_inicio, fecha_fin],
-        estado='activa',
-        **filt
-    )
-    total_jugadores = 0
-    total_partidos = reservas.count()
-    for res in reservas:
-        invitados = res.invitaciones.filter(estado='aceptada').count() if hasattr(res, 'invitaciones') else 0
-        total_jugadores += 1 + invitados
+    total_partidos = _contar(_reservas(fecha_inicio, fecha_fin, estado='activa', **filt))
+    # Cada partido cuenta al convocante más sus invitados aceptados
+    filt_inv = {f'reserva__{campo}': valor for campo, valor in filt.items()}
+    invitados = _contar(_invitaciones(fecha_inicio, fecha_fin, reserva__estado='activa', estado='aceptada', **filt_inv))
+    total_jugadores = total_partidos + invitados
     return round(total_jugadores / total_partidos, 2) if total_partidos else 0
 
 # --- Nuevos usuarios registrados por periodo ---
@@ -172,54 +150,30 @@ def usuarios_nuevos(fecha_inicio, fecha_fin, community_id=None):
         return Usuario.objects.filter(date_joined__date__range=[fecha_inicio, fecha_fin], community_id=community_id).count()
     return Usuario.objects.filter(date_joined__date__range=[fecha_inicio, fecha_fin]).count()
 
-# --- Tiempo medio de antelación de las reservas ---
+# --- Tiempo medio de antelación de las reservas (en días) ---
 def tiempo_medio_antelacion(fecha_inicio, fecha_fin, community_id=None):
-    filt = get_community_filter(community_id)
-    reservas = Reservation.objects.filter(
-        date__range=[fecha_inicio, fecha_fin], 
-        estado='activa', created_at__isnull=False, **filt
-    )
-    if not reservas.exists():
-        return 0
-    reservas = reservas.annotate(
-        antelacion=ExpressionWrapper(
-            F('date') - F('created_at'),
-            output_field=DurationField()
-        )
-    )
-    promedio = reservas.aggregate(promedio=Avg('antelacion'))['promedio']
-    return round(promedio.total_seconds() / 86400, 2) if promedio else 0
+    media = distribucion_antelacion(fecha_inicio, fecha_fin, community_id=community_id)['global']['media']
+    return round(media / 24, 2) if media else 0
 
 # --- Cancelaciones de último minuto ---
-def cancelaciones_ultimo_minuto(fecha_inicio, fecha_fin, community_id=None, horas=24):
-    filt = get_community_filter(community_id)
-    cancels = ReservationCancelada.objects.filter(
-        date__range=[fecha_inicio, fecha_fin], **filt
-    ).exclude(cancelada_at__isnull=True)
-    total = cancels.count()
+def ultimo_minuto_de(distribucion, horas=24):
+    """KPI de último minuto (canceladas con <= `horas`) de una `distribucion_cancelaciones(umbrales=(horas,))`."""
+    resumen = distribucion['global']
+    total = resumen['n']
     if not total:
         return {'cancelaciones_ultimo_minuto': 0, 'total': 0, 'ratio_pct': 0}
-    cancels = cancels.annotate(
-        horas_antelacion=ExpressionWrapper(
-            F('date') - F('cancelada_at'),
-            output_field=DurationField()
-        )
-    )
-    max_delta = timedelta(hours=horas)
-    ult_minuto = cancels.filter(horas_antelacion__lte=max_delta).count()
-    ratio = round((ult_minuto / total) * 100, 1) if total else 0
+    ult_minuto = resumen['hasta'][horas]
+    ratio = round((ult_minuto / total) * 100, 1)
     return {'cancelaciones_ultimo_minuto': ult_minuto, 'total': total, 'ratio_pct': ratio}
 
+def cancelaciones_ultimo_minuto(fecha_inicio, fecha_fin, community_id=None, horas=24):
+    distribucion = distribucion_cancelaciones(fecha_inicio, fecha_fin, community_id=community_id, umbrales=(horas,))
+    return ultimo_minuto_de(distribucion, horas)
+
 # --- Participación por vivienda ---
 def participacion_por_vivienda(fecha_inicio, fecha_fin, community_id=None):
     filt = get_community_filter(community_id)
-    return list(
-        Reservation.objects.filter(
-            date__range=[fecha_inicio, fecha_fin],
-            estado='activa',
-            user__vivienda__isnull=False,
-            **filt
-        ).values('user__vivienda__nombre')
-        .annotate(total=Count('id'))
-        .order_by('-total')
+    return _agrupar(
+        _reservas(fecha_inicio, fecha_fin, estado='activa', user__vivienda__isnull=False, **filt),
+        'user__vivienda__nombre'
     )
@@ -1,3 +1,540 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+from datetime import date, datetime, time, timedelta
+from types import SimpleNamespace
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.forms import modelform_factory
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from . import imagenes, referencia, statistics
+from .prevision import calcular_prevision
+from .calendario import DIAS_PASADOS, calendario_de, regenerar_si_pendiente
+from .archivo import archivar, fuentes
+from .autenticacion import JWTSinEstadoAuthentication
+from .models import (
+    Community, Court, TimeSlot, Vivienda, Usuario, Reservation, ReservaArchivada, Anuncio,
+    NotificacionPendiente, EmailOutbox, CalendarioUsuario, ReservationInvitation, PrevisionOcupacion,
+)
+from .notificaciones import enviar_resumenes
+from .recordatorios import Programador
+from .router import _Contexto, marcar_escritura
+from .throttles import VENTANA, consumir
+from .serializers import CustomTokenObtainPairSerializer
 
-# Create your tests here.
+
+def crear_comunidad(code, nombre='Comunidad'):
+    comunidad = Community.objects.create(name=nombre, code=code, reserva_hora_apertura_pasado=time(0, 0))
+    pista = Court.objects.create(name=f"Pista {code}", community=comunidad)
+    turno = TimeSlot.objects.create(court=pista, slot='18:00-19:30', start_time=time(18), end_time=time(19, 30))
+    vivienda = Vivienda.objects.create(nombre=f"{code}-1", community=comunidad)
+    return comunidad, pista, turno, vivienda
+
+
+def crear_usuario(email, comunidad, vivienda, password='clave-segura-1', **extra):
+    return Usuario.objects.create_user(
+        email=email, nombre=email.split('@')[0], password=password,
+        community=comunidad, vivienda=vivienda, **extra
+    )
+
+
+def token_acceso(usuario):
+    return str(CustomTokenObtainPairSerializer.get_token(usuario).access_token)
+
+
+class BaseTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['throttle'].clear()
+        self.comunidad, self.pista, self.turno, self.vivienda = crear_comunidad('AB')
+
+    def cliente_jwt(self, usuario):
+        cliente = APIClient()
+        cliente.credentials(HTTP_AUTHORIZATION=f"Bearer {token_acceso(usuario)}")
+        return cliente
+
+
+# --- Autenticación JWT con claims ---
+class JWTSinEstadoTest(BaseTest):
+    def setUp(self):
+        super().setUp()
+        otra, _, _, otra_vivienda = crear_comunidad('CD')
+        self.usuario = crear_usuario('staff@ejemplo.com', self.comunidad, self.vivienda, is_staff=True)
+        self.vecino = crear_usuario('vecino@ejemplo.com', otra, otra_vivienda)
+
+    def usuario_del_token(self, usuario):
+        autenticacion = JWTSinEstadoAuthentication()
+        return autenticacion.get_user(autenticacion.get_validated_token(token_acceso(usuario)))
+
+    def test_usuario_construido_desde_claims(self):
+        for esperado in (self.usuario, self.vecino):
+            with self.assertNumQueries(1):
+                # Solo la instantánea de estado, que queda cacheada
+                usuario = self.usuario_del_token(esperado)
+            self.assertEqual(usuario.pk, esperado.pk)
+            self.assertEqual(usuario.email, esperado.email)
+            self.assertEqual(usuario.is_staff, esperado.is_staff)
+            self.assertEqual(usuario.community_id, esperado.community_id)
+            self.assertEqual(usuario.vivienda_id, esperado.vivienda_id)
+            self.assertTrue(usuario.is_active)
+        with self.assertNumQueries(0):
+            self.usuario_del_token(self.usuario)
+
+    def test_cambio_de_password_revoca_el_token(self):
+        cliente = self.cliente_jwt(self.vecino)
+        self.assertEqual(cliente.get('/api/dashboard/').status_code, 200)
+        self.vecino.set_password('otra-clave-segura-2')
+        self.vecino.save()
+        self.assertEqual(cliente.get('/api/dashboard/').status_code, 401)
+        self.assertEqual(self.cliente_jwt(self.vecino).get('/api/dashboard/').status_code, 200)
+
+
+# --- Réplica de lectura ---
+class ReplicaTest(BaseTest):
+    def test_escritura_reciente_no_fija_el_usuario_anonimo(self):
+        usuario = crear_usuario('a@ejemplo.com', self.comunidad, self.vivienda)
+        marcar_escritura(usuario.pk)
+        request = SimpleNamespace(user=AnonymousUser())
+        contexto = _Contexto(request)
+        self.assertFalse(contexto.escritura_reciente)
+        # DRF autentica después de abrir el contexto
+        request.user = usuario
+        self.assertTrue(contexto.escritura_reciente)
+
+    def test_prevision_ocupacion_rechaza_token_revocado(self):
+        usuario = crear_usuario('a@ejemplo.com', self.comunidad, self.vivienda)
+        cliente = self.cliente_jwt(usuario)
+        self.assertEqual(cliente.get('/api/prevision-ocupacion/').status_code, 200)
+        usuario.set_password('otra-clave-segura-2')
+        usuario.save()
+        self.assertEqual(cliente.get('/api/prevision-ocupacion/').status_code, 401)
+
+
+# --- Previsión de ocupación ---
+class PrevisionTest(BaseTest):
+    def test_pista_sin_comunidad_usa_la_politica_por_defecto(self):
+        pista = Court.objects.create(name='Pista suelta', community=None)
+        turno = TimeSlot.objects.create(court=pista, slot='10:00-11:30', start_time=time(10), end_time=time(11, 30))
+        hoy = timezone.localdate()
+        self.assertEqual(calcular_prevision(hoy=hoy, dias=1), 2)
+        prevision = PrevisionOcupacion.objects.get(timeslot=turno)
+        self.assertEqual(timezone.localtime(prevision.apertura), timezone.make_aware(datetime.combine(hoy - timedelta(days=2), time(8))))
+
+    def test_parametros_no_validos_devuelven_400(self):
+        cliente = self.cliente_jwt(crear_usuario('a@ejemplo.com', self.comunidad, self.vivienda))
+        self.assertEqual(cliente.get('/api/prevision-ocupacion/', {'date': timezone.localdate().isoformat()}).status_code, 200)
+        for parametros in ({'date': 'mañana'}, {'date': '2024-02-30'}, {'court': 'x'}):
+            self.assertEqual(cliente.get('/api/prevision-ocupacion/', parametros).status_code, 400, parametros)
+
+
+# --- Archivo de reservas en las estadísticas ---
+class ArchivoEstadisticasTest(BaseTest):
+    def test_fuentes_incluye_lo_recien_archivado(self):
+        usuario = crear_usuario('a@ejemplo.com', self.comunidad, self.vivienda)
+        antigua = date.today() - timedelta(days=400)
+        Reservation.objects.create(user=usuario, court=self.pista, timeslot=self.turno, date=antigua)
+        inicio, fin = antigua - timedelta(days=1), date.today()
+        with self.assertNumQueries(1):
+            self.assertEqual(len(fuentes(inicio)), 1)
+        # Sin nada que invalidar: la siguiente lectura ya ve el archivo
+        archivar(dias=30)
+        self.assertEqual(ReservaArchivada.objects.count(), 1)
+        self.assertEqual(len(fuentes(inicio)), 2)
+        self.assertEqual(statistics.reservas_totales_periodo(inicio, fin), 1)
+
+
+# --- Variantes de imágenes de anuncios ---
+def fichero_jpeg(nombre, tamano=(1600, 1200)):
+    salida = io.BytesIO()
+    Image.new('RGB', tamano, (200, 20, 20)).save(salida, 'JPEG')
+    return SimpleUploadedFile(nombre, salida.getvalue(), 'image/jpeg')
+
+
+class ImagenesAnuncioTest(BaseTest):
+    def setUp(self):
+        super().setUp()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=self.media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.usuario = crear_usuario('a@ejemplo.com', self.comunidad, self.vivienda)
+        self.cliente = self.cliente_jwt(self.usuario)
+
+    def publicar(self, nombre='foto.jpg'):
+        respuesta = self.cliente.post('/api/anuncios/', {
+            'titulo': 'Torneo', 'contenido': 'Apuntaos', 'imagen': fichero_jpeg(nombre)
+        }, format='multipart')
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertIsNone(respuesta.data['imagen_variantes'])
+        return Anuncio.objects.get(pk=respuesta.data['id'])
+
+    def ficheros_variantes(self, anuncio_id):
+        carpeta = os.path.join(self.media, imagenes.CARPETA, str(anuncio_id))
+        return sorted(os.listdir(carpeta)) if os.path.isdir(carpeta) else []
+
+    def test_reclamar_reserva_y_procesar_publica_las_variantes(self):
+        anuncio = self.publicar()
+        reclamados = imagenes.reclamar(10)
+        self.assertEqual([a.id for a in reclamados], [anuncio.id])
+        # Mientras dura la reserva ningún otro worker lo recoge
+        self.assertEqual(imagenes.reclamar(10), [])
+        self.assertEqual(imagenes.procesar(reclamados), (1, 0))
+        anuncio.refresh_from_db()
+        self.assertFalse(anuncio.imagen_pendiente)
+        self.assertIsNone(anuncio.imagen_bloqueada_hasta)
+        self.assertEqual(anuncio.imagen_variantes['feed']['ancho'], 1080)
+        self.assertEqual(len(self.ficheros_variantes(anuncio.id)), len(imagenes.VARIANTES) * len(imagenes.FORMATOS))
+        datos = self.cliente.get(f'/api/anuncios/{anuncio.id}/').data['imagen_variantes']
+        self.assertTrue(datos['miniatura']['webp'].endswith('foto-miniatura.webp'))
+
+    def test_imagen_cambiada_durante_el_proceso_no_se_publica(self):
+        anuncio = self.publicar()
+        reclamados = imagenes.reclamar(10)
+        respuesta = self.cliente.patch(f'/api/anuncios/{anuncio.id}/', {'imagen': fichero_jpeg('otra.jpg')}, format='multipart')
+        self.assertEqual(respuesta.status_code, 200)
+        imagenes.procesar(reclamados)
+        anuncio.refresh_from_db()
+        self.assertTrue(anuncio.imagen_pendiente)
+        self.assertEqual(anuncio.imagen_variantes, {})
+        self.assertEqual(self.ficheros_variantes(anuncio.id), [])
+        # La reserva se libera y la imagen nueva se procesa en la siguiente vuelta
+        imagenes.procesar(imagenes.reclamar(10))
+        anuncio.refresh_from_db()
+        self.assertFalse(anuncio.imagen_pendiente)
+        self.assertTrue(all(f.startswith('otra-') for f in self.ficheros_variantes(anuncio.id)))
+
+    def test_borrar_el_anuncio_borra_sus_variantes(self):
+        anuncio = self.publicar()
+        imagenes.procesar(imagenes.reclamar(10))
+        self.assertTrue(self.ficheros_variantes(anuncio.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.cliente.delete(f'/api/anuncios/{anuncio.id}/').status_code, 204)
+        self.assertEqual(self.ficheros_variantes(anuncio.id), [])
+
+
+# --- Caché de datos de referencia ---
+class ReferenciaTest(BaseTest):
+    def test_ids_desconocidos_no_repiten_la_consulta(self):
+        referencia.invalidar()
+        with self.assertNumQueries(2):
+            for _ in range(3):
+                self.assertIsNone(referencia.pista(999999))
+                self.assertIsNone(referencia.vivienda(999999))
+        # Una pista creada después cambia la versión y deja de constar como ausente
+        nueva = Court.objects.create(name='Nueva', community=self.comunidad)
+        self.assertEqual(referencia.pista(nueva.id).name, 'Nueva')
+
+    def test_str_de_turno_con_pista_borrada(self):
+        turno = TimeSlot.objects.get(pk=self.turno.pk)
+        court_id = turno.court_id
+        self.pista.delete()
+        self.assertEqual(str(turno), f"Pista {court_id} - 18:00–19:30")
+
+
+# --- Resúmenes de notificaciones ---
+class ResumenesTest(BaseTest):
+    def test_un_resumen_por_destinatario_y_sin_repetir(self):
+        antes = timezone.now() - timedelta(hours=2)
+        for email in ('a@ejemplo.com', 'a@ejemplo.com', 'b@ejemplo.com'):
+            NotificacionPendiente.objects.create(
+                destinatario=email, tipo='anuncio', datos={'titulo': 'T', 'autor': 'X'}, creado_at=antes
+            )
+        self.assertEqual(enviar_resumenes(minutos=60), (2, 3))
+        self.assertFalse(NotificacionPendiente.objects.exists())
+        self.assertEqual(sorted(EmailOutbox.objects.values_list('destinatario', flat=True)), ['a@ejemplo.com', 'b@ejemplo.com'])
+        self.assertEqual(enviar_resumenes(minutos=60), (0, 0))
+
+
+# --- Feed iCalendar ---
+class CalendarioTest(BaseTest):
+    def test_la_ventana_avanza_aunque_nada_marque_el_feed(self):
+        usuario = crear_usuario('a@ejemplo.com', self.comunidad, self.vivienda)
+        hoy = timezone.localdate()
+        vieja = Reservation.objects.create(user=usuario, court=self.pista, timeslot=self.turno, date=hoy - timedelta(days=DIAS_PASADOS))
+        calendario = regenerar_si_pendiente(calendario_de(usuario))
+        self.assertIn(f'reserva-{vieja.id}@', calendario.contenido)
+        # Generado ayer con la reserva todavía dentro de la ventana; hoy ya ha salido
+        ayer = timezone.now() - timedelta(days=1)
+        Reservation.objects.filter(pk=vieja.pk).update(date=hoy - timedelta(days=DIAS_PASADOS + 1))
+        CalendarioUsuario.objects.filter(pk=calendario.pk).update(pendiente=False, generado_at=ayer)
+        contenido = self.client.get(f'/calendario/{calendario.token}.ics').content.decode()
+        self.assertNotIn(f'reserva-{vieja.id}@', contenido)
+        # Generado hoy y sin cambios: no se vuelve a construir
+        with self.assertNumQueries(1):
+            self.client.get(f'/calendario/{calendario.token}.ics')
+
+
+    def test_archivar_marca_los_calendarios_una_vez_por_lote(self):
+        dueno = crear_usuario('a@ejemplo.com', self.comunidad, self.vivienda)
+        invitado = crear_usuario('b@ejemplo.com', self.comunidad, self.vivienda)
+        calendarios = [regenerar_si_pendiente(calendario_de(u)) for u in (dueno, invitado)]
+        antigua = timezone.localdate() - timedelta(days=60)
+        for dias in range(5):
+            reserva = Reservation.objects.create(user=dueno, court=self.pista, timeslot=self.turno, date=antigua - timedelta(days=dias))
+            ReservationInvitation.objects.create(reserva=reserva, invitado=invitado, estado='aceptada')
+        CalendarioUsuario.objects.update(pendiente=False)
+        with CaptureQueriesContext(connection) as consultas:
+            archivar(dias=30)
+        tabla = CalendarioUsuario._meta.db_table
+        self.assertEqual(sum(1 for q in consultas.captured_queries if q['sql'].startswith(f'UPDATE "{tabla}"')), 1)
+        self.assertEqual(CalendarioUsuario.objects.filter(pk__in=[c.pk for c in calendarios], pendiente=True).count(), 2)
+
+
+# --- Recordatorios de partido ---
+class RecordatoriosTest(BaseTest):
+    def reserva_dentro_de(self, usuario, horas):
+        inicio = timezone.localtime() + timedelta(hours=horas)
+        turno = TimeSlot.objects.create(
+            court=self.pista, slot=f"+{horas}h", start_time=inicio.time().replace(microsecond=0),
+            end_time=(inicio + timedelta(minutes=90)).time().replace(microsecond=0)
+        )
+        return Reservation.objects.create(user=usuario, court=self.pista, timeslot=turno, date=inicio.date())
+
+    def test_modo_cron_solo_carga_las_vencidas(self):
+        usuario = crear_usuario('a@ejemplo.com', self.comunidad, self.vivienda)
+        vencida = self.reserva_dentro_de(usuario, 1)
+        self.reserva_dentro_de(usuario, 5)
+        self.reserva_dentro_de(usuario, 50)
+        programador = Programador(minutos_antes=120)
+        programador.cargar_vencidos()
+        self.assertEqual([reserva_id for _, reserva_id in programador.heap], [vencida.id])
+        self.assertEqual(programador.enviar(programador.vencidos()), 1)
+        vencida.refresh_from_db()
+        self.assertTrue(vencida.recordatorio_enviado)
+
+
+# --- Estadísticas de cancelación ---
+class CancelacionesTest(BaseTest):
+    def test_cancelacion_justo_en_el_umbral_cuenta_como_ultimo_minuto(self):
+        usuario = crear_usuario('a@ejemplo.com', self.comunidad, self.vivienda)
+        fecha = timezone.localdate() + timedelta(days=3)
+        inicio = timezone.make_aware(datetime.combine(fecha, self.turno.start_time))
+        for antelacion in (timedelta(hours=24), timedelta(hours=24, seconds=1)):
+            Reservation.objects.create(
+                user=usuario, court=self.pista, timeslot=self.turno, date=fecha, estado='cancelada',
+                cancelada_at=inicio - antelacion, slot_activo=None
+            )
+        resultado = statistics.cancelaciones_ultimo_minuto(fecha, fecha, horas=24)
+        self.assertEqual(resultado, {'cancelaciones_ultimo_minuto': 1, 'total': 2, 'ratio_pct': 50.0})
+        # El dashboard lo deriva de la distribución de cancelaciones que ya muestra
+        staff = crear_usuario('staff@ejemplo.com', self.comunidad, self.vivienda, is_staff=True)
+        self.client.force_login(staff)
+        respuesta = self.client.get('/django-admin/estadisticas/', {'from_date': fecha.isoformat(), 'to_date': fecha.isoformat()})
+        self.assertEqual(respuesta.context_data['ult_minuto'], resultado)
+        self.assertEqual(respuesta.context_data['dist_cancelaciones']['global']['n'], 2)
+
+
+# --- Estado de la reserva y ocupación del turno ---
+class EstadoReservaTest(BaseTest):
+    def formulario(self, reserva, estado):
+        # Mismo ModelForm que genera ReservationAdmin
+        Formulario = modelform_factory(Reservation, fields='__all__')
+        datos = {
+            'user': reserva.user_id, 'court': reserva.court_id, 'timeslot': reserva.timeslot_id,
+            'date': reserva.date.isoformat(), 'estado': estado, 'cancelada_at': '',
+        }
+        return Formulario(datos, instance=reserva)
+
+    def test_el_estado_decide_si_el_turno_queda_ocupado(self):
+        usuario = crear_usuario('a@ejemplo.com', self.comunidad, self.vivienda)
+        fecha = timezone.localdate() + timedelta(days=1)
+        primera = Reservation.objects.create(user=usuario, court=self.pista, timeslot=self.turno, date=fecha)
+        formulario = self.formulario(primera, 'cancelada')
+        self.assertTrue(formulario.is_valid(), formulario.errors)
+        formulario.save()
+        primera.refresh_from_db()
+        self.assertIsNone(primera.slot_activo)
+        # El turno queda libre y se puede volver a reservar
+        segunda = Reservation.objects.create(user=usuario, court=self.pista, timeslot=self.turno, date=fecha)
+        self.assertTrue(segunda.slot_activo)
+        # Reactivar la cancelada choca con la nueva y se rechaza con el mensaje propio
+        formulario = self.formulario(primera, 'activa')
+        self.assertFalse(formulario.is_valid())
+        self.assertIn("Este horario ya está reservado", str(formulario.errors))
+
+
+# --- Migración de cancelaciones a Reservation ---
+class MigracionCancelacionesTest(TransactionTestCase):
+    antes = [('reservations', '0002_previsionocupacion')]
+    despues = [('reservations', '0003_reserva_cancelacion_logica')]
+
+    def migrar(self, destino):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(destino)
+        return executor.loader.project_state(destino).apps
+
+    def tearDown(self):
+        self.migrar(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_conserva_la_fecha_de_creacion(self):
+        apps = self.migrar(self.antes)
+        comunidad = apps.get_model('reservations', 'Community').objects.create(name='Comunidad', code='AB')
+        pista = apps.get_model('reservations', 'Court').objects.create(name='Pista AB', community=comunidad)
+        turno = apps.get_model('reservations', 'TimeSlot').objects.create(
+            court=pista, slot='18:00-19:30', start_time=time(18), end_time=time(19, 30)
+        )
+        usuario = apps.get_model('reservations', 'Usuario').objects.create(email='a@ejemplo.com', nombre='a')
+        creada = timezone.make_aware(datetime(2024, 2, 1, 10, 0))
+        cancelada = timezone.make_aware(datetime(2024, 2, 3, 9, 0))
+        apps.get_model('reservations', 'ReservationCancelada').objects.create(
+            user=usuario, court=pista, timeslot=turno, date=date(2024, 2, 5),
+            created_at=creada, cancelada_at=cancelada
+        )
+        apps = self.migrar(self.despues)
+        reserva = apps.get_model('reservations', 'Reservation').objects.get()
+        self.assertEqual((reserva.estado, reserva.created_at, reserva.cancelada_at), ('cancelada', creada, cancelada))
+        self.assertTrue(apps.get_model('reservations', 'Reservation')._meta.get_field('created_at').auto_now_add)
+
+
+# --- Enlaces cortos ---
+class AcortarUrlTest(BaseTest):
+    def test_solo_acorta_urls_de_nuestros_dominios(self):
+        cliente = self.cliente_jwt(crear_usuario('a@ejemplo.com', self.comunidad, self.vivienda))
+        respuesta = cliente.post('/api/acortar-url/', {'url': 'https://www.pistareserva.com/reservas/1/'}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        codigo = respuesta.data['url_corta'].rstrip('/').rsplit('/', 1)[-1]
+        self.assertEqual(self.client.get(f'/s/{codigo}/')['Location'], 'https://www.pistareserva.com/reservas/1/')
+        for url in ('https://evil.example/login', 'https://evil.example\\@www.pistareserva.com/', '//evil.example/', '/relativa/'):
+            respuesta = cliente.post('/api/acortar-url/', {'url': url}, format='json')
+            self.assertEqual(respuesta.status_code, 400, url)
+
+
+# --- Throttles de reservas y horarios ocupados ---
+class ThrottlesTest(BaseTest):
+    def setUp(self):
+        super().setUp()
+        self.usuario = crear_usuario('a@ejemplo.com', self.comunidad, self.vivienda)
+        self.cliente = self.cliente_jwt(self.usuario)
+
+    def test_ventana_deslizante(self):
+        inicio = 1000 * VENTANA
+        for _ in range(3):
+            self.assertIsNone(consumir('prueba', 3, inicio + 1))
+        espera = consumir('prueba', 3, inicio + 1)
+        self.assertEqual(espera, VENTANA - 1)
+        # La rechazada no ha consumido cupo: al empezar la ventana siguiente la
+        # anterior aún pesa casi entera, y a mitad de ventana deja sitio para una
+        self.assertIsNotNone(consumir('prueba', 3, inicio + VENTANA + 1))
+        self.assertIsNone(consumir('prueba', 3, inicio + VENTANA * 1.5))
+        self.assertIsNotNone(consumir('prueba', 3, inicio + VENTANA * 1.5))
+
+    def test_reservar_responde_429_con_retry_after(self):
+        self.comunidad.limite_reservas_minuto = 2
+        self.comunidad.save()
+        datos = {'court': self.pista.id, 'timeslot': self.turno.id, 'date': str(timezone.localdate())}
+        for _ in range(2):
+            self.assertNotEqual(self.cliente.post('/api/mis-reservas/', datos, format='json').status_code, 429)
+        respuesta = self.cliente.post('/api/mis-reservas/', datos, format='json')
+        self.assertEqual(respuesta.status_code, 429)
+        self.assertGreater(int(respuesta['Retry-After']), 0)
+        # Solo se limita la creación: los listados siguen respondiendo
+        for _ in range(5):
+            self.assertEqual(self.cliente.get('/api/mis-reservas/').status_code, 200)
+
+    def test_ocupados_responde_429_con_retry_after(self):
+        self.comunidad.limite_ocupados_minuto = 2
+        self.comunidad.save()
+        url = f'/api/horarios-ocupados/?court={self.pista.id}&date_after={timezone.localdate()}'
+        for _ in range(2):
+            self.assertEqual(self.cliente.get(url).status_code, 200)
+        respuesta = self.cliente.get(url)
+        self.assertEqual(respuesta.status_code, 429)
+        self.assertIn('Retry-After', respuesta)
+        # El cupo es por usuario: otro vecino no se ve afectado
+        otro = crear_usuario('b@ejemplo.com', self.comunidad, self.vivienda)
+        self.assertEqual(self.cliente_jwt(otro).get(url).status_code, 200)
+
+
+# --- Aislamiento entre comunidades ---
+class ComunidadAislamientoTest(BaseTest):
+    def setUp(self):
+        super().setUp()
+        self.otra, self.otra_pista, self.otro_turno, self.otra_vivienda = crear_comunidad('CD')
+        self.vecino = crear_usuario('a@ejemplo.com', self.comunidad, self.vivienda)
+        self.ajeno = crear_usuario('b@ejemplo.com', self.otra, self.otra_vivienda)
+        self.staff = crear_usuario('staff@ejemplo.com', None, None, is_staff=True)
+
+    def ids(self, respuesta):
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.data['results'] if isinstance(respuesta.data, dict) else respuesta.data
+        return sorted(fila['id'] for fila in datos)
+
+    def test_vecino_solo_ve_su_comunidad(self):
+        cliente = self.cliente_jwt(self.vecino)
+        self.assertEqual(self.ids(cliente.get('/api/courts/')), [self.pista.id])
+        self.assertEqual(self.ids(cliente.get('/api/timeslots/')), [self.turno.id])
+        self.assertEqual(self.ids(cliente.get(f'/api/timeslots/?court={self.otra_pista.id}')), [])
+        self.assertEqual(cliente.get(f'/api/courts/{self.otra_pista.id}/').status_code, 404)
+        companero = crear_usuario('c@ejemplo.com', self.comunidad, self.vivienda)
+        self.assertEqual(self.ids(cliente.get('/api/usuarios-comunidad/')), [companero.id])
+        # ?community= solo lo atiende el staff
+        self.assertEqual(self.ids(cliente.get(f'/api/courts/?community={self.otra.id}')), [self.pista.id])
+
+    def test_staff_elige_comunidad(self):
+        cliente = self.cliente_jwt(self.staff)
+        self.assertEqual(self.ids(cliente.get('/api/courts/')), sorted([self.pista.id, self.otra_pista.id]))
+        self.assertEqual(self.ids(cliente.get(f'/api/courts/?community={self.otra.id}')), [self.otra_pista.id])
+        self.assertEqual(self.ids(cliente.get('/api/usuarios-comunidad/')), [])
+
+
+# --- Emails sin distinguir mayúsculas ---
+class EmailNormalizadoTest(BaseTest):
+    def setUp(self):
+        super().setUp()
+        self.usuario = crear_usuario('Ana.Garcia@Ejemplo.com', self.comunidad, self.vivienda)
+
+    def test_login_sin_distinguir_mayusculas(self):
+        for email in ('ana.garcia@ejemplo.com', 'ANA.GARCIA@EJEMPLO.COM', 'Ana.Garcia@Ejemplo.com'):
+            respuesta = APIClient().post('/api/token/', {'email': email, 'password': 'clave-segura-1'}, format='json')
+            self.assertEqual(respuesta.status_code, 200, email)
+        respuesta = APIClient().post('/api/token/', {'email': 'ana.garcia@ejemplo.com', 'password': 'otra'}, format='json')
+        self.assertNotEqual(respuesta.status_code, 200)
+
+    def test_registro_rechaza_email_repetido_con_otras_mayusculas(self):
+        respuesta = self.client.post('/api/registro_usuario', {
+            'nombre': 'Ana', 'apellido': 'García', 'email': 'ANA.GARCIA@ejemplo.com',
+            'password': 'clave-segura-1', 'vivienda_id': self.vivienda.id, 'accepted_terms': True,
+        }, content_type='application/json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(Usuario.objects.filter(email_normalizado='ana.garcia@ejemplo.com').count(), 1)
+
+
+# --- Invitaciones por lotes ---
+class InvitarTest(BaseTest):
+    def setUp(self):
+        super().setUp()
+        self.convocante = crear_usuario('a@ejemplo.com', self.comunidad, self.vivienda)
+        self.invitado = crear_usuario('Bea@Ejemplo.com', self.comunidad, self.vivienda)
+        self.reserva = Reservation.objects.create(
+            user=self.convocante, court=self.pista, timeslot=self.turno, date=timezone.localdate() + timedelta(days=1)
+        )
+        self.cliente = self.cliente_jwt(self.convocante)
+        self.url = f'/api/mis-reservas/{self.reserva.id}/invitar/'
+
+    def test_invitar_resuelve_usuarios_y_no_duplica(self):
+        datos = {'invitaciones': [{'email': 'bea@ejemplo.com'}, {'email': 'externo@ejemplo.com', 'nombre': 'Ext'}]}
+        self.assertEqual(self.cliente.post(self.url, datos, format='json').status_code, 201)
+        invitaciones = {i.email_normalizado: i for i in ReservationInvitation.objects.filter(reserva=self.reserva)}
+        self.assertEqual(set(invitaciones), {'bea@ejemplo.com', 'externo@ejemplo.com'})
+        self.assertEqual(invitaciones['bea@ejemplo.com'].invitado_id, self.invitado.id)
+        self.assertIsNone(invitaciones['externo@ejemplo.com'].invitado_id)
+        self.assertEqual(EmailOutbox.objects.count(), 2)
+        # Repetir con otras mayúsculas reutiliza la invitación existente
+        datos = {'invitaciones': [{'email': 'BEA@ejemplo.com'}]}
+        self.assertEqual(self.cliente.post(self.url, datos, format='json').status_code, 201)
+        self.assertEqual(ReservationInvitation.objects.filter(reserva=self.reserva).count(), 2)
+
+    def test_maximo_tres_invitaciones(self):
+        datos = {'emails': [f'x{i}@ejemplo.com' for i in range(4)]}
+        self.assertEqual(self.cliente.post(self.url, datos, format='json').status_code, 400)
+        self.assertFalse(ReservationInvitation.objects.exists())
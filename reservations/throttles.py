@@ -0,0 +1,105 @@
+# reservations/throttles.py
+#
+# Limitación de peticiones de reservar y de horarios ocupados, por usuario
+# (límite configurable por comunidad) y por IP. Los contadores viven en la
+# caché 'throttle' y se actualizan con incr atómico, así que todos los
+# procesos que compartan esa caché ven los mismos cupos. Se comprueba en
+# `initial()` de DRF, antes de que la vista toque la base de datos: el
+# usuario sale de los claims del JWT y su comunidad de la caché de referencia.
+
+import time
+from math import ceil
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+from . import referencia
+
+VENTANA = 60
+
+
+def _cache():
+    return caches['throttle']
+
+
+def _incrementar(clave, delta=1):
+    cache = _cache()
+    cache.add(clave, 0, VENTANA * 2)
+    try:
+        return cache.incr(clave, delta)
+    except ValueError:
+        # La clave caducó entre add e incr
+        cache.add(clave, delta, VENTANA * 2)
+        return delta
+
+
+def consumir(clave, limite, ahora=None):
+    """
+    Ventana deslizante aproximada: cuenta la ventana actual más la parte
+    proporcional de la anterior, lo que reparte el cupo como un token bucket
+    sin guardar marcas de tiempo. Devuelve None si la petición entra o los
+    segundos que faltan hasta que haya cupo. Las rechazadas no consumen.
+    """
+    ahora = ahora if ahora is not None else time.time()
+    ventana = int(ahora // VENTANA)
+    transcurrido = ahora - ventana * VENTANA
+    actual_clave = f"{clave}:{ventana}"
+    actual = _incrementar(actual_clave)
+    anterior = _cache().get(f"{clave}:{ventana - 1}", 0)
+    peso_anterior = anterior * (1 - transcurrido / VENTANA)
+    if actual + peso_anterior <= limite:
+        return None
+    _incrementar(actual_clave, -1)
+    if actual > limite or not anterior:
+        return ceil(VENTANA - transcurrido)
+    # Momento en que la parte de la ventana anterior deja hueco
+    hueco = VENTANA * (1 - (limite - actual) / anterior)
+    return max(ceil(hueco - transcurrido), 1)
+
+
+class ComunidadThrottle(BaseThrottle):
+    """Throttle por usuario (límite de su comunidad) y por IP para un `ambito`."""
+    ambito = None
+    acciones = None
+
+    def limites(self, request):
+        ambito = self.ambito.upper()
+        limite_usuario = getattr(settings, f'THROTTLE_{ambito}_USUARIO')
+        comunidad = referencia.comunidad(getattr(request.user, 'community_id', None))
+        propio = getattr(comunidad, f'limite_{self.ambito}_minuto', None)
+        if propio is not None:
+            limite_usuario = propio
+        limites = [(f"throttle:{self.ambito}:ip:{self.get_ident(request)}", getattr(settings, f'THROTTLE_{ambito}_IP'))]
+        if request.user.is_authenticated:
+            limites.append((f"throttle:{self.ambito}:usuario:{request.user.pk}", limite_usuario))
+        return limites
+
+    def allow_request(self, request, view):
+        self.espera = None
+        if self.acciones and getattr(view, 'action', None) not in self.acciones:
+            return True
+        ahora = time.time()
+        consumidas = []
+        for clave, limite in self.limites(request):
+            if not limite:
+                continue
+            espera = consumir(clave, limite, ahora)
+            if espera is not None:
+                # Se devuelve lo ya consumido en los otros contadores
+                for anterior in consumidas:
+                    _incrementar(f"{anterior}:{int(ahora // VENTANA)}", -1)
+                self.espera = espera
+                return False
+            consumidas.append(clave)
+        return True
+
+    def wait(self):
+        return self.espera
+
+
+class ReservasThrottle(ComunidadThrottle):
+    ambito = 'reservas'
+    acciones = ('create',)
+
+
+class OcupadosThrottle(ComunidadThrottle):
+    ambito = 'ocupados'
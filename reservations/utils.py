@@ -1,5 +1,4 @@
-import pyshorteners
+from .enlaces import acortar, url_corta
 
 def acortar_url_para_whatsapp(url_larga):
-    s = pyshorteners.Shortener()
-    return s.tinyurl.short(url_larga)
\ No newline at end of file
+    return url_corta(acortar(url_larga))
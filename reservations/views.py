@@ -1,37 +1,49 @@
 from rest_framework.views import APIView
 from rest_framework import viewsets, status, permissions
 from rest_framework.response import Response
-from django.db.models import OuterRef, Exists
+from django.db.models import OuterRef, Exists, Q
+from django.db.models.functions import Lower
 from .models import (
-    Court, TimeSlot, Reservation, Usuario, Vivienda, ReservationInvitation, InvitadoExterno, Community, ReservationCancelada, Anuncio, RespuestaAnuncio
+    Court, TimeSlot, Reservation, Usuario, Vivienda, ReservationInvitation, InvitadoExterno, Community, Anuncio, RespuestaAnuncio,
+    PrevisionOcupacion, CalendarioUsuario, normalizar_email
 )
+from .correo import preparar_email, encolar_emails
+from .notificaciones import resumen_activo, acumular, evento_invitacion, evento_respuesta, eventos_anuncio
 from .serializers import (
     CourtSerializer, TimeSlotSerializer, ReservationSerializer, UserSerializer,
     UsuarioSerializer, ReservationInvitationSerializer, WriteReservationSerializer,
-    ViviendaSerializer, CustomTokenObtainPairSerializer, CommunitySerializer, ChangePasswordSerializer, InvitadoExternoSerializer, AnuncioSerializer, RespuestaAnuncioSerializer
+    ViviendaSerializer, CustomTokenObtainPairSerializer, CommunitySerializer, ChangePasswordSerializer, InvitadoExternoSerializer, AnuncioSerializer, RespuestaAnuncioSerializer,
+    con_resumen_respuestas
 )
 from django.contrib.auth import get_user_model
 from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
 from django.db import transaction, IntegrityError
 from rest_framework.parsers import JSONParser
 from django_filters import rest_framework as filters
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes, throttle_classes
 from rest_framework_simplejwt.views import TokenObtainPairView
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from .autenticacion import JWTSinEstadoAuthentication
+from .throttles import ReservasThrottle, OcupadosThrottle
+from .comunidad import ComunidadQuerysetMixin, contexto_comunidad
+from .router import ListadoReplicaMixin, en_replica
+from . import registro
 from rest_framework.exceptions import ValidationError
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
-from django.http import JsonResponse
-from django.core.mail import send_mail, EmailMultiAlternatives
-from django.template.loader import render_to_string
+from django.urls import reverse
+from django.http import JsonResponse, Http404, HttpResponseRedirect, HttpResponse, HttpResponseNotModified
 import json
+import re
+import secrets
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from datetime import datetime, date
 from django.utils import timezone
-from django.utils.dateparse import parse_datetime
+from django.core.cache import cache
+from django.utils.dateparse import parse_date, parse_datetime
 from datetime import timedelta
-from rest_framework.pagination import PageNumberPagination
-import pyshorteners
+from rest_framework.pagination import PageNumberPagination, CursorPagination
+from .enlaces import acortar, destino_permitido, url_corta, resolver
+from .calendario import calendario_de, regenerar_si_pendiente
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
 from rest_framework.parsers import MultiPartParser, FormParser
@@ -44,9 +56,17 @@ class AcortarUrlView(APIView):
         url_larga = request.data.get('url')
         if not url_larga:
             return Response({'error': 'Falta la URL'}, status=400)
-        s = pyshorteners.Shortener()
-        url_corta = s.tinyurl.short(url_larga)
-        return Response({'url_corta': url_corta})
+        if not isinstance(url_larga, str) or not destino_permitido(url_larga):
+            return Response({'error': 'URL no válida'}, status=400)
+        return Response({'url_corta': url_corta(acortar(url_larga), request)})
+
+
+# --- Redirección de enlaces cortos ---
+def redirigir_enlace(request, codigo):
+    url = resolver(codigo)
+    if url is None:
+        raise Http404("Enlace no encontrado")
+    return HttpResponseRedirect(url)
 
 # --- Registro de usuario desde el frontend ---
 @csrf_exempt
@@ -76,7 +96,7 @@ def registro_usuario(request):
         vivienda = Vivienda.objects.get(id=vivienda_id)
     except Vivienda.DoesNotExist:
         return JsonResponse({'error': 'Vivienda no existe'}, status=400)
-    if Usuario.objects.filter(email=email).exists():
+    if Usuario.objects.filter(email_normalizado=normalizar_email(email)).exists():
         return JsonResponse({'error': 'Email ya registrado'}, status=400)
     usuario = Usuario.objects.create_user(
         email=email,
@@ -94,11 +114,10 @@ def registro_usuario(request):
 
 # --- Listado de viviendas para el frontend ---
 def obtener_viviendas(request):
-    viviendas = list(Vivienda.objects.values('id', 'nombre'))
-    return JsonResponse(viviendas, safe=False)
+    return JsonResponse(registro.todas_las_viviendas(), safe=False)
 
 # --- CRUD de pistas ---
-class CourtViewSet(viewsets.ModelViewSet):
+class CourtViewSet(ComunidadQuerysetMixin, viewsets.ModelViewSet):
     queryset = Court.objects.all()
     serializer_class = CourtSerializer
     pagination_class = None
@@ -111,22 +130,15 @@ class CourtViewSet(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
     
     def get_queryset(self):
-        user = self.request.user
-        community_id = self.request.query_params.get('community')
-        if user.is_staff and community_id:
-            return Court.objects.filter(community_id=community_id)
-        elif user.is_staff:
-            return Court.objects.all()
-        elif hasattr(user, 'community_id') and user.community_id:
-            return Court.objects.filter(community_id=user.community_id)
-        return Court.objects.none()
+        return self.filtrar_comunidad(Court.objects.all())
 
 # --- CRUD de turnos ---
-class TimeSlotViewSet(viewsets.ModelViewSet):
+class TimeSlotViewSet(ComunidadQuerysetMixin, viewsets.ModelViewSet):
     permission_classes = [AllowAny]
     queryset = TimeSlot.objects.all()
     serializer_class = TimeSlotSerializer
     pagination_class = None
+    campo_pista = 'court_id'
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -136,22 +148,12 @@ class TimeSlotViewSet(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
     
     def get_queryset(self):
-        user = self.request.user
+        # Staff ve todos los turnos; los vecinos, los de las pistas de su comunidad
+        qs = self.filtrar_comunidad(TimeSlot.objects.all())
         court_id = self.request.query_params.get('court')
-        
-        if user.is_staff:
-        # Staff puede ver todos los turnos o filtrar por pista
-            if court_id:
-                return TimeSlot.objects.filter(court_id=court_id)
-            return TimeSlot.objects.all()
-        else:
-            # Usuarios normales solo pueden ver los turnos de las pistas de su comunidad
-            if hasattr(user, 'community') and user.community:
-                qs = TimeSlot.objects.filter(court__community=user.community)
-                if court_id:
-                    qs = qs.filter(court_id=court_id)
-                return qs
-            return TimeSlot.objects.none()
+        if court_id:
+            qs = qs.filter(court_id=court_id)
+        return qs
 
 # --- Filtro para reservas ---
 class ReservationFilter(filters.FilterSet):
@@ -169,17 +171,18 @@ class ReservationFilter(filters.FilterSet):
 class ReservationViewSet(viewsets.ModelViewSet):
     parser_classes = [JSONParser]
     queryset = Reservation.objects.all().prefetch_related(
-        'user__vivienda', 'court', 'timeslot', 'invitaciones'
+        'user', 'invitaciones'
     ).order_by('-date', 'timeslot__start_time')
     pagination_class = None
     serializer_class = ReservationSerializer
     permission_classes = [IsAuthenticated]
+    throttle_classes = [ReservasThrottle]
     filter_backends = (filters.DjangoFilterBackend,)
     filterset_class = ReservationFilter
 
     def get_queryset(self):
-        return Reservation.objects.filter(user=self.request.user)\
-            .prefetch_related('user__vivienda', 'court', 'timeslot', 'invitaciones')\
+        return Reservation.objects.filter(user=self.request.user, estado='activa')\
+            .prefetch_related('user', 'invitaciones')\
             .order_by('-date', 'timeslot__start_time')
 
     def get_serializer_class(self):
@@ -198,13 +201,22 @@ class ReservationViewSet(viewsets.ModelViewSet):
             if Reservation.objects.filter(
                 court=court,
                 timeslot=timeslot,
-                date=date
+                date=date,
+                estado='activa'
             ).exists():
                 return Response(
                     {"error": "Este horario ya está reservado"},
                     status=status.HTTP_409_CONFLICT
                 )
-            reserva = serializer.save(user=request.user)
+            try:
+                with transaction.atomic():
+                    reserva = serializer.save(user=request.user)
+            except IntegrityError:
+                # Otra petición ha reservado el mismo turno entre la comprobación y el INSERT
+                return Response(
+                    {"error": "Este horario ya está reservado"},
+                    status=status.HTTP_409_CONFLICT
+                )
             read_serializer = ReservationSerializer(reserva, context={'request': request})
             return Response(read_serializer.data, status=status.HTTP_201_CREATED)
         except ValidationError as e:
@@ -223,7 +235,7 @@ class ReservationViewSet(viewsets.ModelViewSet):
                 {"error": "No tienes permiso para eliminar esta reserva"},
                 status=status.HTTP_403_FORBIDDEN
             )
-        self.perform_destroy(instance)
+        instance.cancelar()
         return Response(
             {"success": "Reserva eliminada correctamente"},
             status=status.HTTP_204_NO_CONTENT
@@ -239,10 +251,11 @@ class ReservationViewSet(viewsets.ModelViewSet):
             emails = request.data.get('emails', [])
             usuarios_ids = request.data.get('usuarios', [])
             invitaciones_data = [{"email": email} for email in emails]
-            for user_id in usuarios_ids:
-                usuario = Usuario.objects.filter(id=user_id).first()
-                if usuario:
-                    invitaciones_data.append({"email": usuario.email})
+            if usuarios_ids:
+                emails_por_id = dict(Usuario.objects.filter(id__in=usuarios_ids).values_list('id', 'email'))
+                for user_id in usuarios_ids:
+                    if user_id in emails_por_id:
+                        invitaciones_data.append({"email": emails_por_id[user_id]})
                     
         # Filtra solo las invitaciones activas (pendiente o aceptada)
         invitaciones_activas = reserva.invitaciones.filter(estado__in=["pendiente", "aceptada"]).count()
@@ -252,90 +265,35 @@ class ReservationViewSet(viewsets.ModelViewSet):
                 {"error": "Máximo 3 invitaciones por reserva"},
                 status=status.HTTP_400_BAD_REQUEST
             )
-            
-        for data in invitaciones_data:
-            try:
-                email = (data.get('email') or '').strip()
-                nombre = (data.get('nombre') or data.get('nombre_invitado') or '').strip()
-
-                # Permitir crear invitación si existe nombre o email (no ambos vacíos)
-                if not email and not nombre:
-                    continue
-
-                invitado_usuario = Usuario.objects.filter(email=email).first() if email else None
-
-                # Buscar invitación anterior SOLO si hay email
-                invitacion_anterior = ReservationInvitation.objects.filter(
-                    reserva=reserva,
-                    email=email
-                ).first() if email else None
-
-                if email:
-                    nombre_final = (
-                        nombre if nombre else
-                        (invitacion_anterior.nombre_invitado if invitacion_anterior and invitacion_anterior.nombre_invitado else email.split('@')[0])
-                    )
-                else:
-                    nombre_final = nombre
-
-                # ---- Invitar como usuario frecuente externo ----
-                if email:
-                    invitado_ext, _ = InvitadoExterno.objects.update_or_create(
-                        usuario=request.user,
-                        email=email,
-                        defaults={'nombre': nombre_final or email.split('@')[0]}
-                    )
-                    if (nombre_final and invitado_ext.nombre != nombre_final) or not invitado_ext.nombre:
-                        invitado_ext.nombre = nombre_final or email.split('@')[0]
-                        invitado_ext.save(update_fields=['nombre'])
-                else:
-                    # Solo crea un habitual externo sin email si no existe uno igual
-                    existe_externo = InvitadoExterno.objects.filter(
-                        usuario=request.user,
-                        email='',
-                        nombre__iexact=nombre_final.strip()
-                    ).exists()
-                    if not existe_externo:
-                        InvitadoExterno.objects.create(
-                            usuario=request.user,
-                            email='',
-                            nombre=nombre_final
-                        )
-                    # Si ya existe, simplemente continúa; NUNCA devuelvas error aquí
-
-                # ---- Procesado de reservation invitation ----
-                if email:
-                    invitacion, created = ReservationInvitation.objects.get_or_create(
-                        reserva=reserva,
-                        email=email,
-                        defaults={'invitado': invitado_usuario, 'nombre_invitado': nombre_final}
-                    )
-                else:
-                    invitacion, created = ReservationInvitation.objects.get_or_create(
-                        reserva=reserva,
-                        email='',
-                        nombre_invitado=nombre_final,
-                        defaults={'invitado': None}
-                    )
-
-                if (
-                    nombre_final and invitacion.nombre_invitado != nombre_final
-                ) or not invitacion.nombre_invitado:
-                    invitacion.nombre_invitado = nombre_final or (email.split('@')[0] if email else '')
-                    invitacion.save(update_fields=['nombre_invitado'])
-
-                if created and email:
-                    self._enviar_email_invitacion(invitacion)
-
-            except IntegrityError:
-                pass
-            except Exception as e:
-                return Response(
-                    {"error": "Error al procesar invitaciones", "detalle": str(e)},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
 
+        # Permitir crear invitación si existe nombre o email (no ambos vacíos)
+        peticiones = []
+        for data in invitaciones_data:
+            email = (data.get('email') or '').strip()
+            nombre = (data.get('nombre') or data.get('nombre_invitado') or '').strip()
+            if email or nombre:
+                peticiones.append((email, nombre))
 
+        try:
+            with transaction.atomic():
+                invitaciones_nuevas = self._procesar_invitaciones(reserva, request.user, peticiones)
+                # Los correos se encolan en la misma transacción que las invitaciones
+                con_email = [i for i in invitaciones_nuevas if i.email]
+                if resumen_activo():
+                    acumular([evento_invitacion(i, self._contexto_invitacion(i)) for i in con_email])
+                else:
+                    encolar_emails([self._email_invitacion(i) for i in con_email])
+        except IntegrityError:
+            # Otra petición ha invitado a las mismas personas a la vez
+            return Response(
+                {"error": "Las invitaciones se han modificado a la vez desde otra petición"},
+                status=status.HTTP_409_CONFLICT
+            )
+        except Exception as e:
+            return Response(
+                {"error": "Error al procesar invitaciones", "detalle": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
 
         return Response(
             {"status": "Invitaciones procesadas", "invitaciones_creadas": len([
@@ -426,9 +384,81 @@ class ReservationViewSet(viewsets.ModelViewSet):
         #     status=status.HTTP_201_CREATED
         # )
         # print("Invitación creada:", invitacion, "Creada:", created)
-    def _enviar_email_invitacion(self, invitacion):
-        invitacion.generar_token()
-        context = {
+    def _procesar_invitaciones(self, reserva, convocante, peticiones):
+        """
+        Resuelve todo el lote de invitados con consultas por conjuntos
+        (usuarios, invitaciones previas y habituales externos) y escribe con
+        bulk_create/bulk_update. Devuelve las invitaciones creadas.
+        """
+        # Los emails se comparan normalizados (columna indexada `email_normalizado`)
+        emails = {normalizar_email(email) for email, _ in peticiones if email}
+        nombres_sin_email = {nombre for email, nombre in peticiones if not email}
+
+        usuarios = {u.email_normalizado: u for u in Usuario.objects.filter(email_normalizado__in=emails)} if emails else {}
+        previas = {}
+        for invitacion in reserva.invitaciones.filter(
+            Q(email_normalizado__in=emails) | Q(email='', nombre_invitado__in=nombres_sin_email)
+        ).order_by('id'):
+            clave = invitacion.email_normalizado or ('', invitacion.nombre_invitado)
+            previas.setdefault(clave, invitacion)
+        externos = {}
+        for externo in InvitadoExterno.objects.filter(usuario=convocante).annotate(nombre_min=Lower('nombre')).filter(
+            Q(email_normalizado__in=emails) | Q(email='', nombre_min__in={n.lower() for n in nombres_sin_email})
+        ).order_by('id'):
+            clave = externo.email_normalizado or ('', externo.nombre_min)
+            externos.setdefault(clave, externo)
+
+        externos_nuevos, externos_modificados = [], {}
+        invitaciones_nuevas, invitaciones_modificadas = [], {}
+        for email, nombre in peticiones:
+            clave_email = normalizar_email(email)
+            if email:
+                anterior = previas.get(clave_email)
+                nombre_final = nombre or (anterior.nombre_invitado if anterior and anterior.nombre_invitado else email.split('@')[0])
+            else:
+                nombre_final = nombre
+
+            # ---- Invitar como usuario frecuente externo ----
+            clave_externo = clave_email or ('', nombre_final.lower())
+            externo = externos.get(clave_externo)
+            if externo is None:
+                externo = InvitadoExterno(usuario=convocante, email=email, nombre=nombre_final or email.split('@')[0])
+                externos[clave_externo] = externo
+                externos_nuevos.append(externo)
+            elif email and ((nombre_final and externo.nombre != nombre_final) or not externo.nombre):
+                # Solo se renombran los habituales con email; los de solo nombre ya coinciden
+                externo.nombre = nombre_final or email.split('@')[0]
+                if externo.pk:
+                    externos_modificados[externo.pk] = externo
+
+            # ---- Procesado de reservation invitation ----
+            clave_invitacion = clave_email or ('', nombre_final)
+            invitacion = previas.get(clave_invitacion)
+            if invitacion is None:
+                # El token se genera antes del INSERT: bulk_create no pasa por save()
+                invitacion = ReservationInvitation(
+                    reserva=reserva, email=email, invitado=usuarios.get(clave_email) if email else None,
+                    nombre_invitado=nombre_final, token=secrets.token_urlsafe(50)
+                )
+                previas[clave_invitacion] = invitacion
+                invitaciones_nuevas.append(invitacion)
+            elif (nombre_final and invitacion.nombre_invitado != nombre_final) or not invitacion.nombre_invitado:
+                invitacion.nombre_invitado = nombre_final or (email.split('@')[0] if email else '')
+                if invitacion.pk:
+                    invitaciones_modificadas[invitacion.pk] = invitacion
+
+        if externos_nuevos:
+            InvitadoExterno.objects.bulk_create(externos_nuevos)
+        if externos_modificados:
+            InvitadoExterno.objects.bulk_update(externos_modificados.values(), ['nombre'])
+        if invitaciones_nuevas:
+            ReservationInvitation.objects.bulk_create(invitaciones_nuevas)
+        if invitaciones_modificadas:
+            ReservationInvitation.objects.bulk_update(invitaciones_modificadas.values(), ['nombre_invitado'])
+        return invitaciones_nuevas
+
+    def _contexto_invitacion(self, invitacion):
+        return {
             'convocante': invitacion.reserva.user.get_full_name() or invitacion.reserva.user.email,
             'nombre_invitado': invitacion.invitado.nombre if invitacion.invitado else invitacion.nombre_invitado or invitacion.email.split('@')[0],
             'reserva': invitacion.reserva,
@@ -441,38 +471,24 @@ class ReservationViewSet(viewsets.ModelViewSet):
             'enlace_rechazar': f"https://www.pistareserva.com/invitaciones/{invitacion.token}/rechazar/"
         }
 
-        try:
-            mensaje_html = render_to_string('emails/invitacion_reserva.html', context)
-            mensaje_txt = render_to_string('emails/invitacion_reserva.txt', context)
-            email = EmailMultiAlternatives(
-    	        subject='Invitación a partido de pádel',
-    	        body=mensaje_txt,  # Texto plano como fallback
-    	        from_email="info@pistareserva.com",
-    	        to=[invitacion.email],
-            )
-            email.attach_alternative(mensaje_html, "text/html")
-            email.send()
-        except Exception as e:
-            import logging 
-            logging.exception(f"Error enviando invitacion: {e}")
+    def _email_invitacion(self, invitacion):
+        return preparar_email(
+            'Invitación a partido de pádel',
+            invitacion.email,
+            plantilla_txt='emails/invitacion_reserva.txt',  # Texto plano como fallback
+            plantilla_html='emails/invitacion_reserva.html',
+            contexto=self._contexto_invitacion(invitacion),
+        )
 
 # --- CRUD de usuarios (admin) ---
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(ListadoReplicaMixin, ComunidadQuerysetMixin, viewsets.ModelViewSet):
     queryset = Usuario.objects.all().order_by('id')  # <--- Añade order_by aquí
     serializer_class = UsuarioSerializer  # <--- Debe ser este, no UserSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = None
     
     def get_queryset(self):
-        user = self.request.user
-        community_id = self.request.query_params.get('community')
-        if user.is_staff and community_id:
-            return Usuario.objects.filter(community_id=community_id)
-        elif user.is_staff:
-            return Usuario.objects.all()
-        elif hasattr(user, 'community_id') and user.community_id:
-            return Usuario.objects.filter(community_id=user.community_id)
-        return Usuario.objects.none()
+        return self.filtrar_comunidad(Usuario.objects.all())
 
 # --- CRUD de usuarios (frontend) ---
 class UsuarioViewSet(viewsets.ModelViewSet):
@@ -499,28 +515,21 @@ class UsuarioViewSet(viewsets.ModelViewSet):
 
 
 # --- CRUD de viviendas (admin y frontend) ---
-class ViviendaViewSet(viewsets.ModelViewSet):
+class ViviendaViewSet(ComunidadQuerysetMixin, viewsets.ModelViewSet):
     queryset = Vivienda.objects.all()
     serializer_class = ViviendaSerializer
     permission_classes = [AllowAny]
     pagination_class = None
        
     def get_queryset(self):
-        user = self.request.user
-        community_id = self.request.query_params.get('community')
-        if user.is_staff and community_id:
-            return Vivienda.objects.filter(community_id=community_id)
-        elif user.is_staff:
-            return Vivienda.objects.all()
-        elif hasattr(user, 'community_id') and user.community_id:
-            return Vivienda.objects.filter(community_id=user.community_id)
-        return Vivienda.objects.none()
+        return self.filtrar_comunidad(Vivienda.objects.all())
 
 # --- CRUD de invitaciones ---
-class ReservationInvitationViewSet(viewsets.ModelViewSet):
+class ReservationInvitationViewSet(ListadoReplicaMixin, ComunidadQuerysetMixin, viewsets.ModelViewSet):
     queryset = ReservationInvitation.objects.all().order_by('-fecha_invitacion', '-id')
     serializer_class = ReservationInvitationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    campo_pista = 'reserva__court_id'
 
     # def get_queryset(self):
     #     user = self.request.user
@@ -531,16 +540,8 @@ class ReservationInvitationViewSet(viewsets.ModelViewSet):
     #     return qs
 
     def get_queryset(self):
-        user = self.request.user
-        community_id = self.request.query_params.get('community')
-        qs = ReservationInvitation.objects.select_related('reserva__court')
-        if user.is_staff and community_id:
-            return qs.filter(reserva__court__community_id=community_id)
-        elif user.is_staff:
-            return qs
-        elif hasattr(user, 'community_id') and user.community_id:
-            return qs.filter(reserva__court__community_id=user.community_id)
-        return qs.none()
+        qs = ReservationInvitation.objects.select_related('reserva__user').filter(reserva__estado='activa')
+        return self.filtrar_comunidad(qs)
     
 
     def destroy(self, request, *args, **kwargs):
@@ -595,24 +596,16 @@ def eliminar_invitado_externo(request, id):
 
 
 # --- Listado de usuarios de la comunidad (para invitaciones) ---
-class UsuarioComunidadViewSet(viewsets.ReadOnlyModelViewSet):
-    authentication_classes = [JWTAuthentication]
+class UsuarioComunidadViewSet(ComunidadQuerysetMixin, viewsets.ReadOnlyModelViewSet):
+    authentication_classes = [JWTSinEstadoAuthentication]
     serializer_class = UsuarioSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = None
+    staff_ve_todo = False  # Staff sin comunidad seleccionada: no ve usuarios
 
     def get_queryset(self):
-        user = self.request.user
-        community_id = self.request.query_params.get('community')
-        qs = Usuario.objects.exclude(id=user.id).select_related('vivienda').order_by('vivienda__nombre')
-
-        if getattr(user, 'is_staff', False) and community_id:
-            return qs.filter(community_id=community_id)
-        elif getattr(user, 'is_staff', False):
-            return qs.none()  # Staff sin comunidad seleccionada: no ve usuarios
-        elif getattr(user, 'community_id', None):
-            return qs.filter(community_id=user.community_id)
-        return qs.none()
+        qs = Usuario.objects.exclude(id=self.request.user.id).select_related('vivienda').order_by('vivienda__nombre')
+        return self.filtrar_comunidad(qs)
 
 # --- Vista personalizada para login con JWT ---
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
@@ -625,6 +618,60 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
 class CustomLoginView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
+# --- Transiciones de invitación por token ---
+DETALLE_INVITACION_TTL = 60
+# Bots que abren los enlaces para generar la previsualización (WhatsApp, Telegram...)
+AGENTES_PREVISUALIZACION = re.compile(
+    r'whatsapp|facebookexternalhit|facebot|telegrambot|twitterbot|slackbot|discordbot|'
+    r'linkedinbot|skypeuripreview|googlebot|bingbot|applebot|embedly|pinterest|redditbot',
+    re.IGNORECASE
+)
+
+
+def _es_previsualizacion(request):
+    return request.method == 'HEAD' or bool(AGENTES_PREVISUALIZACION.search(request.META.get('HTTP_USER_AGENT', '')))
+
+
+def _clave_detalle_invitacion(token):
+    return f"invitacion:detalle:{token}"
+
+
+def _detalle_invitacion(token):
+    """Invitación serializada, cacheada unos segundos. None si no existe o la reserva no está activa."""
+    clave = _clave_detalle_invitacion(token)
+    data = cache.get(clave)
+    if data is None:
+        invitacion = ReservationInvitation.objects.select_related(
+            'reserva__user'
+        ).filter(token=token, reserva__estado='activa').first()
+        if invitacion is None:
+            return None
+        data = ReservationInvitationSerializer(invitacion).data
+        cache.set(clave, data, DETALLE_INVITACION_TTL)
+    return data
+
+
+def _transicion_invitacion(token, estado):
+    """
+    Cambia el estado con un único UPDATE condicional. Devuelve True si esta
+    petición ha hecho el cambio y False si ya estaba en ese estado o no existe.
+    """
+    cambiada = ReservationInvitation.objects.filter(
+        token=token, reserva__estado='activa'
+    ).exclude(estado=estado).update(estado=estado) == 1
+    if cambiada:
+        CalendarioUsuario.marcar_pendiente(usuario__reservationinvitation__token=token)
+        data = cache.get(_clave_detalle_invitacion(token))
+        if data is not None:
+            cache.set(_clave_detalle_invitacion(token), {**data, 'estado': estado}, DETALLE_INVITACION_TTL)
+        if resumen_activo():
+            invitacion = ReservationInvitation.objects.select_related(
+                'reserva__user', 'reserva__court', 'reserva__timeslot'
+            ).get(token=token)
+            acumular([evento_respuesta(invitacion)])
+    return cambiada
+
+
 # --- Confirmar invitación ---
 @api_view(['POST'])
 def confirmar_invitacion(request, token):
@@ -634,12 +681,9 @@ def confirmar_invitacion(request, token):
         aceptar = request.data.get('aceptar')
         if aceptar is None:
             return Response({'error': 'Campo "aceptar" requerido.'}, status=400)
-        invitacion = ReservationInvitation.objects.get(token=token)
-        invitacion.estado = 'aceptada' if aceptar else 'rechazada'
-        invitacion.save()
+        if not _transicion_invitacion(token, 'aceptada' if aceptar else 'rechazada') and _detalle_invitacion(token) is None:
+            return Response({'error': 'Invitación no válida'}, status=404)
         return Response({'status': 'Invitación actualizada'})
-    except ReservationInvitation.DoesNotExist:
-        return Response({'error': 'Invitación no válida'}, status=404)
     except Exception as e:
         logging.exception("Error en confirmarinvitacion")
         return Response({'error': str(e)}, status=500)
@@ -648,9 +692,9 @@ def confirmar_invitacion(request, token):
 
 
 
-class ReservationAllViewSet(viewsets.ModelViewSet):
+class ReservationAllViewSet(ListadoReplicaMixin, ComunidadQuerysetMixin, viewsets.ModelViewSet):
     queryset = Reservation.objects.all().prefetch_related(
-        'user__vivienda', 'court', 'timeslot', 'invitaciones'
+        'user', 'invitaciones'
     ).order_by('-date', 'timeslot__start_time')
     serializer_class = ReservationSerializer
     permission_classes = [IsAuthenticated]
@@ -660,17 +704,12 @@ class ReservationAllViewSet(viewsets.ModelViewSet):
     import logging
     logger = logging.getLogger(__name__)
 
+    campo_pista = 'court_id'
+
     def get_queryset(self):
-        user = self.request.user
-        community_id = self.request.query_params.get('community')
-        qs = Reservation.objects.select_related('user', 'court__community', 'timeslot').prefetch_related('invitaciones')
-        if user.is_staff and community_id:
-            return qs.filter(court__community_id=community_id)
-        elif user.is_staff:
-            return qs
-        elif hasattr(user, 'community') and user.community:
-            return qs.filter(court__community_id=user.community.id)
-        return qs.none()
+        qs = Reservation.objects.filter(estado='activa')\
+            .select_related('user').prefetch_related('invitaciones')
+        return self.filtrar_comunidad(qs)
 
     # def get_queryset(self):
     #     user = self.request.user
@@ -706,15 +745,7 @@ class ReservationAllViewSet(viewsets.ModelViewSet):
         
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
-        ReservationCancelada.objects.create(
-            user=instance.user,
-            court=instance.court,
-            timeslot=instance.timeslot,
-            date=instance.date,
-            created_at=instance.created_at,
-            cancelada_at=timezone.now()
-        )
-        instance.delete()  # Elimina la reserva original
+        instance.cancelar()  # Un único UPDATE; la reserva y sus invitaciones se conservan
         return Response({'status': 'cancelada'}, status=200)
 
 class CommunityViewSet(viewsets.ModelViewSet):
@@ -731,6 +762,7 @@ def user_dashboard(request):
     # Reservas propias este mes
     reservas_propias = Reservation.objects.filter(
         user=user,
+        estado='activa',
         date__month=now.month,
         date__year=now.year
     ).values_list('id', flat=True)
@@ -739,6 +771,7 @@ def user_dashboard(request):
     reservas_aceptadas = ReservationInvitation.objects.filter(
         invitado=user,
         estado='aceptada',
+        reserva__estado='activa',
         reserva__date__month=now.month,
         reserva__date__year=now.year
     ).values_list('reserva_id', flat=True)
@@ -749,8 +782,8 @@ def user_dashboard(request):
 
     # Invitaciones pendientes (igual que antes)
     invitaciones_pendientes = ReservationInvitation.objects.filter(
-        invitado=user, estado='pendiente'
-    ).select_related('reserva__court', 'reserva__timeslot', 'reserva__user')
+        invitado=user, estado='pendiente', reserva__estado='activa'
+    ).select_related('reserva__user')
     invitaciones_serializadas = ReservationInvitationSerializer(invitaciones_pendientes, many=True).data
 
     return Response({
@@ -794,43 +827,76 @@ def proximos_partidos_invitado(request):
     invitaciones_aceptadas = ReservationInvitation.objects.filter(
         invitado=user,
         estado='aceptada',
+        reserva__estado='activa',
         reserva__date__gte=hoy
     ).select_related('reserva')
     reservas = [inv.reserva for inv in invitaciones_aceptadas]
     data = ReservationSerializer(reservas, many=True).data
     return Response(data)
 
+# --- Calendario .ics del usuario ---
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def mi_calendario(request):
+    """URL privada del feed; con POST se genera un token nuevo e invalida la anterior."""
+    calendario = calendario_de(request.user)
+    if request.method == 'POST':
+        calendario.token = ''
+        calendario.save()
+    return Response({'url': request.build_absolute_uri(reverse('calendario-ics', args=[calendario.token]))})
+
+
+def calendario_ics(request, token):
+    calendario = CalendarioUsuario.objects.select_related('usuario').filter(token=token).first()
+    if calendario is None:
+        raise Http404("Calendario no encontrado")
+    calendario = regenerar_si_pendiente(calendario)
+    etag = f'"{calendario.etag}"'
+    if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+        respuesta = HttpResponseNotModified()
+    else:
+        respuesta = HttpResponse(calendario.contenido, content_type='text/calendar; charset=utf-8')
+    respuesta['ETag'] = etag
+    respuesta['Cache-Control'] = 'private, max-age=300'
+    return respuesta
+
 class AceptarInvitacionView(APIView):
     permission_classes = [AllowAny]
     def get(self, request, token):
-        try:
-            invitacion = ReservationInvitation.objects.select_related(
-                'reserva', 'reserva__court', 'reserva__timeslot', 'reserva__court__community'
-            ).get(token=token)
-            data = ReservationInvitationSerializer(invitacion).data
-            if invitacion.estado == "aceptada":
-                return Response({"detail": "La invitación ya fue aceptada.", "invitacion": data}, status=200)
-            invitacion.estado = "aceptada"
-            invitacion.save()
-            data = ReservationInvitationSerializer(invitacion).data
-            return Response({"detail": "Invitación aceptada correctamente.", "invitacion": data}, status=200)
-        except ReservationInvitation.DoesNotExist:
+        # Las previsualizaciones de enlaces y los HEAD solo leen, nunca cambian el estado
+        if _es_previsualizacion(request):
+            data = _detalle_invitacion(token)
+            if data is None:
+                return Response({"detail": "Invitación no encontrada."}, status=404)
+            return Response({"invitacion": data}, status=200)
+        cambiada = _transicion_invitacion(token, "aceptada")
+        data = _detalle_invitacion(token)
+        if data is None:
             return Response({"detail": "Invitación no encontrada."}, status=404)
+        if not cambiada:
+            return Response({"detail": "La invitación ya fue aceptada.", "invitacion": data}, status=200)
+        return Response({"detail": "Invitación aceptada correctamente.", "invitacion": data}, status=200)
+
+    def head(self, request, token):
+        return self.get(request, token)
         
 class RechazarInvitacionView(APIView):
     permission_classes = [AllowAny]
     def get(self, request, token):
-        try:
-            invitacion = ReservationInvitation.objects.get(token=token)
-            if invitacion.estado == "rechazada":
-                return Response({"detail": "La invitación ya fue rechazada."}, status=200)
-            invitacion.estado = "rechazada"
-            invitacion.save()
+        if _es_previsualizacion(request):
+            if _detalle_invitacion(token) is None:
+                return Response({"detail": "Invitación no encontrada."}, status=404)
+            return Response(status=200)
+        if _transicion_invitacion(token, "rechazada"):
             return Response({"detail": "Invitación rechazada correctamente."}, status=200)
-        except ReservationInvitation.DoesNotExist:
+        if _detalle_invitacion(token) is None:
             return Response({"detail": "Invitación no encontrada."}, status=404)
+        return Response({"detail": "La invitación ya fue rechazada."}, status=200)
+
+    def head(self, request, token):
+        return self.get(request, token)
         
-class InvitadoExternoViewSet(viewsets.ModelViewSet):
+class InvitadoExternoViewSet(ListadoReplicaMixin, ComunidadQuerysetMixin, viewsets.ModelViewSet):
     serializer_class = InvitadoExternoSerializer
     permission_classes = [IsAuthenticated]
     lookup_field = 'id'  # <-- Debe ser 'id', no 'email'
@@ -838,33 +904,19 @@ class InvitadoExternoViewSet(viewsets.ModelViewSet):
     pagination_class = None
     
     def get_queryset(self):
-        user = self.request.user
-        community_id = self.request.query_params.get('community')
-        qs = InvitadoExterno.objects.all()
-        from .models import Usuario
-
-        if user.is_staff:
-            if community_id:
-                # Invitados externos de esa comunidad cuyo email NO está en usuarios de esa comunidad
-                user_qs = Usuario.objects.filter(email=OuterRef('email'), community_id=community_id)
-                return qs.filter(usuario__community_id=community_id)\
-                         .annotate(es_usuario=Exists(user_qs))\
-                         .filter(es_usuario=False)
-            else:
-                # Invitados externos de cualquier comunidad cuyo email NO está en usuarios de ninguna comunidad
-                user_qs = Usuario.objects.filter(email=OuterRef('email'))
-                return qs.annotate(es_usuario=Exists(user_qs)).filter(es_usuario=False)
-        elif hasattr(user, 'community_id') and user.community_id:
-            # Invitados externos de la comunidad del usuario cuyo email NO está en usuarios de esa comunidad
-            user_qs = Usuario.objects.filter(email=OuterRef('email'), community_id=user.community_id)
-            return qs.filter(usuario__community_id=user.community_id)\
-                     .annotate(es_usuario=Exists(user_qs))\
-                     .filter(es_usuario=False)
-        else:
-            return qs.none()
+        # Invitados externos de la comunidad (staff sin filtro: de todas) cuyo
+        # email NO está en usuarios de esa misma comunidad (o de ninguna)
+        contexto = self.contexto_comunidad
+        user_qs = contexto.filtrar(
+            Usuario.objects.filter(email_normalizado=OuterRef('email_normalizado')), campo_comunidad='community_id'
+        )
+        return contexto.filtrar(InvitadoExterno.objects.all(), campo_comunidad='usuario__community_id')\
+                       .annotate(es_usuario=Exists(user_qs))\
+                       .filter(es_usuario=False)
     
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@throttle_classes([OcupadosThrottle])
 def get_ocupados(request):
     court_id = request.GET.get('court')
     date = request.GET.get('date_after')
@@ -872,24 +924,47 @@ def get_ocupados(request):
         return Response({"error": "Parámetros 'court' y 'date_after' requeridos."}, status=400)
     ocupados = Reservation.objects.filter(
         court_id=court_id,
-        date=date
+        date=date,
+        estado='activa'
     ).values_list('timeslot_id', flat=True)
     return Response(list(ocupados))
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def viviendas_por_codigo(request):
-    codigo = request.data.get('codigo')
-    try:
-        comunidad = Community.objects.get(code=codigo)
-    except Community.DoesNotExist:
+    # Cacheado por código, también los códigos que no existen (ver registro.py)
+    data = registro.viviendas_por_codigo(request.data.get('codigo'))
+    if data is None:
         return Response({'error': 'Código de comunidad no válido'}, status=400)
-    viviendas = Vivienda.objects.filter(community=comunidad)
-    data = [{'id': v.id, 'nombre': v.nombre} for v in viviendas]
-    return Response({
-        'viviendas': data,
-        'comunidad_nombre': comunidad.name  # <-- Añade esto
-    })
+    return Response(data)
+
+# --- Previsión de ocupación por turno (calculada por `calcular_prevision`) ---
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def prevision_ocupacion(request):
+    qs = contexto_comunidad(request).filtrar(PrevisionOcupacion.objects.all(), campo_pista='court_id')
+
+    court_id = request.query_params.get('court')
+    fecha = request.query_params.get('date')
+    if court_id:
+        if not court_id.isdigit():
+            return Response({'error': "Parámetro 'court' no válido"}, status=400)
+        qs = qs.filter(court_id=court_id)
+    if fecha:
+        try:
+            fecha = parse_date(fecha)
+        except ValueError:
+            fecha = None
+        if fecha is None:
+            return Response({'error': "Parámetro 'date' no válido (AAAA-MM-DD)"}, status=400)
+        qs = qs.filter(date=fecha)
+    data = qs.values(
+        'court_id', 'timeslot_id', 'date', 'apertura',
+        'probabilidad', 'horas_hasta_completo', 'muestras', 'calculado_at'
+    )
+    # Solo la consulta va a la réplica: la autenticación (y la revocación de tokens) se resuelve en el primario
+    with en_replica(request):
+        return Response(list(data))
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
@@ -900,14 +975,22 @@ class StandardResultsSetPagination(PageNumberPagination):
     page_size = 10
 
 
-class AnuncioViewSet(viewsets.ModelViewSet):
+class RespuestasCursorPagination(CursorPagination):
+    # De la más reciente a la más antigua, igual que las que trae el feed
+    page_size = 20
+    ordering = ('-creado', '-id')
+
+
+class AnuncioViewSet(ListadoReplicaMixin, viewsets.ModelViewSet):
     parser_classes = (MultiPartParser, FormParser)
     queryset = Anuncio.objects.all()
     serializer_class = AnuncioSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
     pagination_class = StandardResultsSetPagination
     def perform_create(self, serializer):
-        serializer.save(autor=self.request.user)
+        anuncio = serializer.save(autor=self.request.user)
+        if resumen_activo():
+            acumular(eventos_anuncio(anuncio))
         
     def get_queryset(self):
         queryset = Anuncio.objects.all()
@@ -928,11 +1011,25 @@ class AnuncioViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(autor_id=usuario)
         if vivienda:
             queryset = queryset.filter(autor__vivienda_id=vivienda)
+        if self.action in ('list', 'retrieve'):
+            # Con el COUNT agrupado Django ya no aplica Meta.ordering: se repite aquí
+            queryset = con_resumen_respuestas(queryset.select_related('autor')).order_by('-creado')
         return queryset
 
+    @action(detail=True, methods=['get'])
+    def respuestas(self, request, pk=None):
+        with en_replica(request):
+            anuncio = self.get_object()
+            paginador = RespuestasCursorPagination()
+            pagina = paginador.paginate_queryset(
+                RespuestaAnuncio.objects.filter(anuncio=anuncio).select_related('autor'), request, view=self
+            )
+            serializer = RespuestaAnuncioSerializer(pagina, many=True, context=self.get_serializer_context())
+            return paginador.get_paginated_response(serializer.data)
+
 
 class RespuestaAnuncioViewSet(viewsets.ModelViewSet):
-    queryset = RespuestaAnuncio.objects.all()
+    queryset = RespuestaAnuncio.objects.select_related('autor')
     serializer_class = RespuestaAnuncioSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
     def perform_create(self, serializer):